@@ -150,14 +150,47 @@
 # if __name__ == "__main__":
 #     main()
 
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 from dotenv import load_dotenv
-from src.agents import AgentManager
+from src.agents import AgentManager, PatchedArticle, RefinementResult, StageError, Validation
+from src.utils.llm_cache import LRUCache
 from src.utils.logger import logger
 
 load_dotenv()
 
+# Finished pipeline results are reused for identical inputs for this long, up to this many entries
+UI_CACHE_TTL = int(os.getenv("UI_CACHE_TTL", 3600))
+UI_CACHE_MAX_ENTRIES = int(os.getenv("UI_CACHE_MAX_ENTRIES", 256))
+# Sanitize inputs are raw medical records, so their results are never kept
+UI_CACHED_PIPELINES = {"summarize", "write_and_refine"}
+# Pipelines running at once across all sessions of this process
+UI_WORKERS = int(os.getenv("UI_WORKERS", 4))
+# Seconds between progress refreshes while a pipeline runs
+UI_POLL_INTERVAL = 0.1
+
+@st.cache_resource
+def getagent_manager():
+    """One AgentManager, with its provider clients and caches, shared by every session and rerun."""
+    return AgentManager(max_retries=3, verbose=True)
+
+@st.cache_resource
+def get_executor():
+    """Runs pipelines off the script thread, so a rerun or another session never waits on the LLM."""
+    return ThreadPoolExecutor(max_workers=UI_WORKERS, thread_name_prefix="pipeline")
+
+@st.cache_resource
+def get_result_cache():
+    """
+    Finished pipeline results shared by every session. A plain LRU rather than
+    st.cache_data, which needs a script thread and pipelines run on the executor.
+    """
+    return LRUCache(max_entries=UI_CACHE_MAX_ENTRIES, ttl=UI_CACHE_TTL)
+
 def main():
     # Set Streamlit Page Config
     st.set_page_config(
@@ -208,7 +241,7 @@ def main():
             "Sanitize Medical Data (PHI Removal)"
         ])
 
-        agent_manager = AgentManager(max_retries=3, verbose=True)
+        agent_manager = getagent_manager()
 
         if task == "Summarize Medical Text":
             summarize_section(agent_manager, llm_provider)
@@ -219,38 +252,169 @@ def main():
         elif task == "Sanitize Medical Data (PHI Removal)":
             sanitize_data_section(agent_manager, llm_provider)
 
+# ------------------- Pipeline Runner -------------------
+
+STAGE_TITLES = {
+    "summary": "Summary:",
+    "draft": "Draft Article:",
+    "draft_review": "Draft Review:",
+    "refined": "Refined Article:",
+    "sanitized": "Sanitized Data:",
+    "validation": "Validation:",
+    "iterations": "Further Refinement:",
+}
+
+class PipelineRun:
+    """
+    A pipeline submitted to the executor. ``events`` collects ``(stage, text, replace)``
+    tuples: streamed chunks, or a stage's final text replacing what was streamed.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.future = None
+
+def execute_pipeline(pipeline_name, inputs, llm_provider, agent_manager, run):
+    """Runs a pipeline on an executor thread and returns the text of each stage."""
+    texts = {}
+
+    def on_token(stage, delta):
+        texts[stage] = texts.get(stage, "") + delta
+        run.events.append((stage, delta, False))
+
+    def on_stage_complete(stage, output, timing):
+        # Validators stream JSON; a skipped stage streams nothing
+        if isinstance(output, Validation):
+            texts[stage] = format_validation(output)
+        elif isinstance(output, RefinementResult):
+            texts[stage] = format_refinement(output)
+        elif isinstance(output, PatchedArticle):
+            texts[stage] = format_patched(output)
+        elif timing.get("skipped"):
+            texts[stage] = "_Skipped._"
+        else:
+            return
+        run.events.append((stage, texts[stage], True))
+
+    pipeline = agent_manager.get_pipeline(pipeline_name)
+    result = pipeline.run(
+        agent_manager,
+        inputs,
+        context=agent_manager.context(llm_provider),
+        on_token=on_token,
+        on_stage_complete=on_stage_complete,
+    )
+    return {"texts": texts, "total_ms": result.total_ms}
+
+def format_validation(validation):
+    """Markdown of a parsed validation: score, analysis and findings."""
+    parts = [f"**Score: {validation.score}/5**"] if validation.score is not None else []
+    parts.append(str(validation))
+    if validation.findings:
+        parts.append("\n".join(f"- {finding}" for finding in validation.findings))
+    return "\n\n".join(parts)
+
+def format_refinement(result):
+    """Markdown of a multi-round refinement: the best article, then a line per round."""
+    rounds = "\n".join(
+        f"- Round {r['round']}: changed {r['delta']:.0%}, score {r['score'] if r['score'] is not None else '-'}"
+        for r in result.rounds
+    )
+    return f"{result}\n\n**Rounds** (stopped: {result.stopped.replace('_', ' ')})\n\n{rounds}"
+
+def format_patched(article):
+    """Markdown of an article refined from edits, with the number applied or why it was rewritten."""
+    if article.mode == "patch":
+        return f"{article}\n\n_{len(article.edits)} edits applied to the draft._"
+    return f"{article}\n\n_Edits did not apply ({article.fallback_reason}); rewritten in full._"
+
+def _run_key(pipeline_name, inputs, llm_provider):
+    return pipeline_name, json.dumps(inputs, sort_keys=True), llm_provider
+
+def is_running(pipeline_name, inputs, llm_provider):
+    """Whether this session already has the pipeline running on these inputs, e.g. before a rerun."""
+    run = st.session_state.get("pipeline_runs", {}).get(_run_key(pipeline_name, inputs, llm_provider))
+    return run is not None and not run.future.done()
+
+def run_pipeline(agent_manager, pipeline_name, inputs, llm_provider, spinner_text):
+    """
+    Runs a pipeline in the background and streams each stage's output into its
+    own section as it arrives. A run survives reruns of the script: the next
+    run of this function picks it up again instead of starting over. Finished
+    results are memoised per pipeline, inputs and provider; a failed run is not.
+    """
+    key = _run_key(pipeline_name, inputs, llm_provider)
+    cache = get_result_cache() if pipeline_name in UI_CACHED_PIPELINES else None
+    output = cache.get(key) if cache is not None else None
+    if output is not None:
+        for stage, text in output["texts"].items():
+            st.subheader(STAGE_TITLES.get(stage, stage))
+            st.markdown(text)
+        st.caption(f"Completed in {output['total_ms'] / 1000:.1f}s (cached result)")
+        return output
+
+    runs = st.session_state.setdefault("pipeline_runs", {})
+    run = runs.get(key)
+    if run is None or run.future.done():
+        run = PipelineRun()
+        run.future = get_executor().submit(execute_pipeline, pipeline_name, inputs, llm_provider, agent_manager, run)
+        runs[key] = run
+
+    placeholders = {}
+    texts = {}
+
+    def show(stage, text):
+        if stage not in placeholders:
+            st.subheader(STAGE_TITLES.get(stage, stage))
+            placeholders[stage] = st.empty()
+        placeholders[stage].markdown(text)
+
+    seen = 0
+    with st.spinner(spinner_text):
+        while True:
+            done = run.future.done()
+            changed = set()
+            for stage, text, replace in run.events[seen:]:
+                texts[stage] = text if replace else texts.get(stage, "") + text
+                changed.add(stage)
+                seen += 1
+            for stage in texts:
+                if stage in changed:
+                    show(stage, texts[stage])
+            if done:
+                break
+            time.sleep(UI_POLL_INTERVAL)
+
+    runs.pop(key, None)
+    try:
+        output = run.future.result()
+    except StageError as e:
+        st.error(f"{e.label}: {e.error}")
+        logger.error(f"{pipeline_name} pipeline stage '{e.stage}' Error: {e.error}")
+        return None
+    except Exception as e:
+        st.error(f"Pipeline Error: {e}")
+        logger.exception(f"{pipeline_name} pipeline failed")
+        return None
+
+    if cache is not None:
+        cache.set(key, output)
+    # Stages that streamed nothing, e.g. a coalesced run, are shown in full
+    for stage, text in output["texts"].items():
+        if texts.get(stage) != text:
+            show(stage, text)
+    st.caption(f"Completed in {output['total_ms'] / 1000:.1f}s")
+    return output
+
 # ------------------- Summarization Section -------------------
 
 def summarize_section(agent_manager, llm_provider):
     st.header("Summarize Medical Text")
     text = st.text_area("Enter medical text to summarize:", height=200)
     
-    if st.button("Summarize"):
+    if st.button("Summarize") or is_running("summarize", {"text": text}, llm_provider):
         if text:
-            main_agent = agent_manager.get_agent("summarize")
-            validator_agent = agent_manager.get_agent("summarize_validator")
-            
-            main_agent.llm_provider = llm_provider
-            validator_agent.llm_provider = llm_provider
-
-            with st.spinner("Summarizing..."):
-                try:
-                    summary = main_agent.execute(text)
-                    st.subheader("Summary:")
-                    st.write(summary)
-                except Exception as e:
-                    st.error(f"Error: {e}")
-                    logger.error(f"SummarizeAgent Error: {e}")
-                    return
-
-            with st.spinner("Validating summary..."):
-                try:
-                    validation = validator_agent.execute(original_text=text, summary=summary)
-                    st.subheader("Validation:")
-                    st.write(validation)
-                except Exception as e:
-                    st.error(f"Validation Error: {e}")
-                    logger.error(f"SummarizeValidatorAgent Error: {e}")
+            run_pipeline(agent_manager, "summarize", {"text": text}, llm_provider, "Summarizing...")
         else:
             st.warning("Please enter some text to summarize.")
 
@@ -261,44 +425,10 @@ def write_and_refine_article_section(agent_manager, llm_provider):
     topic = st.text_input("Enter the topic for the research article:")
     outline = st.text_area("Enter an outline (optional):", height=150)
     
-    if st.button("Write and Refine Article"):
+    inputs = {"topic": topic, "outline": outline}
+    if st.button("Write and Refine Article") or is_running("write_and_refine", inputs, llm_provider):
         if topic:
-            writer_agent = agent_manager.get_agent("write_article")
-            refiner_agent = agent_manager.get_agent("refiner")
-            validator_agent = agent_manager.get_agent("validator")
-            
-            writer_agent.llm_provider = llm_provider
-            refiner_agent.llm_provider = llm_provider
-            validator_agent.llm_provider = llm_provider
-
-            with st.spinner("Writing article..."):
-                try:
-                    draft = writer_agent.execute(topic, outline)
-                    st.subheader("Draft Article:")
-                    st.write(draft)
-                except Exception as e:
-                    st.error(f"Error: {e}")
-                    logger.error(f"WriteArticleAgent Error: {e}")
-                    return
-
-            with st.spinner("Refining article..."):
-                try:
-                    refined_article = refiner_agent.execute(draft)
-                    st.subheader("Refined Article:")
-                    st.write(refined_article)
-                except Exception as e:
-                    st.error(f"Refinement Error: {e}")
-                    logger.error(f"RefinerAgent Error: {e}")
-                    return
-
-            with st.spinner("Validating article..."):
-                try:
-                    validation = validator_agent.execute(topic=topic, article=refined_article)
-                    st.subheader("Validation:")
-                    st.write(validation)
-                except Exception as e:
-                    st.error(f"Validation Error: {e}")
-                    logger.error(f"ValidatorAgent Error: {e}")
+            run_pipeline(agent_manager, "write_and_refine", inputs, llm_provider, "Writing and refining article...")
         else:
             st.warning("Please enter a topic for the research article.")
 
@@ -308,32 +438,9 @@ def sanitize_data_section(agent_manager, llm_provider):
     st.header("Sanitize Medical Data (PHI)")
     medical_data = st.text_area("Enter medical data to sanitize:", height=200)
     
-    if st.button("Sanitize Data"):
+    if st.button("Sanitize Data") or is_running("sanitize", {"medical_data": medical_data}, llm_provider):
         if medical_data:
-            main_agent = agent_manager.get_agent("sanitize_data")
-            validator_agent = agent_manager.get_agent("sanitize_data_validator")
-
-            main_agent.llm_provider = llm_provider
-            validator_agent.llm_provider = llm_provider
-
-            with st.spinner("Sanitizing data..."):
-                try:
-                    sanitized_data = main_agent.execute(medical_data)
-                    st.subheader("Sanitized Data:")
-                    st.write(sanitized_data)
-                except Exception as e:
-                    st.error(f"Error: {e}")
-                    logger.error(f"SanitizeDataAgent Error: {e}")
-                    return
-
-            with st.spinner("Validating sanitized data..."):
-                try:
-                    validation = validator_agent.execute(original_data=medical_data, sanitized_data=sanitized_data)
-                    st.subheader("Validation:")
-                    st.write(validation)
-                except Exception as e:
-                    st.error(f"Validation Error: {e}")
-                    logger.error(f"SanitizeDataValidatorAgent Error: {e}")
+            run_pipeline(agent_manager, "sanitize", {"medical_data": medical_data}, llm_provider, "Sanitizing data...")
         else:
             st.warning("Please enter medical data to sanitize.")
 
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import uuid
+
+import httpx
+
+from benchmarks.report import print_report, summarize
+
+# Request bodies per endpoint; a nonce is appended unless --repeat is given, so
+# response caches and request coalescing do not short-circuit the pipelines.
+PAYLOADS = {
+    "summarize": lambda nonce: {
+        "text": "A 58-year-old man presented with two days of intermittent chest pain radiating to the left arm. "
+                "ECG showed ST depression in leads V4-V6 and troponin was mildly elevated. He was started on "
+                f"aspirin, heparin and a beta blocker and referred for angiography. {nonce}",
+    },
+    "sanitize": lambda nonce: {
+        "medical_data": "Patient: Jane Doe, DOB 03/14/1975, MRN 00482913, phone (555) 201-3344. "
+                        "Seen at St. Mary's Hospital on 02/01/2024 for type 2 diabetes follow-up; "
+                        f"HbA1c 7.9%, metformin increased to 1000 mg twice daily. {nonce}",
+    },
+    "write_and_refine": lambda nonce: {
+        "topic": f"Remote patient monitoring for heart failure {nonce}".strip(),
+        "outline": "Background; current evidence; implementation barriers; outlook",
+    },
+}
+ENDPOINTS = {name: f"/{name}/" for name in PAYLOADS}
+SERVER_STATS = ("/stats/cache", "/stats/coalescing", "/stats/rate_limits", "/stats/hedging", "/stats/providers", "/stats/context")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class LoadGenerator:
+    """
+    Drives the API's pipeline endpoints either closed-loop (a fixed number of
+    concurrent clients) or open-loop (requests started at a fixed rate whether
+    or not earlier ones finished), and records every request's outcome.
+    """
+
+    def __init__(self, url, endpoints, llm_provider="openai", repeat=False, timeout=300.0):
+        self.url = url.rstrip("/")
+        self.endpoints = endpoints
+        self.llm_provider = llm_provider
+        self.repeat = repeat
+        self.timeout = timeout
+        self.samples = []
+        self._started = None
+
+    def _body(self, endpoint):
+        nonce = "" if self.repeat else f"[{uuid.uuid4().hex[:8]}]"
+        return {**PAYLOADS[endpoint](nonce), "llm_provider": self.llm_provider}
+
+    async def _one(self, client, endpoint, warmup):
+        started = time.perf_counter()
+        sample = {"endpoint": endpoint, "start_s": round(started - self._started, 3), "warmup": warmup}
+        try:
+            response = await client.post(ENDPOINTS[endpoint], json=self._body(endpoint))
+            sample["status"] = response.status_code
+            if response.status_code >= 400:
+                sample["error"] = response.text[:200]
+        except httpx.HTTPError as e:
+            sample["status"] = None
+            sample["error"] = f"{type(e).__name__}: {e}"
+        sample["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self.samples.append(sample)
+
+    def _client(self, connections):
+        return httpx.AsyncClient(
+            base_url=self.url,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        )
+
+    async def run_concurrency(self, concurrency, duration=None, requests=None, warmup=0.0):
+        """Closed loop: ``concurrency`` clients each send their next request as soon as the last returns."""
+        self._started = time.perf_counter()
+        stop_at = self._started + warmup + duration if duration else None
+        issued = 0
+
+        async def client_loop(client, index):
+            nonlocal issued
+            while True:
+                if stop_at is not None and time.perf_counter() >= stop_at:
+                    return
+                if requests is not None and issued >= requests:
+                    return
+                issued += 1
+                endpoint = self.endpoints[(index + issued) % len(self.endpoints)]
+                await self._one(client, endpoint, time.perf_counter() - self._started < warmup)
+
+        async with self._client(concurrency) as client:
+            await asyncio.gather(*(client_loop(client, i) for i in range(concurrency)))
+
+    async def run_rps(self, rps, duration=None, requests=None, warmup=0.0, poisson=False, max_in_flight=1000):
+        """Open loop: starts requests at ``rps`` per second (Poisson arrivals with ``poisson``)."""
+        self._started = time.perf_counter()
+        total = requests if requests is not None else int(rps * (warmup + (duration or 0)))
+        tasks = []
+        next_at = self._started
+        async with self._client(max_in_flight) as client:
+            for index in range(total):
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                endpoint = self.endpoints[index % len(self.endpoints)]
+                tasks.append(asyncio.ensure_future(self._one(client, endpoint, next_at - self._started < warmup)))
+                next_at += random.expovariate(rps) if poisson else 1 / rps
+            await asyncio.gather(*tasks)
+
+    async def server_stats(self):
+        """The API's own counters (cache, coalescing, rate limits...) at the end of the run."""
+        stats = {}
+        async with httpx.AsyncClient(base_url=self.url, timeout=10) as client:
+            for path in SERVER_STATS:
+                try:
+                    response = await client.get(path)
+                    if response.status_code == 200:
+                        stats[path] = response.json()
+                except httpx.HTTPError:
+                    pass
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the pipeline endpoints and record latency and throughput.")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", action="append", choices=sorted(PAYLOADS),
+                        help="endpoint to drive; repeat to mix several (default: summarize)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, help="closed loop with this many concurrent clients (default 8)")
+    mode.add_argument("--rps", type=float, help="open loop at this many requests per second")
+    parser.add_argument("--poisson", action="store_true", help="Poisson instead of evenly spaced arrivals (--rps)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to measure (default 30)")
+    parser.add_argument("--requests", type=int, help="stop after this many requests instead of --duration")
+    parser.add_argument("--warmup", type=float, default=0.0, help="seconds at the start left out of the results")
+    parser.add_argument("--llm-provider", default="openai")
+    parser.add_argument("--repeat", action="store_true", help="send identical payloads (measures caching and coalescing)")
+    parser.add_argument("--label", action="append", default=[], metavar="KEY=VALUE",
+                        help="tag the run, e.g. --label workers=4; repeatable")
+    parser.add_argument("--out", help="JSON results file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--no-samples", action="store_true", help="leave per-request samples out of the results file")
+    args = parser.parse_args()
+
+    endpoints = args.endpoint or ["summarize"]
+    generator = LoadGenerator(args.url, endpoints, llm_provider=args.llm_provider, repeat=args.repeat)
+    requests = args.requests
+    duration = None if requests is not None else args.duration
+
+    async def run():
+        if args.rps:
+            await generator.run_rps(args.rps, duration, requests, args.warmup, poisson=args.poisson)
+        else:
+            await generator.run_concurrency(args.concurrency or 8, duration, requests, args.warmup)
+        return await generator.server_stats()
+
+    wall_started = time.time()
+    server_stats = asyncio.run(run())
+    measured = [s for s in generator.samples if not s["warmup"]]
+
+    results = {
+        "meta": {
+            "timestamp": wall_started,
+            "commit": _git_commit(),
+            "url": args.url,
+            "endpoints": endpoints,
+            "mode": "rps" if args.rps else "concurrency",
+            "rps": args.rps,
+            "poisson": args.poisson if args.rps else None,
+            "concurrency": None if args.rps else (args.concurrency or 8),
+            "duration_s": duration,
+            "requests": requests,
+            "warmup_s": args.warmup,
+            "llm_provider": args.llm_provider,
+            "repeat": args.repeat,
+            "labels": dict(label.split("=", 1) for label in args.label if "=" in label),
+            "python": platform.python_version(),
+        },
+        "summary": summarize(measured),
+        "server_stats": server_stats,
+    }
+    if not args.no_samples:
+        results["samples"] = generator.samples
+
+    out = args.out or os.path.join("benchmarks", "results", time.strftime("%Y%m%d-%H%M%S", time.localtime(wall_started)) + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print_report(results)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
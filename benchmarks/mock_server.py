@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "patient presented with stable vitals and no acute distress the findings suggest a benign course "
+    "with follow up recommended in two weeks pending laboratory results and imaging review"
+).split()
+
+
+def parse_distribution(spec):
+    """
+    Returns a sampler of seconds for a latency spec: ``fixed:S``, ``uniform:LOW,HIGH``,
+    ``normal:MEAN,SD``, ``lognormal:MEDIAN,SIGMA`` or ``exp:MEAN``.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class MockConfig:
+    def __init__(self, latency="fixed:0.2", tokens_per_second=100.0, reply_tokens=120, error_rate=0.0,
+                 error_codes=(429, 500, 503), rpm=0, seed=None):
+        self.latency = latency
+        self.sample_latency = parse_distribution(latency)
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        # Simulated provider limit; 0 leaves requests unlimited
+        self.rpm = rpm
+        if seed is not None:
+            random.seed(seed)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=os.getenv("MOCK_LATENCY", "fixed:0.2"),
+            tokens_per_second=float(os.getenv("MOCK_TOKENS_PER_SECOND", 100)),
+            reply_tokens=int(os.getenv("MOCK_REPLY_TOKENS", 120)),
+            error_rate=float(os.getenv("MOCK_ERROR_RATE", 0)),
+            error_codes=[int(code) for code in os.getenv("MOCK_ERROR_CODES", "429,500,503").split(",")],
+            rpm=int(os.getenv("MOCK_RPM", 0)),
+            seed=int(os.environ["MOCK_SEED"]) if os.getenv("MOCK_SEED") else None,
+        )
+
+    def to_dict(self):
+        return {
+            "latency": self.latency,
+            "tokens_per_second": self.tokens_per_second,
+            "reply_tokens": self.reply_tokens,
+            "error_rate": self.error_rate,
+            "error_codes": list(self.error_codes),
+            "rpm": self.rpm,
+        }
+
+
+# OpenAI-compatible, so it serves both the OpenAI client (OPENAI_BASE_URL) and litellm's Groq route (GROQ_API_BASE)
+app = FastAPI(title="Mock LLM server")
+config = MockConfig.from_env()
+stats = {"requests": 0, "streamed": 0, "errors": 0, "rate_limited": 0, "prompt_tokens": 0, "completion_tokens": 0}
+_window = {"started": time.monotonic(), "count": 0}
+
+
+def _rate_limit_headers():
+    """Provider-style x-ratelimit-* headers over a fixed one-minute window."""
+    now = time.monotonic()
+    if now - _window["started"] >= 60:
+        _window.update(started=now, count=0)
+    _window["count"] += 1
+    reset = 60 - (now - _window["started"])
+    remaining = max(0, config.rpm - _window["count"])
+    headers = {
+        "x-ratelimit-limit-requests": str(config.rpm),
+        "x-ratelimit-remaining-requests": str(remaining),
+        "x-ratelimit-reset-requests": f"{reset:.2f}s",
+    }
+    return headers, _window["count"] > config.rpm, reset
+
+
+def _error(status, message, headers=None):
+    stats["errors"] += 1
+    return JSONResponse({"error": {"message": message, "type": "mock_error", "code": status}}, status_code=status, headers=headers)
+
+
+def _reply(max_tokens):
+    count = max(1, min(config.reply_tokens, max_tokens or config.reply_tokens))
+    return [WORDS[i % len(WORDS)] for i in range(count)]
+
+
+@app.post("/v1/chat/completions")
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    headers = {}
+    if config.rpm:
+        headers, limited, reset = _rate_limit_headers()
+        if limited:
+            stats["rate_limited"] += 1
+            return _error(429, "Rate limit reached (mock)", {**headers, "retry-after": f"{reset:.2f}"})
+    if config.error_rate and random.random() < config.error_rate:
+        status = random.choice(config.error_codes)
+        return _error(status, f"Injected {status} (mock)", {"retry-after": "1"} if status == 429 else None)
+
+    model = body.get("model", "mock")
+    prompt_tokens = sum(len(str(m.get("content", ""))) // 4 + 4 for m in body.get("messages", []))
+    words = _reply(body.get("max_tokens"))
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += len(words)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    # Time to first token
+    await asyncio.sleep(config.sample_latency())
+
+    if not body.get("stream"):
+        await asyncio.sleep(len(words) / config.tokens_per_second)
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": " ".join(words)}}],
+            "usage": usage,
+        }, headers=headers)
+
+    stats["streamed"] += 1
+    include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+    def chunk(delta, finish_reason=None, chunk_usage=None):
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+        }
+        if chunk_usage:
+            data["usage"] = chunk_usage
+        return f"data: {json.dumps(data)}\n\n"
+
+    async def events():
+        yield chunk({"role": "assistant", "content": ""})
+        for index, word in enumerate(words):
+            yield chunk({"content": word if index == 0 else f" {word}"})
+            await asyncio.sleep(1 / config.tokens_per_second)
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            yield chunk(None, chunk_usage=usage)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@app.get("/mock/stats")
+async def get_stats():
+    return {"config": config.to_dict(), **stats}
+
+
+@app.post("/mock/config")
+async def update_config(request: Request):
+    """Changes the mock's behaviour between runs, e.g. {"latency": "uniform:0.1,0.5", "error_rate": 0.05}."""
+    global config
+    config = MockConfig(**{**config.to_dict(), **await request.json()})
+    return config.to_dict()
+
+
+def main():
+    global config
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default=config.latency, help="fixed:S, uniform:LO,HI, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or exp:MEAN")
+    parser.add_argument("--tokens-per-second", type=float, default=config.tokens_per_second)
+    parser.add_argument("--reply-tokens", type=int, default=config.reply_tokens)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--error-codes", default=",".join(str(code) for code in config.error_codes))
+    parser.add_argument("--rpm", type=int, default=config.rpm, help="simulated requests-per-minute limit (0 = none)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        error_codes=[int(code) for code in args.error_codes.split(",")],
+        rpm=args.rpm,
+        seed=args.seed,
+    )
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
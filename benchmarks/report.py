@@ -0,0 +1,116 @@
+import argparse
+import json
+
+from src.utils.stats import latency_summary
+
+METRICS = ("throughput_rps", "error_rate", "p50", "p95", "p99", "mean")
+# Metrics where a higher value is an improvement
+HIGHER_IS_BETTER = {"throughput_rps"}
+
+
+def _summary(samples):
+    if not samples:
+        return {"requests": 0}
+    ok = [s for s in samples if s.get("status") is not None and s["status"] < 400]
+    started = min(s["start_s"] for s in samples)
+    finished = max(s["start_s"] + s["latency_ms"] / 1000 for s in samples)
+    elapsed = finished - started
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "errors": len(samples) - len(ok),
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+        # Latency of successful requests; failures often return early and would flatter the numbers
+        "latency_ms": latency_summary([s["latency_ms"] for s in ok]),
+    }
+
+
+def summarize(samples):
+    """Overall and per-endpoint request counts, error rate, throughput and latency percentiles."""
+    summary = {"overall": _summary(samples), "endpoints": {}}
+    for endpoint in sorted({s["endpoint"] for s in samples}):
+        summary["endpoints"][endpoint] = _summary([s for s in samples if s["endpoint"] == endpoint])
+    return summary
+
+
+def _metric(summary, name):
+    if name in ("throughput_rps", "error_rate"):
+        return summary.get(name)
+    return summary.get("latency_ms", {}).get(name)
+
+
+def _rows(results):
+    summary = results["summary"]
+    yield "overall", summary["overall"]
+    yield from summary["endpoints"].items()
+
+
+def _format(value):
+    return "-" if value is None else f"{value:,.2f}" if isinstance(value, float) else str(value)
+
+
+def print_report(results, baseline=None):
+    """Prints a run's summary; with ``baseline``, adds the relative change of each metric."""
+    meta = results["meta"]
+    mode = f"{meta['rps']} rps" if meta["mode"] == "rps" else f"concurrency {meta['concurrency']}"
+    labels = " ".join(f"{k}={v}" for k, v in meta.get("labels", {}).items())
+    print(f"Run {meta.get('commit') or '?'} against {meta['url']} ({mode}) {labels}".rstrip())
+
+    base_rows = dict(_rows(baseline)) if baseline else {}
+    header = ["endpoint", "requests"] + [name if name in ("throughput_rps", "error_rate") else f"{name}_ms" for name in METRICS]
+    print(f"{header[0]:<18}" + "".join(f"{h:>20}" for h in header[1:]))
+    for name, summary in _rows(results):
+        cells = [name, str(summary.get("requests", 0))]
+        for metric in METRICS:
+            value = _metric(summary, metric)
+            cell = _format(value)
+            base = _metric(base_rows[name], metric) if name in base_rows else None
+            if value is not None and base:
+                change = (value - base) / base * 100
+                cell += f" ({change:+.1f}%)"
+            cells.append(cell)
+        print(f"{cells[0]:<18}" + "".join(f"{c:>20}" for c in cells[1:]))
+
+
+def compare(results, baseline):
+    """Machine-readable relative change of every metric against ``baseline``."""
+    base_rows = dict(_rows(baseline))
+    changes = {}
+    for name, summary in _rows(results):
+        if name not in base_rows:
+            continue
+        changes[name] = {}
+        for metric in METRICS:
+            value, base = _metric(summary, metric), _metric(base_rows[name], metric)
+            if value is None or not base:
+                continue
+            change = (value - base) / base
+            better = change > 0 if metric in HIGHER_IS_BETTER else change < 0
+            changes[name][metric] = {"value": value, "baseline": base, "change": round(change, 4), "improved": better}
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a benchmark run, optionally compared with a baseline run.")
+    parser.add_argument("results", help="results file written by benchmarks.load")
+    parser.add_argument("baseline", nargs="?", help="earlier results file to compare against")
+    parser.add_argument("--json", action="store_true", help="print the comparison as JSON")
+    args = parser.parse_args()
+
+    with open(args.results) as f:
+        results = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.json:
+        print(json.dumps(compare(results, baseline) if baseline else results["summary"], indent=2))
+    else:
+        print_report(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.load import _git_commit
+
+# Run in a fresh interpreter per sample, so nothing is already imported or cached
+PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+if {eager!r}:
+    main.agent_manager.preload()
+ready = time.perf_counter()
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+print(json.dumps({{
+    "import_s": imported - started,
+    "ready_s": ready - started,
+    "rss_mb": rss_mb(),
+    "litellm_loaded": "litellm" in sys.modules,
+    "openai_loaded": "openai" in sys.modules,
+    "agents_built": len(main.agent_manager.agents),
+}}))
+"""
+
+
+def _median(samples, key):
+    values = [s[key] for s in samples]
+    return round(statistics.median(values), 3) if values else None
+
+
+def measure_import(eager=False, repeat=5):
+    """Import time and resident memory of one process loading the app, lazily or with everything preloaded."""
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(eager=eager)], capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "mode": "eager" if eager else "lazy",
+        "import_s": _median(samples, "import_s"),
+        "ready_s": _median(samples, "ready_s"),
+        "rss_mb": _median(samples, "rss_mb"),
+        "litellm_loaded": samples[-1]["litellm_loaded"],
+        "openai_loaded": samples[-1]["openai_loaded"],
+        "agents_built": samples[-1]["agents_built"],
+    }
+
+
+def _memory(pid):
+    """RSS and PSS in MB; PSS splits pages shared with other processes between them."""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    memory[name.lower() + "_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return memory
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def measure_gunicorn(workers=4, preload=True, port=8011, probe="/stats/cache", timeout=120.0):
+    """Boots gunicorn with ``workers`` workers and records time to first response and per-worker memory."""
+    env = {**os.environ, "GUNICORN_PRELOAD": str(preload).lower(), "WEB_CONCURRENCY": str(workers),
+           "GUNICORN_BIND": f"127.0.0.1:{port}", "JOBS_WORKERS": os.getenv("JOBS_WORKERS", "0")}
+    started = time.perf_counter()
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready_s = None
+        while time.perf_counter() - started < timeout:
+            if master.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {master.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}{probe}", timeout=1).status_code == 200:
+                    ready_s = time.perf_counter() - started
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        if ready_s is None:
+            raise RuntimeError(f"gunicorn did not answer within {timeout:.0f}s")
+        # Let the remaining workers finish booting before reading their memory
+        while len(_children(master.pid)) < workers and time.perf_counter() - started < timeout:
+            time.sleep(0.1)
+        time.sleep(2)
+        per_worker = [_memory(pid) for pid in _children(master.pid)]
+        return {
+            "mode": "preload" if preload else "no-preload",
+            "workers": workers,
+            "first_response_s": round(ready_s, 3),
+            "master": _memory(master.pid),
+            "per_worker": per_worker,
+            "worker_rss_mb": round(statistics.mean(w["rss_mb"] for w in per_worker), 1) if per_worker else None,
+            "worker_pss_mb": round(statistics.mean(w["pss_mb"] for w in per_worker), 1) if per_worker else None,
+            "total_pss_mb": round(sum(w.get("pss_mb", 0) for w in [_memory(master.pid), *per_worker]), 1),
+        }
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+
+def print_report(results):
+    print(f"Startup of {results['meta'].get('commit') or '?'}")
+    print(f"{'import':<12}{'import_s':>12}{'ready_s':>12}{'rss_mb':>12}  loaded")
+    for row in results["imports"]:
+        loaded = ", ".join(name for name in ("openai", "litellm") if row[f"{name}_loaded"]) or "-"
+        print(f"{row['mode']:<12}{row['import_s']:>12}{row['ready_s']:>12}{row['rss_mb']:>12.1f}  {loaded}, {row['agents_built']} agents")
+    if results["gunicorn"]:
+        print(f"\n{'gunicorn':<12}{'workers':>10}{'first_s':>10}{'rss/worker':>12}{'pss/worker':>12}{'total_pss':>12}")
+        for row in results["gunicorn"]:
+            print(f"{row['mode']:<12}{row['workers']:>10}{row['first_response_s']:>10}"
+                  f"{row['worker_rss_mb'] or '-':>12}{row['worker_pss_mb'] or '-':>12}{row['total_pss_mb']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import time and per-worker memory.")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per import measurement (median)")
+    parser.add_argument("--gunicorn", action="store_true", help="also boot gunicorn with and without --preload")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--out", help="JSON results file (default benchmarks/results/startup-<timestamp>.json)")
+    args = parser.parse_args()
+
+    wall_started = time.time()
+    results = {
+        "meta": {"timestamp": wall_started, "commit": _git_commit(), "python": sys.version.split()[0], "repeat": args.repeat},
+        "imports": [measure_import(eager=False, repeat=args.repeat), measure_import(eager=True, repeat=args.repeat)],
+        "gunicorn": [],
+    }
+    if args.gunicorn:
+        for preload in (False, True):
+            results["gunicorn"].append(measure_gunicorn(args.workers, preload, args.port))
+
+    out = args.out or os.path.join("benchmarks", "results", time.strftime("startup-%Y%m%d-%H%M%S", time.localtime(wall_started)) + ".json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print_report(results)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
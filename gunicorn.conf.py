@@ -0,0 +1,26 @@
+import gc
+import os
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+# Import the app once in the master; workers are forked from it and share its memory
+preload_app = _env_bool("GUNICORN_PRELOAD", True)
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    if not server.cfg.preload_app:
+        return
+    from main import agent_manager
+
+    agent_manager.preload()
+    # Keep the collector from touching (and so copying) the objects the workers inherit
+    gc.freeze()
+    server.log.info("Preloaded provider SDKs and agents")
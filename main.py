@@ -1,9 +1,17 @@
+import asyncio
+import json
 import os
+import time
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
-from src.agents import AgentManager
+from src.agents import REFINE_ROUNDS_LIMIT, AgentManager, StageError
+from src.jobs import JobRunner
+from src.utils.logger import logger
+from src.utils.stats import latency_summary
+from src.utils.usage_ledger import parse_window, usage_endpoint
 
 # Load environment variables
 load_dotenv()
@@ -22,20 +30,54 @@ app = FastAPI(title="Multi-Agent AI System API", version="1.0")
 # Initialize Agent Manager
 agent_manager = AgentManager(max_retries=3, verbose=True)
 
+# Background workers for /jobs; JOBS_WORKERS=0 leaves jobs to `python -m src.jobs.runner`
+job_runner = JobRunner.from_env(agent_manager)
+
+@app.on_event("startup")
+async def start_job_runner():
+    job_runner.start()
+
+@app.on_event("shutdown")
+async def close_provider_clients():
+    """Releases the pooled provider connections held by this worker."""
+    await job_runner.stop()
+    await agent_manager.clients.aclose()
+    if agent_manager.usage_ledger is not None:
+        agent_manager.usage_ledger.close()
+    # Drain the queued log sinks before the worker exits
+    await logger.complete()
+
+@app.middleware("http")
+async def tag_usage_endpoint(request: Request, call_next):
+    """Attributes the LLM calls made while serving a request to its endpoint."""
+    token = usage_endpoint.set(request.url.path)
+    try:
+        return await call_next(request)
+    finally:
+        usage_endpoint.reset(token)
+
 # ------------------- Request Models -------------------
 
 class SummarizationRequest(BaseModel):
     text: str
     llm_provider: str = "openai"
+    # Overrides the provider's model for this request
+    model: str = None
 
 class WritingRequest(BaseModel):
     topic: str
     outline: str = None
+    # Refinement rounds (1 to REFINE_ROUNDS_LIMIT); None uses REFINE_MAX_ROUNDS
+    refine_rounds: int = Field(None, ge=1, le=REFINE_ROUNDS_LIMIT)
     llm_provider: str = "openai"
+    # Overrides the provider's model for this request
+    model: str = None
 
 class SanitizationRequest(BaseModel):
     medical_data: str
     llm_provider: str = "openai"
+    # Overrides the provider's model for this request
+    model: str = None
 
 @app.get("/env")
 async def get_env_vars():
@@ -44,30 +86,86 @@ async def get_env_vars():
         "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
         "GROQ_API_KEY": os.getenv("GROQ_API_KEY"),
     }
+@app.get("/providers")
+async def get_providers():
+    """Registered LLM providers and the model each agent uses on them."""
+    return {"providers": agent_manager.providers(), "agents": agent_manager.models()}
+
+@app.get("/stats/cache")
+async def get_cache_stats():
+    """Hit/miss counters of this worker's LLM response cache."""
+    return agent_manager.cache_stats()
+
+@app.get("/stats/coalescing")
+async def get_coalescing_stats():
+    """How many identical LLM calls and pipeline runs joined one already in flight."""
+    return agent_manager.coalescing_stats()
+
+@app.get("/stats/context")
+async def get_context_window_stats():
+    """How many LLM calls had their input compressed or trimmed, or their output capped, to fit the model."""
+    return agent_manager.context_window_stats()
+
+@app.get("/stats/providers")
+async def get_provider_stats():
+    """Circuit breaker state of each LLM provider in this worker."""
+    return agent_manager.clients.breaker_stats()
+
+@app.get("/stats/rate_limits")
+async def get_rate_limit_stats():
+    """Queue depth, wait times and current bucket levels of the outbound rate limiter."""
+    return agent_manager.clients.rate_limiter.stats()
+
+@app.get("/stats/hedging")
+async def get_hedging_stats():
+    """Hedge rate, win/loss counts and current hedge delays of this worker."""
+    return agent_manager.clients.hedging.stats()
+
+@app.get("/stats/usage")
+async def get_usage_stats(group_by: str = "endpoint", since: str = None):
+    """Token, cost and latency totals from the usage ledger, e.g. ?group_by=agent,provider&since=24h."""
+    keys = [key.strip() for key in group_by.split(",") if key.strip()]
+    try:
+        start = time.time() - parse_window(since) if since else None
+        report = await asyncio.to_thread(agent_manager.usage_report, keys, start)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report is None:
+        raise HTTPException(status_code=404, detail="Usage ledger is disabled.")
+    return {"group_by": keys, "rows": report}
+
+# ------------------- Pipeline Helpers -------------------
+
+async def _run_pipeline(name, inputs, request):
+    pipeline = agent_manager.get_pipeline(name)
+    try:
+        return await pipeline.arun(agent_manager, inputs, context=agent_manager.context(request.llm_provider, request.model))
+    except StageError as e:
+        raise HTTPException(status_code=500, detail=f"{e.label}: {str(e.error)}")
+
 # ------------------- Summarization Endpoint -------------------
 
 @app.post("/summarize/")
 async def summarize_text(request: SummarizationRequest):
     """API for summarizing medical text."""
-    main_agent = agent_manager.get_agent("summarize")
-    validator_agent = agent_manager.get_agent("summarize_validator")
-
-    main_agent.llm_provider = request.llm_provider.lower()
-    validator_agent.llm_provider = request.llm_provider.lower()
-
-    try:
-        summary = main_agent.execute(request.text)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Summarization Error: {str(e)}")
+    result = await _run_pipeline("summarize", {"text": request.text}, request)
+    return _summarize_response(result)
 
-    try:
-        validation = validator_agent.execute(original_text=request.text, summary=summary)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Validation Error: {str(e)}")
+def _validation_fields(validation):
+    """The validator's analysis with its parsed 1-5 score and findings."""
+    return {
+        "validation": validation,
+        "validation_score": getattr(validation, "score", None),
+        "validation_findings": getattr(validation, "findings", []),
+    }
 
+def _summarize_response(result):
+    summary = result["summary"]
     return {
         "summary": summary,
-        "validation": validation
+        **_validation_fields(result["validation"]),
+        "approximate_match": getattr(summary, "similarity", None),
+        "timings": result.timings
     }
 
 # ------------------- Writing & Refining Endpoint -------------------
@@ -75,33 +173,30 @@ async def summarize_text(request: SummarizationRequest):
 @app.post("/write_and_refine/")
 async def write_and_refine_article(request: WritingRequest):
     """API for writing and refining research articles."""
-    writer_agent = agent_manager.get_agent("write_article")
-    refiner_agent = agent_manager.get_agent("refiner")
-    validator_agent = agent_manager.get_agent("validator")
-
-    writer_agent.llm_provider = request.llm_provider.lower()
-    refiner_agent.llm_provider = request.llm_provider.lower()
-    validator_agent.llm_provider = request.llm_provider.lower()
-
-    try:
-        draft = writer_agent.execute(request.topic, request.outline)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Writing Error: {str(e)}")
-
-    try:
-        refined_article = refiner_agent.execute(draft)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Refinement Error: {str(e)}")
-
-    try:
-        validation = validator_agent.execute(topic=request.topic, article=refined_article)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Validation Error: {str(e)}")
+    inputs = {"topic": request.topic, "outline": request.outline, "refine_rounds": request.refine_rounds}
+    result = await _run_pipeline("write_and_refine", inputs, request)
+    refined, iterations = result["refined"], result["iterations"]
+    if iterations is not None:
+        article, validation = iterations, iterations.validation
+    elif refined is not None:
+        article, validation = refined, result["validation"]
+    else:
+        # A draft that passed its review is the final article, with that review as its validation
+        article, validation = result["draft"], result["draft_review"]
 
     return {
-        "draft_article": draft,
-        "refined_article": refined_article,
-        "validation": validation
+        "draft_article": result["draft"],
+        "refined_article": article,
+        "refinement_skipped": refined is None,
+        # REFINE_MODE=patch: the edits applied to the draft, or why it was rewritten in full instead
+        "refinement_mode": getattr(refined, "mode", None),
+        "refinement_edits": getattr(refined, "edits", None),
+        "refinement_fallback_reason": getattr(refined, "fallback_reason", None),
+        "refinement_rounds": iterations.rounds if iterations is not None else None,
+        "refinement_stopped": iterations.stopped if iterations is not None else None,
+        "draft_review": result["draft_review"].to_dict() if result["draft_review"] is not None else None,
+        **_validation_fields(validation),
+        "timings": result.timings
     }
 
 # ------------------- Sanitization Endpoint -------------------
@@ -109,27 +204,236 @@ async def write_and_refine_article(request: WritingRequest):
 @app.post("/sanitize/")
 async def sanitize_medical_data(request: SanitizationRequest):
     """API for sanitizing medical data (PHI removal)."""
-    main_agent = agent_manager.get_agent("sanitize_data")
-    validator_agent = agent_manager.get_agent("sanitize_data_validator")
+    result = await _run_pipeline("sanitize", {"medical_data": request.medical_data}, request)
+    return _sanitize_response(result)
+
+def _sanitize_response(result):
+    sanitized_data = result["sanitized"]
+    return {
+        "sanitized_data": sanitized_data,
+        **_validation_fields(result["validation"]),
+        "approximate_match": getattr(sanitized_data, "similarity", None),
+        # Offsets and categories only; the redacted values never appear in responses
+        "redactions": result["prescrub"].spans,
+        # PHI still found in the sanitized text, by category
+        "residual_phi": result["residual_phi"].counts(),
+        "timings": result.timings
+    }
 
-    main_agent.llm_provider = request.llm_provider.lower()
-    validator_agent.llm_provider = request.llm_provider.lower()
+# ------------------- Background Job Endpoints -------------------
 
-    try:
-        sanitized_data = main_agent.execute(request.medical_data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Sanitization Error: {str(e)}")
+JOBS_MAX_WAIT = 60
 
-    try:
-        validation = validator_agent.execute(original_data=request.medical_data, sanitized_data=sanitized_data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Validation Error: {str(e)}")
+# Request model of each pipeline; a job body is validated like the matching endpoint's
+JOB_REQUESTS = {
+    "summarize": SummarizationRequest,
+    "write_and_refine": WritingRequest,
+    "sanitize": SanitizationRequest,
+}
 
+@app.post("/jobs/{pipeline_name}", status_code=202)
+async def create_job(pipeline_name: str, request: Request):
+    """Queues a pipeline run and returns its job id at once."""
+    model = JOB_REQUESTS.get(pipeline_name)
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"Pipeline {pipeline_name} not found.")
+    try:
+        payload = model(**await request.json())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid job payload: {str(e)}")
+
+    options = {"llm_provider": payload.llm_provider, "model": payload.model}
+    # Every other field is an input, so optional ones such as refine_rounds reach the pipeline too
+    inputs = {name: value for name, value in payload if name not in options}
+    job_id = await job_runner.submit(pipeline_name, inputs, options)
+    return {"id": job_id, "status": "queued", "pipeline": pipeline_name}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """
+    Status and per-stage partial results of a job. With ?wait=<seconds> the call
+    long-polls until the job finishes or the wait (at most 60s) runs out.
+    """
+    if wait > 0:
+        job = await job_runner.wait(job_id, min(wait, JOBS_MAX_WAIT))
+    else:
+        job = await asyncio.to_thread(job_runner.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
     return {
-        "sanitized_data": sanitized_data,
-        "validation": validation
+        "id": job["id"],
+        "pipeline": job["pipeline"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "stages": job["stages"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
     }
 
+@app.get("/stats/jobs")
+async def get_job_stats():
+    """Number of jobs in each status."""
+    return await asyncio.to_thread(job_runner.store.counts)
+
+# ------------------- Streaming (Server-Sent Events) Endpoints -------------------
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_pipeline(name, inputs, request):
+    """Runs a pipeline and relays its tokens and stage results as Server-Sent Events."""
+    pipeline = agent_manager.get_pipeline(name)
+
+    async def events():
+        queue = asyncio.Queue()
+
+        def on_token(stage, delta):
+            queue.put_nowait(_sse("token", {"stage": stage, "delta": delta}))
+
+        def on_stage_complete(stage, output, timing):
+            data = {"stage": stage, "timing": timing}
+            data.update(output.to_dict() if hasattr(output, "to_dict") else {"text": output})
+            queue.put_nowait(_sse("stage_complete", data))
+
+        task = asyncio.create_task(pipeline.arun(
+            agent_manager,
+            inputs,
+            context=agent_manager.context(request.llm_provider, request.model),
+            on_token=on_token,
+            on_stage_complete=on_stage_complete,
+        ))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+            result = task.result()
+        except StageError as e:
+            yield _sse("error", {"stage": e.stage, "detail": f"{e.label}: {str(e.error)}"})
+            return
+        except Exception as e:
+            # The response has already started, so the client only learns of this from the stream
+            logger.exception(f"[Stream:{name}] Pipeline failed")
+            yield _sse("error", {"stage": None, "detail": f"Pipeline Error: {str(e)}"})
+            return
+        finally:
+            task.cancel()
+        yield _sse("done", {"total_ms": result.total_ms})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/summarize/stream")
+async def summarize_text_stream(request: SummarizationRequest):
+    """Streams the summary and its validation as Server-Sent Events."""
+    return _stream_pipeline("summarize", {"text": request.text}, request)
+
+@app.post("/write_and_refine/stream")
+async def write_and_refine_article_stream(request: WritingRequest):
+    """Streams the draft, refined article and validation as Server-Sent Events."""
+    inputs = {"topic": request.topic, "outline": request.outline, "refine_rounds": request.refine_rounds}
+    return _stream_pipeline("write_and_refine", inputs, request)
+
+@app.post("/sanitize/stream")
+async def sanitize_medical_data_stream(request: SanitizationRequest):
+    """Streams the sanitized data and its validation as Server-Sent Events."""
+    return _stream_pipeline("sanitize", {"medical_data": request.medical_data}, request)
+
+# ------------------- Batch Endpoints -------------------
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 64))
+
+async def _read_batch(request, field):
+    """
+    Reads batch items either from a JSON body ({"items": [...], "llm_provider": ..., "model": ..., "concurrency": ...})
+    or from an NDJSON upload (one string or object per line, options in the query string).
+    Returns the items' inputs, the context they run under and the concurrency.
+    """
+    content_type = request.headers.get("content-type", "")
+    options = dict(request.query_params)
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            body = (await request.body()).decode("utf-8")
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            payload = await request.json()
+            items = payload.get("items", [])
+            options.update({k: v for k, v in payload.items() if k != "items"})
+    except (ValueError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch payload: {str(e)}")
+
+    inputs = []
+    for index, item in enumerate(items):
+        value = item.get(field) if isinstance(item, dict) else item
+        if not isinstance(value, str):
+            raise HTTPException(status_code=400, detail=f"Item {index} has no '{field}' text.")
+        inputs.append({field: value})
+
+    concurrency = options.get("concurrency", BATCH_CONCURRENCY)
+    # A number in a JSON body, text in the query string; either way a positive whole number
+    if isinstance(concurrency, bool) or not str(concurrency).strip().isdigit() or int(concurrency) < 1:
+        raise HTTPException(status_code=400, detail=f"Invalid concurrency {concurrency!r}: expected a positive integer.")
+    concurrency = min(int(concurrency), BATCH_MAX_CONCURRENCY)
+
+    llm_provider, model = options.get("llm_provider", "openai"), options.get("model")
+    if not isinstance(llm_provider, str) or llm_provider.lower() not in agent_manager.clients.registry:
+        raise HTTPException(status_code=400, detail=f"Invalid llm_provider {llm_provider!r}.")
+    if model is not None and not isinstance(model, str):
+        raise HTTPException(status_code=400, detail=f"Invalid model {model!r}: expected a string.")
+    return inputs, agent_manager.context(llm_provider, model), concurrency
+
+def _stream_batch(name, inputs, context, concurrency, to_response):
+    """Streams one NDJSON line per item as it completes, then a batch summary line."""
+    pipeline = agent_manager.get_pipeline(name)
+
+    async def lines():
+        started = time.perf_counter()
+        latencies, failed = [], 0
+        items = pipeline.abatch(agent_manager, inputs, concurrency=concurrency, context=context)
+        async for index, result, error, latency_ms in items:
+            latencies.append(latency_ms)
+            if error is None:
+                line = {"index": index, **to_response(result), "latency_ms": latency_ms}
+            else:
+                failed += 1
+                detail = f"{error.label}: {str(error.error)}" if isinstance(error, StageError) else str(error)
+                line = {"index": index, "error": detail, "latency_ms": latency_ms}
+            yield json.dumps(line) + "\n"
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            "items": len(inputs),
+            "succeeded": len(inputs) - failed,
+            "failed": failed,
+            "concurrency": concurrency,
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "throughput_per_s": round(len(inputs) / elapsed, 2) if elapsed else None,
+            "latency_ms": latency_summary(latencies),
+        }
+        yield json.dumps({"batch": summary}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/summarize/batch")
+async def summarize_batch(request: Request):
+    """Summarizes many texts with bounded concurrency, streaming NDJSON results."""
+    inputs, context, concurrency = await _read_batch(request, "text")
+    return _stream_batch("summarize", inputs, context, concurrency, _summarize_response)
+
+@app.post("/sanitize/batch")
+async def sanitize_batch(request: Request):
+    """Sanitizes many records with bounded concurrency, streaming NDJSON results."""
+    inputs, context, concurrency = await _read_batch(request, "medical_data")
+    return _stream_batch("sanitize", inputs, context, concurrency, _sanitize_response)
+
 # ------------------- Run the API -------------------
 if __name__ == "__main__":
     import uvicorn
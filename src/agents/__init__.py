@@ -1,30 +1,159 @@
+import threading
+
 from .refiner_agent import RefinerAgent
+from .patch_refiner_agent import PatchRefinerAgent
 from .write_article_validator_agent import WriteArticlealidatorAgent
 from .sanitize_data_validator_agent import SanitizeDataValidatorAgent
 from .summary_validator_agent import SummaryValidatorAgent
 from .validator_agent import ValidatorAgent
+from .pipeline import PIPELINES, Pipeline, PipelineResult, Stage, StageError
+from .context import AgentContext
+from .validation import Validation, parse_validation
+from .refinement import REFINE_ROUNDS_LIMIT, RefinementResult
+from .patching import PatchedArticle, PatchError, apply_edits, parse_edits
+from .agent_base import DEFAULT_LLM
 
 from src.tools.sanitize_data_tool import SanitizeDataTool
 from src.tools.summarize_tool import SummarizeTool
 from src.tools.write_article_tool import WriteArticleTool
+from src.providers import ProviderClients, load_agent_routes
+from src.utils.context_window import ContextWindowManager
+from src.utils.llm_cache import LLMCache
+from src.utils.similarity_cache import SimilarityCache
+from src.utils.single_flight import SingleFlight
+from src.utils.usage_ledger import UsageLedger
+
+# Agent classes by name; AgentManager builds each one the first time it is asked for
+AGENT_CLASSES = {
+    "summarize": SummarizeTool,
+    "write_article": WriteArticleTool,
+    "sanitize_data": SanitizeDataTool,
+
+    "summarize_validator": SummaryValidatorAgent,
+    "write_article_validator": WriteArticlealidatorAgent,
+    "sanitize_data_validator": SanitizeDataValidatorAgent,
+    "refiner": RefinerAgent,
+    "patch_refiner": PatchRefinerAgent,
+    "validator": ValidatorAgent,
+}
 
 class AgentManager:
-    def __init__(self, max_retries=3, verbose=True):
-        self.agents = {
-        "summarize": SummarizeTool(max_retries=max_retries, verbose=verbose),
-        "write_article": WriteArticleTool(max_retries=max_retries, verbose=verbose),
-        "sanitize_data": SanitizeDataTool(max_retries=max_retries, verbose=verbose),
-
-        "summarize_validator": SummaryValidatorAgent(max_retries=max_retries, verbose=verbose),
-        "write_article_validator": WriteArticlealidatorAgent(max_retries=max_retries, verbose=verbose),
-        "sanitize_data_validator": SanitizeDataValidatorAgent(max_retries=max_retries, verbose=verbose),
-        "refiner": RefinerAgent(max_retries=max_retries, verbose=verbose),
-        "validator": ValidatorAgent(max_retries=max_retries, verbose=verbose)
+    def __init__(self, max_retries=3, verbose=True, clients=None, cache=None, similarity_cache=None, usage_ledger=None, single_flight=None, routes=None, context_window=None):
+        # One pooled client set and one set of caches per worker, shared by all agents
+        self.clients = clients or ProviderClients.from_env()
+        self.cache = cache if cache is not None else LLMCache.from_env()
+        self.similarity_cache = similarity_cache if similarity_cache is not None else SimilarityCache.from_env()
+        self.usage_ledger = usage_ledger if usage_ledger is not None else UsageLedger.from_env()
+        self.single_flight = single_flight if single_flight is not None else SingleFlight.from_env()
+        self.context_window = context_window if context_window is not None else ContextWindowManager.from_env()
+        self._common = {
+            "max_retries": max_retries,
+            "verbose": verbose,
+            "clients": self.clients,
+            "cache": self.cache,
+            "similarity_cache": self.similarity_cache,
+            "usage_ledger": self.usage_ledger,
+            "single_flight": self.single_flight,
+            "context_window": self.context_window,
         }
+        # Per-agent provider pins and models, e.g. cheap validators on a smaller model
+        self.routes = routes if routes is not None else load_agent_routes()
+        unknown = set(self.routes) - set(AGENT_CLASSES)
+        if unknown:
+            raise ValueError(f"Agent routes name unknown agents: {sorted(unknown)}")
+        # Route mistakes still surface at startup, not on the first request
+        for name in self.routes:
+            self._route(name)
+
+        # Agents built so far, by name
+        self.agents = {}
+        self._agents_lock = threading.Lock()
+
+    def _route(self, agent_name):
+        route = self.routes.get(agent_name, {})
+        provider = route.get("provider")
+        for name in [provider, *route.get("models", {})]:
+            if name and name not in self.clients.registry:
+                raise ValueError(f"Agent route for {agent_name} names unknown provider {name}.")
+        return {"models": route.get("models"), "pinned_provider": provider}
     
+    def context(self, llm_provider=None, model=None, deadline=None, trace_id=None, use_cache=None):
+        """
+        Per-request execution context for the shared agents. Agents are never
+        mutated per request; everything request-specific travels in the context.
+        """
+        return AgentContext(
+            (llm_provider or DEFAULT_LLM).lower(),
+            model=model,
+            deadline=deadline,
+            trace_id=trace_id,
+            use_cache=use_cache,
+        )
+
+    def providers(self):
+        """Registered providers with their default models."""
+        registry = self.clients.registry
+        return {name: registry.default_model(name) for name in registry.names()}
+
+    def models(self):
+        """Model each agent uses on each provider, and the provider it is pinned to, if any."""
+        return {
+            name: {
+                "pinned_provider": agent.pinned_provider,
+                "models": {provider: agent._model(provider) for provider in self.clients.registry.names()},
+            }
+            for name, agent in self.load_agents().items()
+        }
+
     def get_agent(self, agent_name):
         agent = self.agents.get(agent_name)
-        
-        if not agent:
+        if agent is not None:
+            return agent
+
+        agent_class = AGENT_CLASSES.get(agent_name)
+        if not agent_class:
             raise ValueError(f"Agent {agent_name} not found.")
-        return agent
\ No newline at end of file
+        with self._agents_lock:
+            agent = self.agents.get(agent_name)
+            if agent is None:
+                agent = agent_class(**self._common, **self._route(agent_name))
+                self.agents[agent_name] = agent
+        return agent
+
+    def load_agents(self):
+        """Builds every agent now, e.g. in a gunicorn master before it forks its workers."""
+        return {name: self.get_agent(name) for name in AGENT_CLASSES}
+
+    def preload(self):
+        """
+        Imports the provider SDKs and builds every agent. Called in a gunicorn
+        master started with ``--preload`` so the forked workers share that memory
+        instead of each loading it on its first request. Connection pools are
+        still created per worker.
+        """
+        self.clients.registry.load()
+        self.load_agents()
+
+    def get_pipeline(self, pipeline_name):
+        pipeline = PIPELINES.get(pipeline_name)
+
+        if not pipeline:
+            raise ValueError(f"Pipeline {pipeline_name} not found.")
+        return pipeline
+
+    def usage_report(self, group_by=("endpoint",), since=None, until=None):
+        if self.usage_ledger is None:
+            return None
+        return self.usage_ledger.report(group_by=group_by, since=since, until=until)
+
+    def coalescing_stats(self):
+        return {"enabled": False} if self.single_flight is None else self.single_flight.stats()
+
+    def context_window_stats(self):
+        return {"enabled": False} if self.context_window is None else {"enabled": True, **self.context_window.stats()}
+
+    def cache_stats(self):
+        stats = {"enabled": False} if self.cache is None else {"enabled": True, **self.cache.stats()}
+        if self.similarity_cache is not None:
+            stats["similarity"] = self.similarity_cache.stats()
+        return stats
@@ -1,73 +1,670 @@
+import asyncio
 import os
+import time
 from abc import ABC, abstractmethod
-from loguru import logger
-import openai
-import litellm  # Lightweight wrapper for Groq API
+from src.utils.logger import logger, payload
 from dotenv import load_dotenv
+from src.agents.context import AgentContext
+from src.providers import get_default_clients
+from src.utils.llm_cache import LLMCache
+from src.utils.retry import LLMCallError, RetryPolicy, classify
+from src.utils.tokens import count_message_tokens, count_tokens
 
 # Load environment variables
 load_dotenv()
 
-# Retrieve API keys
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 DEFAULT_LLM = os.getenv("DEFAULT_LLM", "openai").lower()  # Default is OpenAI
 
 class AgentBase(ABC):
-    def __init__(self, name, llm_provider=DEFAULT_LLM, max_retries=2, verbose=True):
+    """
+    A stateless LLM executor. Agents are built once and shared by every request;
+    per-call settings (provider, model, deadline, trace id, cache policy) arrive
+    as an AgentContext through the ``context`` keyword of execute() and friends.
+    """
+
+    # Sampling parameters used by execute()/aexecute(); subclasses override these.
+    temperature = 0.7
+    max_tokens = 150
+    # Whether replies may be served from the response cache. Deterministic,
+    # low-temperature agents opt in; creative ones keep calling the model.
+    cacheable = False
+    # Ask the provider for a JSON object (where its adapter supports JSON mode)
+    json_mode = False
+    # With a ContextWindowManager, max_tokens is a ceiling: agents whose reply grows
+    # with their input (see sized_input) get output_ratio tokens per input token,
+    # and never fewer than min_tokens
+    output_ratio = None
+    min_tokens = 64
+    # max_tokens of every call when there is no ContextWindowManager; None keeps max_tokens
+    fixed_max_tokens = None
+
+    def __init__(self, name, llm_provider=DEFAULT_LLM, max_retries=2, verbose=True, clients=None, cache=None, use_cache=None, similarity_cache=None, usage_ledger=None, retry_policy=None, single_flight=None, models=None, pinned_provider=None, context_window=None):
         self.name = name
+        # Provider used when a call comes without a context
         self.llm_provider = llm_provider
         self.max_retries = max_retries
+        # Backoff and deadline of call_llm() and friends; max_retries counts attempts
+        self.retry_policy = retry_policy or RetryPolicy.from_env(max_attempts=max_retries)
         self.verbose = verbose
+        # Pooled provider clients, normally shared by every agent of an AgentManager
+        self.clients = clients or get_default_clients()
+        self.cache = cache
+        self.use_cache = self.cacheable if use_cache is None else use_cache
+        # Optional near-duplicate cache; agents decide which input text it is keyed on
+        self.similarity_cache = similarity_cache
+        # Optional UsageLedger recording tokens, cost and latency of every call
+        self.usage_ledger = usage_ledger
+        # Optional SingleFlight joining identical calls that are already in flight
+        self.single_flight = single_flight
+        # This agent's model on each provider, where it differs from the provider's default
+        self.models = models or {}
+        # Provider this agent always uses, whatever the request asks for
+        self.pinned_provider = pinned_provider
+        # Optional ContextWindowManager sizing max_tokens and fitting prompts to the model
+        self.context_window = context_window
 
     @abstractmethod
-    def execute(self, *args, **kwargs):
+    def build_messages(self, *args, **kwargs):
         pass
 
-    def call_llm(self, messages, temperature=0.7, max_tokens=150):
+    def similarity_key(self, *args, **kwargs):
+        """Input text the near-duplicate cache is keyed on; None opts the agent out."""
+        return None
+
+    def sized_input(self, *args, **kwargs):
+        """
+        Main input text, as it appears in the prompt: the reply's length follows
+        it, and it is what gets shortened when the prompt overflows the model's
+        context window. None opts the agent out.
+        """
+        return None
+
+    def local_reply(self, *args, **kwargs):
+        """Reply the agent can produce without the model; None means the LLM is needed."""
+        return None
+
+    def parse_reply(self, reply):
+        """Turns the raw reply text into the agent's result; also applied to the joined text of a stream."""
+        return reply
+
+    def context(self, context=None):
+        """
+        The given context, or a default one for callers that pass none. Agents
+        pinned to a provider get a copy switched to it; the request's model
+        override is meant for the request's provider and is dropped.
+        """
+        context = context if context is not None else AgentContext(self.llm_provider)
+        if self.pinned_provider and context.provider != self.pinned_provider:
+            context = context.replace(provider=self.pinned_provider, model=None)
+        return context
+
+    def execute(self, *args, context=None, **kwargs):
+        context = self.context(context)
+        reply = self.local_reply(*args, **kwargs)
+        if reply is not None:
+            return reply
+        key_text = self.similarity_key(*args, **kwargs)
+        reply = self._similar_reply(key_text, context)
+        if reply is None:
+            messages, max_tokens = self._prepare(args, kwargs, context)
+            reply = self.call_llm(messages, temperature=self.temperature, max_tokens=max_tokens, context=context)
+            self._remember_similar(key_text, reply, context)
+        return self.parse_reply(reply)
+
+    async def aexecute(self, *args, context=None, **kwargs):
+        context = self.context(context)
+        reply = self.local_reply(*args, **kwargs)
+        if reply is not None:
+            return reply
+        key_text = self.similarity_key(*args, **kwargs)
+        reply = self._similar_reply(key_text, context)
+        if reply is None:
+            messages, max_tokens = self._prepare(args, kwargs, context)
+            reply = await self.acall_llm(messages, temperature=self.temperature, max_tokens=max_tokens, context=context)
+            self._remember_similar(key_text, reply, context)
+        return self.parse_reply(reply)
+
+    def stream(self, *args, context=None, **kwargs):
+        """Like execute(), but yields the reply text incrementally as it is generated."""
+        context = self.context(context)
+        key_text = self.similarity_key(*args, **kwargs)
+        reply = self.local_reply(*args, **kwargs)
+        if reply is None:
+            reply = self._similar_reply(key_text, context)
+        if reply is not None:
+            yield reply
+            return
+        parts = []
+        messages, max_tokens = self._prepare(args, kwargs, context)
+        for delta in self.stream_llm(messages, temperature=self.temperature, max_tokens=max_tokens, context=context):
+            parts.append(delta)
+            yield delta
+        self._remember_similar(key_text, "".join(parts), context)
+
+    async def astream(self, *args, context=None, **kwargs):
+        context = self.context(context)
+        key_text = self.similarity_key(*args, **kwargs)
+        reply = self.local_reply(*args, **kwargs)
+        if reply is None:
+            reply = self._similar_reply(key_text, context)
+        if reply is not None:
+            yield reply
+            return
+        parts = []
+        messages, max_tokens = self._prepare(args, kwargs, context)
+        async for delta in self.astream_llm(messages, temperature=self.temperature, max_tokens=max_tokens, context=context):
+            parts.append(delta)
+            yield delta
+        self._remember_similar(key_text, "".join(parts), context)
+
+    def _prepare(self, args, kwargs, context):
+        """Messages and max_tokens of one call, fitted to the context window of the request's model."""
+        return self._fit(self.build_messages(*args, **kwargs), self.sized_input(*args, **kwargs), context)
+
+    def _fit(self, messages, input_text, context):
+        """``messages`` and max_tokens fitted to the request's model; ``input_text`` is the part that may be shortened."""
+        if self.context_window is None:
+            return messages, self.fixed_max_tokens or self.max_tokens
+        return self.context_window.fit(self, messages, input_text, self._model(context=context), context.trace_id)
+
+    def _log_request(self, messages, provider, context):
+        if not self.verbose:
+            return
+        # Arguments are only formatted when a sink takes the level; contents go through payload()
+        logger.info("[{}] Using LLM Provider: {} (trace {})", self.name, provider.upper(), context.trace_id)
+        logger.opt(lazy=True).debug(
+            "[{}] Sending messages to LLM: {}",
+            lambda: self.name,
+            lambda: "; ".join(f"{msg['role']}: {payload(msg['content'], context.trace_id)}" for msg in messages),
+        )
+
+    def _log_reply(self, reply, context):
+        if self.verbose:
+            logger.opt(lazy=True).info(
+                "[{}] Received response: {}", lambda: self.name, lambda: payload(reply, context.trace_id)
+            )
+
+    def _model(self, provider=None, context=None):
+        """Model for ``provider``; the context's model override applies to its own provider only."""
+        provider = provider or (context.provider if context is not None else self.llm_provider)
+        registry = self.clients.registry
+        if provider not in registry:
+            raise ValueError(f"Invalid LLM provider: {provider}")
+        if context is not None and context.model and provider == context.provider:
+            return context.model
+        return self.models.get(provider) or registry.default_model(provider)
+
+    def _caching(self, context):
+        return self.use_cache if context.use_cache is None else context.use_cache
+
+    def _cache_key(self, messages, temperature, max_tokens, provider, context):
+        if self.cache is None or not self._caching(context) or provider not in self.clients.registry:
+            return None
+        return LLMCache.make_key(provider, self._model(provider, context), messages, temperature, max_tokens)
+
+    def _flight_key(self, messages, temperature, max_tokens, context):
+        # A context that turns caching off asks for a fresh reply, so it never joins another call
+        if self.single_flight is None or context.use_cache is False or context.provider not in self.clients.registry:
+            return None
+        return LLMCache.make_key(context.provider, self._model(context.provider, context), messages, temperature, max_tokens)
+
+    def _joined(self, messages, reply, started, context):
+        self._record_usage(messages, reply, None, started, context.provider, context, cache="coalesced")
+        if self.verbose:
+            logger.info("[{}] Joined an identical in-flight call (trace {})", self.name, context.trace_id)
+
+    def _log_cache(self, tier):
+        if self.verbose:
+            if tier:
+                logger.info("[{}] Cache hit ({})", self.name, tier)
+            else:
+                logger.info("[{}] Cache miss", self.name)
+
+    def _similarity_namespace(self, context):
+        return (self.name, context.provider, self._model(context.provider, context))
+
+    def _similar_reply(self, text, context):
+        """Looks up a reply previously produced for ``text`` or a near duplicate of it."""
+        if text is None or self.similarity_cache is None or not self._caching(context) or context.provider not in self.clients.registry:
+            return None
+        started = time.perf_counter()
+        reply = self.similarity_cache.get(self._similarity_namespace(context), text)
+        if reply is not None:
+            self._record_usage(None, reply, None, started, context.provider, context, cache="similarity")
+        if reply is not None and self.verbose:
+            similarity = getattr(reply, "similarity", 1.0)
+            logger.info("[{}] Similarity cache hit (similarity={})", self.name, similarity)
+        return reply
+
+    def _remember_similar(self, text, reply, context):
+        if text is None or self.similarity_cache is None or not self._caching(context) or not reply:
+            return
+        self.similarity_cache.set(self._similarity_namespace(context), text, reply)
+
+    def _record_usage(self, messages, reply, usage, started, provider, context, cache=None):
+        """Adds one call to the usage ledger, estimating tokens when the provider sent none."""
+        if self.usage_ledger is None or provider not in self.clients.registry:
+            return
+        model = self._model(provider, context)
+        latency_ms = (time.perf_counter() - started) * 1000
+        if cache:
+            # Served without a provider call, so nothing was spent
+            self.usage_ledger.record(self.name, provider, model, 0, 0, latency_ms, cache=cache)
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        estimated = prompt_tokens is None or completion_tokens is None
+        if estimated:
+            prompt_tokens = count_message_tokens(messages, model)
+            completion_tokens = count_tokens(reply, model)
+        self.usage_ledger.record(self.name, provider, model, prompt_tokens, completion_tokens, latency_ms, estimated=estimated)
+
+    def _retry_delay(self, error, attempt, deadline, context):
+        """Classifies a failed attempt and returns the backoff before the next one, or None to give up."""
+        category = classify(error)
+        delay = self.retry_policy.next_delay(attempt, error, category, deadline)
+        if delay is None:
+            logger.error(f"[{self.name}] {category} error during LLM call (trace {context.trace_id}): {error}. Giving up after attempt {attempt}/{self.max_retries}")
+        else:
+            logger.warning(f"[{self.name}] {category} error during LLM call (trace {context.trace_id}): {error}. Retry {attempt}/{self.max_retries} in {delay:.2f}s")
+        return delay
+
+    def _give_up(self, error, attempt):
+        return LLMCallError(
+            f"[{self.name}] Failed to get response from LLM after {attempt} attempts: {error}", classify(error)
+        )
+
+    # ------------------- Rate limiting -------------------
+
+    def _admission(self, messages, max_tokens, provider, context):
+        """Arguments of a rate-limiter reservation: model and estimated prompt plus completion tokens."""
+        model = self._model(provider, context)
+        # Only a token budget needs the prompt counted
+        tokens = count_message_tokens(messages, model) + (max_tokens or 0) if self.clients.rate_limiter.limited(provider, tokens=True) else 0
+        return provider, model, tokens
+
+    def _settle(self, provider, reserved, usage, context):
+        used = getattr(usage, "total_tokens", None)
+        self.clients.rate_limiter.settle(provider, self._model(provider, context), reserved, used)
+
+    def _refund(self, provider, reserved, max_tokens, context):
+        """Settles the reservation of a failed or cancelled call: its prompt may have counted, its completion did not."""
+        if reserved:
+            used = max(reserved - (max_tokens or 0), 0)
+            self.clients.rate_limiter.settle(provider, self._model(provider, context), reserved, used)
+
+    # ------------------- Provider selection -------------------
+
+    def _pick_provider(self, context):
         """
-        Calls either OpenAI or Groq based on the selected LLM provider.
+        The context's provider, or the other one while its circuit is open and
+        failover is on. Agents pinned to a provider never leave it.
         """
-        retries = 0
-        while retries < self.max_retries:
+        primary = context.provider
+        hedging = self.clients.hedging
+        if self.pinned_provider or not hedging.failover or not self.clients.breaker(primary).is_open():
+            return primary
+        secondary = hedging.secondary(primary)
+        if secondary is None or self.clients.breaker(secondary).is_open():
+            return primary
+        hedging.count("failovers")
+        logger.warning(f"[{self.name}] {primary} circuit is open; failing over to {secondary}")
+        return secondary
+
+    def _attempt(self, provider, messages, temperature, max_tokens, deadline, context):
+        """One request to ``provider``, guarded by its circuit breaker."""
+        breaker = self.clients.breaker(provider)
+        probe = breaker.before_call()
+        reserved, succeeded = 0, False
+        try:
+            reserved = self.clients.rate_limiter.acquire(*self._admission(messages, max_tokens, provider, context), deadline)
+            started = time.perf_counter()
             try:
-                if self.verbose:
-                    logger.info(f"[{self.name}] Using LLM Provider: {self.llm_provider.upper()}")
-                    logger.info(f"[{self.name}] Sending messages to LLM:")
-                    for msg in messages:
-                        logger.debug(f"  {msg['role']}: {msg['content']}")
-
-                # Select API call based on provider
-                if self.llm_provider == "openai":
-                    openai.api_key = OPENAI_API_KEY
-                    response = openai.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=messages,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                    )
-                    reply = response.choices[0].message
-                elif self.llm_provider == "groq":
-                    response = litellm.completion(
-                        model="groq/llama3-70b-8192",
-                        messages=messages,
-                        api_key=GROQ_API_KEY,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                    )
-                    reply = response["choices"][0]["message"]
-                else:
-                    raise ValueError(f"Invalid LLM provider: {self.llm_provider}")
+                reply, usage = self._request(
+                    messages, temperature, max_tokens, provider, context, timeout=self.clients.request_timeout(deadline.remaining())
+                )
+            except Exception as e:
+                breaker.record_failure(classify(e))
+                raise
+            breaker.record_success()
+            succeeded = True
+        finally:
+            # Whatever the outcome, a half-open probe must not stay claimed
+            breaker.release(probe)
+            if succeeded:
+                self._settle(provider, reserved, usage, context)
+            else:
+                self._refund(provider, reserved, max_tokens, context)
+        self.clients.hedging.record_latency(provider, self.name, time.perf_counter() - started)
+        return reply, usage, provider, started
+
+    async def _aattempt(self, provider, messages, temperature, max_tokens, deadline, context):
+        breaker = self.clients.breaker(provider)
+        probe = breaker.before_call()
+        reserved, succeeded = 0, False
+        try:
+            reserved = await self.clients.rate_limiter.aacquire(*self._admission(messages, max_tokens, provider, context), deadline)
+            started = time.perf_counter()
+            try:
+                reply, usage = await self._arequest(
+                    messages, temperature, max_tokens, provider, context, timeout=self.clients.request_timeout(deadline.remaining())
+                )
+            except Exception as e:
+                breaker.record_failure(classify(e))
+                raise
+            breaker.record_success()
+            succeeded = True
+        finally:
+            # Also runs when the call is cancelled, e.g. as the losing side of a hedge
+            breaker.release(probe)
+            if succeeded:
+                self._settle(provider, reserved, usage, context)
+            else:
+                self._refund(provider, reserved, max_tokens, context)
+        self.clients.hedging.record_latency(provider, self.name, time.perf_counter() - started)
+        return reply, usage, provider, started
 
-                if self.verbose:
-                    logger.info(f"[{self.name}] Received response: {reply}")
+    async def _ahedged_attempt(self, messages, temperature, max_tokens, deadline, context):
+        """
+        Sends the request to the primary provider and, if it has not answered
+        within its hedge delay, to the secondary as well. The first successful
+        reply wins and the other request is cancelled.
+        """
+        hedging = self.clients.hedging
+        primary = self._pick_provider(context)
+        # A pinned agent's prompt must not reach any other provider
+        secondary = hedging.secondary(primary) if hedging.enabled and not self.pinned_provider else None
+        hedging.count("calls")
+        args = (messages, temperature, max_tokens, deadline, context)
+        if secondary is None or self.clients.breaker(secondary).is_open():
+            return await self._aattempt(primary, *args)
+
+        first = asyncio.ensure_future(self._aattempt(primary, *args))
+        done, _ = await asyncio.wait({first}, timeout=hedging.delay(primary, self.name))
+        if done:
+            return first.result()
+
+        hedging.count("hedged")
+        if self.verbose:
+            logger.info(f"[{self.name}] {primary} is slow; hedging the request on {secondary}")
+        second = asyncio.ensure_future(self._aattempt(secondary, *args))
+        pending, error = {first, second}, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        hedging.count("primary_wins" if task is first else "secondary_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            # Let the losers run their cleanup (breaker probe, rate-limit refund) before returning
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    # ------------------- Provider requests -------------------
+
+    def _response_format(self):
+        return {"type": "json_object"} if self.json_mode else None
+
+    def _request(self, messages, temperature, max_tokens, provider, context, timeout=None):
+        """Sends a single chat completion request to ``provider`` through its adapter."""
+        adapter = self.clients.registry.get(provider)
+        return adapter.complete(
+            self.clients, self._model(provider, context), messages, temperature, max_tokens, timeout,
+            response_format=self._response_format(),
+        )
+
+    async def _arequest(self, messages, temperature, max_tokens, provider, context, timeout=None):
+        adapter = self.clients.registry.get(provider)
+        return await adapter.acomplete(
+            self.clients, self._model(provider, context), messages, temperature, max_tokens, timeout,
+            response_format=self._response_format(),
+        )
+
+    def _stream_request(self, messages, temperature, max_tokens, provider, context, usage=None, timeout=None):
+        """
+        Sends a streaming chat completion request and yields text deltas. The
+        provider's usage block from the final chunk is stored in ``usage``.
+        """
+        adapter = self.clients.registry.get(provider)
+        yield from adapter.stream(
+            self.clients, self._model(provider, context), messages, temperature, max_tokens, usage, timeout,
+            response_format=self._response_format(),
+        )
+
+    async def _astream_request(self, messages, temperature, max_tokens, provider, context, usage=None, timeout=None):
+        adapter = self.clients.registry.get(provider)
+        async for delta in adapter.astream(
+            self.clients, self._model(provider, context), messages, temperature, max_tokens, usage, timeout,
+            response_format=self._response_format(),
+        ):
+            yield delta
+
+    # ------------------- LLM calls -------------------
+
+    def call_llm(self, messages, temperature=0.7, max_tokens=150, context=None):
+        """
+        Calls the provider of the call's context through its registered adapter.
+        """
+        context = self.context(context)
+        started = time.perf_counter()
+        key = self._cache_key(messages, temperature, max_tokens, context.provider, context)
+        if key:
+            cached, tier = self.cache.get(key)
+            self._log_cache(tier)
+            if cached is not None:
+                self._record_usage(messages, cached, None, started, context.provider, context, cache=tier)
+                return cached
+
+        flight_key = self._flight_key(messages, temperature, max_tokens, context)
+        if flight_key is None:
+            return self._call_provider(messages, temperature, max_tokens, context)
+        reply, shared = self.single_flight.do(
+            "call", flight_key, lambda: self._call_provider(messages, temperature, max_tokens, context)
+        )
+        if shared:
+            self._joined(messages, reply, started, context)
+        return reply
+
+    def _call_provider(self, messages, temperature, max_tokens, context):
+        """The retry loop of call_llm(), run once per set of identical concurrent calls."""
+        deadline = self.retry_policy.start(context.deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                provider = self._pick_provider(context)
+                self._log_request(messages, provider, context)
+                reply, usage, provider, started = self._attempt(provider, messages, temperature, max_tokens, deadline, context)
+                self._log_reply(reply, context)
+                self._record_usage(messages, reply, usage, started, provider, context)
+                key = self._cache_key(messages, temperature, max_tokens, provider, context)
+                if key and reply:
+                    self.cache.set(key, reply)
+                return reply
+
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline, context)
+                if delay is None:
+                    raise self._give_up(e, attempt) from e
+                time.sleep(delay)
+
+    async def acall_llm(self, messages, temperature=0.7, max_tokens=150, context=None):
+        """
+        Awaitable counterpart of call_llm() built on the providers' async clients,
+        so a single event loop can keep many LLM calls in flight. This is the
+        path that hedges slow requests onto the other provider.
+        """
+        context = self.context(context)
+        started = time.perf_counter()
+        key = self._cache_key(messages, temperature, max_tokens, context.provider, context)
+        if key:
+            cached, tier = await self.cache.aget(key)
+            self._log_cache(tier)
+            if cached is not None:
+                self._record_usage(messages, cached, None, started, context.provider, context, cache=tier)
+                return cached
+
+        flight_key = self._flight_key(messages, temperature, max_tokens, context)
+        if flight_key is None:
+            return await self._acall_provider(messages, temperature, max_tokens, context)
+        reply, shared = await self.single_flight.ado(
+            "call", flight_key, lambda: self._acall_provider(messages, temperature, max_tokens, context)
+        )
+        if shared:
+            self._joined(messages, reply, started, context)
+        return reply
+
+    async def _acall_provider(self, messages, temperature, max_tokens, context):
+        deadline = self.retry_policy.start(context.deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self._log_request(messages, context.provider, context)
+                reply, usage, provider, started = await self._ahedged_attempt(messages, temperature, max_tokens, deadline, context)
+                self._log_reply(reply, context)
+                self._record_usage(messages, reply, usage, started, provider, context)
+                key = self._cache_key(messages, temperature, max_tokens, provider, context)
+                if key and reply:
+                    await self.cache.aset(key, reply)
                 return reply
 
             except Exception as e:
-                retries += 1
-                logger.error(f"[{self.name}] Error during LLM call: {e}. Retry {retries}/{self.max_retries}")
+                delay = self._retry_delay(e, attempt, deadline, context)
+                if delay is None:
+                    raise self._give_up(e, attempt) from e
+                await asyncio.sleep(delay)
+
+    def stream_llm(self, messages, temperature=0.7, max_tokens=150, context=None):
+        """
+        Streaming counterpart of call_llm(): yields the reply as text deltas.
+        A failed attempt is only retried while nothing has been yielded yet.
+        """
+        context = self.context(context)
+        started = time.perf_counter()
+        key = self._cache_key(messages, temperature, max_tokens, context.provider, context)
+        if key:
+            cached, tier = self.cache.get(key)
+            self._log_cache(tier)
+            if cached is not None:
+                self._record_usage(messages, cached, None, started, context.provider, context, cache=tier)
+                yield cached
+                return
+
+        deadline = self.retry_policy.start(context.deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            parts, usage = [], {}
+            provider = self._pick_provider(context)
+            breaker = self.clients.breaker(provider)
+            probe, reserved, succeeded = False, 0, False
+            try:
+                # Breaker rejections and local rate-limit waits are not provider failures
+                probe = breaker.before_call()
+                reserved = self.clients.rate_limiter.acquire(*self._admission(messages, max_tokens, provider, context), deadline)
+                self._log_request(messages, provider, context)
+                started = time.perf_counter()
+                timeout = self.clients.request_timeout(deadline.remaining())
+                try:
+                    for delta in self._stream_request(messages, temperature, max_tokens, provider, context, usage, timeout=timeout):
+                        parts.append(delta)
+                        yield delta
+                except Exception as e:
+                    breaker.record_failure(classify(e))
+                    raise
+                breaker.record_success()
+                succeeded = True
+                reply = "".join(parts)
+                self._log_reply(reply, context)
+                self._record_usage(messages, reply, usage.get("usage"), started, provider, context)
+                key = self._cache_key(messages, temperature, max_tokens, provider, context)
+                if key and reply:
+                    self.cache.set(key, reply)
+                return
+
+            except Exception as e:
+                if parts:
+                    # Text was already sent to the caller; the attempt cannot be repeated
+                    raise
+                delay = self._retry_delay(e, attempt, deadline, context)
+                if delay is None:
+                    raise self._give_up(e, attempt) from e
+                time.sleep(delay)
+            finally:
+                # Also runs when the consumer stops reading the stream
+                breaker.release(probe)
+                if succeeded:
+                    self._settle(provider, reserved, usage.get("usage"), context)
+                else:
+                    self._refund(provider, reserved, max_tokens, context)
+
+    async def astream_llm(self, messages, temperature=0.7, max_tokens=150, context=None):
+        context = self.context(context)
+        started = time.perf_counter()
+        key = self._cache_key(messages, temperature, max_tokens, context.provider, context)
+        if key:
+            cached, tier = await self.cache.aget(key)
+            self._log_cache(tier)
+            if cached is not None:
+                self._record_usage(messages, cached, None, started, context.provider, context, cache=tier)
+                yield cached
+                return
+
+        deadline = self.retry_policy.start(context.deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            parts, usage = [], {}
+            provider = self._pick_provider(context)
+            breaker = self.clients.breaker(provider)
+            probe, reserved, succeeded = False, 0, False
+            try:
+                probe = breaker.before_call()
+                reserved = await self.clients.rate_limiter.aacquire(
+                    *self._admission(messages, max_tokens, provider, context), deadline
+                )
+                self._log_request(messages, provider, context)
+                started = time.perf_counter()
+                timeout = self.clients.request_timeout(deadline.remaining())
+                try:
+                    async for delta in self._astream_request(messages, temperature, max_tokens, provider, context, usage, timeout=timeout):
+                        parts.append(delta)
+                        yield delta
+                except Exception as e:
+                    breaker.record_failure(classify(e))
+                    raise
+                breaker.record_success()
+                succeeded = True
+                reply = "".join(parts)
+                self._log_reply(reply, context)
+                self._record_usage(messages, reply, usage.get("usage"), started, provider, context)
+                key = self._cache_key(messages, temperature, max_tokens, provider, context)
+                if key and reply:
+                    await self.cache.aset(key, reply)
+                return
+
+            except Exception as e:
+                if parts:
+                    # Text was already sent to the caller; the attempt cannot be repeated
+                    raise
+                delay = self._retry_delay(e, attempt, deadline, context)
+                if delay is None:
+                    raise self._give_up(e, attempt) from e
+                await asyncio.sleep(delay)
+            finally:
+                # Also runs when the stream is cancelled or abandoned
+                breaker.release(probe)
+                if succeeded:
+                    self._settle(provider, reserved, usage.get("usage"), context)
+                else:
+                    self._refund(provider, reserved, max_tokens, context)
 
-        raise Exception(f"[{self.name}] Failed to get response from LLM after {self.max_retries} retries.")
 
 # import os
 # from abc import ABC, abstractmethod
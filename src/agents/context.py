@@ -0,0 +1,38 @@
+import uuid
+
+from src.utils.retry import Deadline
+
+
+class AgentContext:
+    """
+    Per-call execution settings handed to the shared agents.
+
+    Agents hold no request state of their own, so one AgentManager can serve
+    many overlapping pipelines; everything that varies between calls travels
+    in the context instead: provider, model override, deadline, trace id and
+    cache policy.
+    """
+
+    def __init__(self, provider, model=None, deadline=None, trace_id=None, use_cache=None):
+        self.provider = provider
+        # None means the provider's default model
+        self.model = model
+        # Seconds for everything done under this context; None leaves it to the retry policy
+        self.deadline = deadline if isinstance(deadline, Deadline) or deadline is None else Deadline(deadline)
+        self.trace_id = trace_id or uuid.uuid4().hex[:12]
+        # None defers to each agent's ``cacheable`` setting
+        self.use_cache = use_cache
+
+    def replace(self, **changes):
+        values = {
+            "provider": self.provider,
+            "model": self.model,
+            "deadline": self.deadline,
+            "trace_id": self.trace_id,
+            "use_cache": self.use_cache,
+        }
+        values.update(changes)
+        return AgentContext(**values)
+
+    def __repr__(self):
+        return f"AgentContext(provider={self.provider!r}, model={self.model!r}, trace_id={self.trace_id!r})"
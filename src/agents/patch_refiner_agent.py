@@ -0,0 +1,35 @@
+from .agent_base import AgentBase
+from .patching import EDIT_FORMAT
+
+class PatchRefinerAgent(AgentBase):
+    """Refiner that answers with targeted edits to the draft instead of the whole article."""
+
+    temperature = 0.3
+    max_tokens = 1024
+    output_ratio = 0.5
+    min_tokens = 256
+    json_mode = True
+
+    def __init__(self, llm_provider="openai", max_retries=3, verbose=True, **kwargs):
+        super().__init__(name="PatchRefinerAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose, **kwargs)
+
+    def build_messages(self, draft):
+        messages = [
+            {"role": "system",
+            "content": "You are an expert editor who refines and enhances articles for clarity, coherence and academic quality."
+            },
+            {
+                "role": "user",
+                "content": (
+                    "Improve the language, coherence and overall quality of the following article draft with targeted edits. "
+                    "Change only the passages that need it and leave the rest of the article as it is.\n"
+                    f"{EDIT_FORMAT}\n\n"
+                    f"Article: {draft}\n\n"
+                    "Edits (JSON):"
+                )
+            }
+        ]
+        return messages
+
+    def sized_input(self, draft):
+        return draft
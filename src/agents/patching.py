@@ -0,0 +1,132 @@
+import json
+import re
+
+from loguru import logger
+
+# How the refiner returns its work: the whole article, or a list of edits applied locally
+REFINE_MODES = ("rewrite", "patch")
+EDIT_OPS = ("replace", "insert_before", "insert_after", "delete")
+
+# Asked of the patch refiner; the reply is requested in JSON mode
+EDIT_FORMAT = (
+    "Respond with a JSON object only, in this form:\n"
+    '{"edits": [{"op": "replace" | "insert_before" | "insert_after" | "delete", '
+    '"anchor": "<exact text copied from the article, long enough to occur only once>", '
+    '"text": "<new text; the replacement or the insertion, omitted for delete>"}]}\n'
+    "replace swaps the anchor for the text, delete removes the anchor, and the insert operations add the text "
+    "directly before or after it. Edits are applied in order. Return an empty list if the article needs no changes."
+)
+
+_JSON_START = re.compile(r"[{\[]")
+
+
+class PatchError(ValueError):
+    """Edits that cannot be applied cleanly to the article."""
+
+
+class PatchedArticle(str):
+    """
+    A refined article. ``mode`` is "patch" when it was built locally from the
+    model's ``edits``, or "rewrite" when those did not apply and the refiner
+    rewrote the article in full; ``fallback_reason`` then says why. ``reply``
+    is the patch refiner's raw reply.
+    """
+
+    def __new__(cls, value, edits=(), mode="patch", fallback_reason=None, reply=None):
+        article = super().__new__(cls, value)
+        article.edits = list(edits)
+        article.mode = mode
+        article.fallback_reason = fallback_reason
+        article.reply = reply
+        return article
+
+    def to_dict(self):
+        return {"text": str(self), "mode": self.mode, "edits": self.edits, "fallback_reason": self.fallback_reason}
+
+
+def _edit(item, number):
+    if not isinstance(item, dict):
+        raise PatchError(f"Edit {number} is not an object.")
+    op = str(item.get("op", "")).strip().lower()
+    if op not in EDIT_OPS:
+        raise PatchError(f"Edit {number} has unknown op {op!r}.")
+    anchor = item.get("anchor", item.get("find"))
+    if not isinstance(anchor, str) or not anchor.strip():
+        raise PatchError(f"Edit {number} has no anchor.")
+    text = item.get("text", item.get("replace", ""))
+    if op == "delete":
+        text = ""
+    elif not isinstance(text, str) or (op != "replace" and not text):
+        raise PatchError(f"Edit {number} ({op}) has no text.")
+    return {"op": op, "anchor": anchor, "text": text}
+
+
+def _first_json(text):
+    """The first JSON object or array in ``text``; code fences and prose around it are ignored."""
+    decoder = json.JSONDecoder()
+    error = "no JSON object or array found"
+    for match in _JSON_START.finditer(text):
+        try:
+            return decoder.raw_decode(text, match.start())[0]
+        except ValueError as e:
+            error = str(e)
+    raise PatchError(f"Reply is not valid JSON: {error}")
+
+
+def parse_edits(reply):
+    """Edits from a patch refiner reply: a JSON object with an "edits" list, or the list itself."""
+    data = _first_json(str(reply or ""))
+    edits = data.get("edits") if isinstance(data, dict) else data
+    if not isinstance(edits, list):
+        raise PatchError("Reply holds no list of edits.")
+    return [_edit(item, number) for number, item in enumerate(edits, 1)]
+
+
+def _locate(text, anchor):
+    """(start, end) of the only occurrence of ``anchor`` in ``text``; whitespace runs may differ."""
+    start = text.find(anchor)
+    if start != -1:
+        if text.find(anchor, start + 1) != -1:
+            raise PatchError(f"Anchor occurs more than once: {anchor[:60]!r}")
+        return start, start + len(anchor)
+    # Models often re-wrap lines or collapse spaces when quoting the article
+    pattern = r"\s+".join(re.escape(word) for word in anchor.split())
+    matches = list(re.finditer(pattern, text))
+    if not matches:
+        raise PatchError(f"Anchor not found: {anchor[:60]!r}")
+    if len(matches) > 1:
+        raise PatchError(f"Anchor occurs more than once: {anchor[:60]!r}")
+    return matches[0].span()
+
+
+def apply_edits(text, edits):
+    """
+    ``text`` with ``edits`` applied in order. Every anchor must occur exactly
+    once in the text as edited so far; otherwise PatchError is raised and
+    nothing is applied.
+    """
+    for edit in edits:
+        start, end = _locate(text, edit["anchor"])
+        op = edit["op"]
+        if op == "insert_before":
+            text = text[:start] + edit["text"] + text[start:]
+        elif op == "insert_after":
+            text = text[:end] + edit["text"] + text[end:]
+        else:
+            text = text[:start] + edit["text"] + text[end:]
+    return text
+
+
+async def arefine_with_patches(agent_manager, draft, context=None):
+    """
+    Refines ``draft`` from the patch refiner's edits. When they do not apply,
+    the refiner rewrites the article in full instead.
+    """
+    reply = await agent_manager.get_agent("patch_refiner").aexecute(draft=draft, context=context)
+    try:
+        edits = parse_edits(reply)
+        return PatchedArticle(apply_edits(draft, edits), edits, reply=reply)
+    except PatchError as e:
+        logger.warning("[PatchRefiner] Falling back to a full rewrite: {}", e)
+        text = await agent_manager.get_agent("refiner").aexecute(draft=draft, context=context)
+        return PatchedArticle(text, mode="rewrite", fallback_reason=str(e), reply=reply)
@@ -0,0 +1,413 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+from loguru import logger
+
+from src.tools.phi_scrubber import residual_phi, scrub_phi
+from .refinement import REFINE_ROUNDS_LIMIT, IterativeRefinement
+from .validation import Validation
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# Drafts whose review scores at least REFINE_GATE_SCORE (1 to 5) skip the refiner
+REFINE_GATE_ENABLED = _env_bool("REFINE_GATE_ENABLED", True)
+REFINE_GATE_SCORE = float(os.getenv("REFINE_GATE_SCORE", 4))
+
+
+class StageError(Exception):
+    """Raised when a pipeline stage fails; carries the stage and its error label."""
+
+    def __init__(self, stage, label, error):
+        super().__init__(f"{label}: {error}")
+        self.stage = stage
+        self.label = label
+        self.error = error
+
+
+class Stage:
+    """
+    One node of a pipeline DAG.
+
+    ``inputs`` maps the keyword arguments of the stage to data sources: a string
+    names a pipeline input or an upstream stage, a callable receives the results
+    gathered so far. Stages named as string sources become dependencies
+    automatically; dependencies of callable inputs are listed in ``depends_on``.
+
+    A stage either runs an agent from the AgentManager (``agent``) or a local
+    function (``func``, sync or async). A function that declares an
+    ``agent_manager`` or ``context`` parameter receives the pipeline's. ``when``
+    may skip the stage, in which case its output is None.
+    """
+
+    def __init__(self, name, agent=None, func=None, inputs=None, depends_on=(), when=None, label=None):
+        if (agent is None) == (func is None):
+            raise ValueError(f"Stage {name} needs exactly one of agent or func.")
+        self.name = name
+        self.agent = agent
+        self.func = func
+        self.inputs = inputs or {}
+        self.when = when
+        self.label = label or f"{name.capitalize()} Error"
+        self.depends_on = set(depends_on)
+        self.depends_on.update(source for source in self.inputs.values() if isinstance(source, str))
+        parameters = inspect.signature(func).parameters if func is not None else {}
+        self.runtime_params = [name for name in ("agent_manager", "context") if name in parameters]
+
+    def resolve(self, results):
+        kwargs = {}
+        for param, source in self.inputs.items():
+            kwargs[param] = source(results) if callable(source) else results.get(source)
+        return kwargs
+
+
+class PipelineResult:
+    def __init__(self, outputs, timings, total_ms):
+        self.outputs = outputs
+        self.timings = timings
+        self.total_ms = total_ms
+
+    def __getitem__(self, stage):
+        return self.outputs[stage]
+
+
+class Pipeline:
+    """
+    A DAG of agent stages. Each stage starts as soon as all of its dependencies
+    have finished, so independent branches run concurrently and the pipeline's
+    latency follows its critical path.
+    """
+
+    def __init__(self, name, stages, inputs=()):
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        self.inputs = set(inputs)
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done or name in self.inputs:
+                return
+            if name not in self.stages:
+                raise ValueError(f"Pipeline {self.name}: unknown dependency '{name}'.")
+            if name in visiting:
+                raise ValueError(f"Pipeline {self.name}: cycle through stage '{name}'.")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    async def _run_stage(self, stage, agent_manager, results, context, on_token):
+        kwargs = stage.resolve(results)
+        if stage.func is not None:
+            runtime = {"agent_manager": agent_manager, "context": context}
+            kwargs.update((name, runtime[name]) for name in stage.runtime_params)
+            output = stage.func(**kwargs)
+            if inspect.isawaitable(output):
+                output = await output
+            return output
+
+        agent = agent_manager.get_agent(stage.agent)
+        if on_token is None:
+            return await agent.aexecute(context=context, **kwargs)
+
+        parts = []
+        async for delta in agent.astream(context=context, **kwargs):
+            parts.append(delta)
+            on_token(stage.name, delta)
+        # A single chunk is a cached reply; keep it as is so its flags survive.
+        return agent.parse_reply(parts[0] if len(parts) == 1 else "".join(parts))
+
+    async def arun(self, agent_manager, inputs, context=None, llm_provider=None, on_token=None, on_stage_complete=None):
+        """
+        Runs the pipeline on ``inputs``. Every agent stage runs under ``context``
+        (an AgentContext); without one, a context for ``llm_provider`` is created.
+
+        ``on_token(stage, delta)`` switches agent stages to streaming and is called
+        for every generated chunk; ``on_stage_complete(stage, output, timing)`` is
+        called as each stage finishes. Raises StageError on the first failure.
+
+        Without callbacks, a run identical to one already in flight (same inputs,
+        provider and model) waits for that run's result instead of repeating it.
+        """
+        missing = self.inputs - set(inputs)
+        if missing:
+            raise ValueError(f"Pipeline {self.name}: missing inputs {sorted(missing)}.")
+
+        if context is None:
+            context = agent_manager.context(llm_provider)
+        single_flight = getattr(agent_manager, "single_flight", None)
+        if single_flight is None or on_token is not None or on_stage_complete is not None or context.use_cache is False:
+            return await self._arun(agent_manager, inputs, context, on_token, on_stage_complete)
+
+        result, shared = await single_flight.ado(
+            "pipeline",
+            self._flight_key(inputs, context),
+            lambda: self._arun(agent_manager, inputs, context, None, None),
+        )
+        if shared:
+            logger.info(f"[Pipeline:{self.name}] Joined an identical in-flight run (trace {context.trace_id})")
+        return result
+
+    def _flight_key(self, inputs, context):
+        payload = json.dumps(
+            {"pipeline": self.name, "inputs": inputs, "provider": context.provider, "model": context.model},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _arun(self, agent_manager, inputs, context, on_token, on_stage_complete):
+        results = dict(inputs)
+        timings = {}
+        tasks = {}
+        started = time.perf_counter()
+
+        async def run(name):
+            stage = self.stages[name]
+            dependencies = [tasks[d] for d in stage.depends_on if d in tasks]
+            if dependencies:
+                await asyncio.gather(*dependencies)
+
+            stage_start = time.perf_counter()
+            if stage.when is not None and not stage.when(results):
+                results[name] = None
+                timings[name] = {"start_ms": round((stage_start - started) * 1000, 2), "duration_ms": 0.0, "skipped": True}
+            else:
+                try:
+                    results[name] = await self._run_stage(stage, agent_manager, results, context, on_token)
+                except Exception as e:
+                    raise StageError(name, stage.label, e) from e
+                timings[name] = {
+                    "start_ms": round((stage_start - started) * 1000, 2),
+                    "duration_ms": round((time.perf_counter() - stage_start) * 1000, 2),
+                }
+            if on_stage_complete is not None:
+                on_stage_complete(name, results[name], timings[name])
+
+        for name in self.order:
+            tasks[name] = asyncio.ensure_future(run(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        total_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"[Pipeline:{self.name}] Completed in {total_ms} ms (trace {context.trace_id}) {timings}")
+        outputs = {name: results[name] for name in self.order}
+        return PipelineResult(outputs, timings, total_ms)
+
+    async def abatch(self, agent_manager, items, concurrency=8, **kwargs):
+        """
+        Runs the pipeline over an iterable of input dicts with at most
+        ``concurrency`` items in flight. Yields ``(index, result, error, latency_ms)``
+        in completion order; a failed item yields its error (a StageError when a
+        stage failed) instead of a result, and the other items carry on.
+        """
+        queue = asyncio.Queue()
+        source = enumerate(items)
+
+        async def worker():
+            for index, inputs in source:
+                start = time.perf_counter()
+                try:
+                    result, error = await self.arun(agent_manager, inputs, **kwargs), None
+                except (StageError, ValueError) as e:
+                    result, error = None, e
+                except Exception as e:
+                    logger.exception(f"[Pipeline:{self.name}] Batch item {index} failed")
+                    result, error = None, e
+                queue.put_nowait((index, result, error, round((time.perf_counter() - start) * 1000, 2)))
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(1, concurrency))]
+        finished = asyncio.gather(*workers)
+        finished.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (item := await queue.get()) is not None:
+                yield item
+            await finished
+        finally:
+            for task in workers:
+                task.cancel()
+
+    def run(self, agent_manager, inputs, **kwargs):
+        """
+        Synchronous wrapper around arun() for callers without an event loop.
+        Runs on one long-lived background loop, so the async clients and their
+        connection pools are reused from run to run.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.arun(agent_manager, inputs, **kwargs), _background_loop())
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop():
+    """The event loop shared by every synchronous run(), started on a daemon thread on first use."""
+    global _loop, _loop_pid
+    # The loop's thread does not survive a fork; each process starts its own.
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="pipeline-loop", daemon=True).start()
+        return _loop
+
+
+# ------------------- Pipeline Definitions -------------------
+
+SUMMARIZE_PIPELINE = Pipeline(
+    "summarize",
+    inputs=["text"],
+    stages=[
+        Stage("summary", agent="summarize", inputs={"text": "text"}, label="Summarization Error"),
+        Stage(
+            "validation",
+            agent="summarize_validator",
+            inputs={
+                "original_text": "text",
+                "summary": "summary",
+                "reference": lambda results: getattr(results["summary"], "chunk_summaries", None),
+            },
+            label="Validation Error",
+        ),
+    ],
+)
+
+# Rounds after the first refinement pass; REFINE_MAX_ROUNDS=1 keeps a single pass
+ITERATIVE_REFINEMENT = IterativeRefinement.from_env()
+
+
+def _refine_rounds(results):
+    rounds = results.get("refine_rounds")
+    if rounds is None:
+        rounds = ITERATIVE_REFINEMENT.max_rounds
+    return max(1, min(rounds, REFINE_ROUNDS_LIMIT))
+
+
+async def refine_draft(agent_manager, context, draft):
+    return await ITERATIVE_REFINEMENT.arefine_once(agent_manager, draft, context)
+
+
+async def refine_further(agent_manager, context, topic, draft, refined, validation, max_rounds=None):
+    return await ITERATIVE_REFINEMENT.arefine(
+        agent_manager, topic, draft, refined, validation, context, max_rounds=max_rounds
+    )
+
+
+def needs_refinement(results):
+    """False when the draft review already scores at or above REFINE_GATE_SCORE."""
+    review = results.get("draft_review")
+    return not (isinstance(review, Validation) and review.passes(REFINE_GATE_SCORE))
+
+
+WRITE_AND_REFINE_PIPELINE = Pipeline(
+    "write_and_refine",
+    # "refine_rounds" is optional; without it REFINE_MAX_ROUNDS applies
+    inputs=["topic", "outline"],
+    stages=[
+        Stage("draft", agent="write_article", inputs={"topic": "topic", "outline": "outline"}, label="Writing Error"),
+        # A short scored review decides whether the draft needs the refiner at all
+        Stage(
+            "draft_review",
+            agent="write_article_validator",
+            inputs={"topic": "topic", "article": "draft", "outline": "outline"},
+            when=lambda results: REFINE_GATE_ENABLED,
+            label="Draft Review Error",
+        ),
+        # REFINE_MODE=patch asks for targeted edits and applies them locally instead of regenerating the article
+        Stage(
+            "refined",
+            agent=None if ITERATIVE_REFINEMENT.mode == "patch" else "refiner",
+            func=refine_draft if ITERATIVE_REFINEMENT.mode == "patch" else None,
+            inputs={"draft": "draft"},
+            depends_on=["draft_review"],
+            when=needs_refinement,
+            label="Refinement Error",
+        ),
+        # A draft that passed its review is not validated a second time
+        Stage(
+            "validation",
+            agent="validator",
+            inputs={"topic": "topic", "article": "refined"},
+            when=lambda results: results["refined"] is not None,
+            label="Validation Error",
+        ),
+        # More refine-and-validate rounds until the text converges or the score stops improving
+        Stage(
+            "iterations",
+            func=refine_further,
+            inputs={
+                "topic": "topic",
+                "draft": "draft",
+                "refined": "refined",
+                "validation": "validation",
+                "max_rounds": _refine_rounds,
+            },
+            when=lambda results: results["refined"] is not None and _refine_rounds(results) > 1,
+            label="Refinement Error",
+        ),
+    ],
+)
+
+async def check_residual_phi(sanitized):
+    # In a thread, so the local check runs while the validator waits on the model
+    return await asyncio.to_thread(residual_phi, sanitized)
+
+
+SANITIZE_PIPELINE = Pipeline(
+    "sanitize",
+    inputs=["medical_data"],
+    stages=[
+        Stage("prescrub", func=scrub_phi, inputs={"medical_data": "medical_data"}, label="Pre-scrub Error"),
+        Stage(
+            "sanitized",
+            agent="sanitize_data",
+            inputs={"medical_data": "medical_data", "scrub": "prescrub"},
+            label="Sanitization Error",
+        ),
+        Stage(
+            "validation",
+            agent="sanitize_data_validator",
+            inputs={
+                "original_data": "medical_data",
+                "sanitized_data": "sanitized",
+                "redactions": lambda results: results["prescrub"].spans,
+            },
+            depends_on=["prescrub"],
+            label="Validation Error",
+        ),
+        # Fans out next to the validator: the pre-scrubber's patterns run over the sanitized text
+        Stage("residual_phi", func=check_residual_phi, inputs={"sanitized": "sanitized"}, label="Residual PHI Error"),
+    ],
+)
+
+PIPELINES = {
+    pipeline.name: pipeline
+    for pipeline in (SUMMARIZE_PIPELINE, WRITE_AND_REFINE_PIPELINE, SANITIZE_PIPELINE)
+}
@@ -0,0 +1,211 @@
+import os
+import time
+
+from loguru import logger
+
+from src.utils.similarity_cache import normalize, shingles
+from src.utils.tokens import count_message_tokens, count_tokens
+from src.utils.usage_ledger import cost_usd
+from .patching import REFINE_MODES, PatchedArticle, arefine_with_patches
+from .validation import MAX_SCORE
+
+# Why a refinement loop ended
+MAX_ROUNDS = "max_rounds"
+CONVERGED = "converged"
+NO_IMPROVEMENT = "no_improvement"
+MAX_SCORE_REACHED = "max_score"
+TIME_BUDGET = "time_budget"
+TOKEN_BUDGET = "token_budget"
+
+# Most rounds a single request may ask for
+REFINE_ROUNDS_LIMIT = 5
+
+
+def text_similarity(a, b, size=3):
+    """Jaccard similarity of the word shingles of two texts; 1.0 means no change between drafts."""
+    first, second = shingles(normalize(a or ""), size), shingles(normalize(b or ""), size)
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+def _add(*costs):
+    known = [cost for cost in costs if cost is not None]
+    return round(sum(known), 8) if known else None
+
+
+class RefinementResult(str):
+    """
+    Article produced by several refinement rounds. Carries the per-round
+    report, the validation of the returned text and why the loop stopped.
+    """
+
+    def __new__(cls, value, rounds, validation, stopped):
+        result = super().__new__(cls, value)
+        result.rounds = rounds
+        result.validation = validation
+        result.stopped = stopped
+        return result
+
+    def to_dict(self):
+        return {
+            "text": str(self),
+            "rounds": self.rounds,
+            "stopped": self.stopped,
+            "score": getattr(self.validation, "score", None),
+            "total_tokens": sum(r["tokens"] for r in self.rounds),
+        }
+
+
+class IterativeRefinement:
+    """
+    Runs further refine-and-validate rounds on an article that has had its
+    first refinement pass. Stops at ``max_rounds`` in total, when a round
+    leaves the text nearly unchanged (similarity to the previous draft of at
+    least ``convergence``), when the validator score gains less than
+    ``min_score_gain``, or before a round would exceed the time or token budget.
+    A round that scores worse than the best so far is discarded.
+
+    With ``mode="patch"`` every pass asks for targeted edits that are applied
+    locally, falling back to a full rewrite when they do not apply.
+    """
+
+    def __init__(self, max_rounds=1, time_budget=None, token_budget=None, convergence=0.9, min_score_gain=0.5, mode="rewrite"):
+        if mode not in REFINE_MODES:
+            raise ValueError(f"Refinement mode must be one of {', '.join(REFINE_MODES)}, not {mode!r}.")
+        self.mode = mode
+        self.max_rounds = max_rounds
+        # Seconds and estimated tokens for all rounds together; None leaves them unbounded
+        self.time_budget = time_budget
+        self.token_budget = token_budget
+        self.convergence = convergence
+        self.min_score_gain = min_score_gain
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_rounds=int(os.getenv("REFINE_MAX_ROUNDS", 1)),
+            time_budget=float(os.getenv("REFINE_TIME_BUDGET", 0)) or None,
+            token_budget=int(os.getenv("REFINE_TOKEN_BUDGET", 0)) or None,
+            convergence=float(os.getenv("REFINE_CONVERGENCE", 0.9)),
+            min_score_gain=float(os.getenv("REFINE_MIN_SCORE_GAIN", 0.5)),
+            mode=os.getenv("REFINE_MODE", "rewrite").strip().lower(),
+        )
+
+    async def arefine_once(self, agent_manager, draft, context=None):
+        """One refinement pass over ``draft`` in this instance's mode."""
+        if self.mode == "patch":
+            return await arefine_with_patches(agent_manager, draft, context)
+        return await agent_manager.get_agent("refiner").aexecute(draft=draft, context=context)
+
+    def _round(self, number, previous, text, validation, tokens, cost, started, best_score):
+        similarity = text_similarity(previous, text)
+        score = getattr(validation, "score", None)
+        return {
+            "round": number,
+            "similarity": round(similarity, 4),
+            "delta": round(1 - similarity, 4),
+            "score": score,
+            "score_gain": round(score - best_score, 2) if score is not None and best_score is not None else None,
+            "tokens": tokens,
+            "cost_usd": cost,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2) if started is not None else None,
+            # "rewrite" for a full rewrite, including a patch pass whose edits did not apply
+            "mode": getattr(text, "mode", "rewrite"),
+            "edits": getattr(text, "edits", None),
+        }
+
+    def _estimate(self, agent, messages, reply, context):
+        """Estimated (tokens, cost) of one call, counted locally like the usage ledger does."""
+        model = agent._model(context=agent.context(context))
+        prompt_tokens = count_message_tokens(messages, model)
+        completion_tokens = count_tokens(reply, model)
+        return prompt_tokens + completion_tokens, cost_usd(model, prompt_tokens, completion_tokens)
+
+    def _refine_estimate(self, agent_manager, draft, text, context):
+        """Estimated (tokens, cost) of the pass that refined ``draft`` into ``text``, fallback rewrite included."""
+        refiner = agent_manager.get_agent("refiner")
+        if not isinstance(text, PatchedArticle):
+            return self._estimate(refiner, refiner.build_messages(draft), text, context)
+        patcher = agent_manager.get_agent("patch_refiner")
+        tokens, cost = self._estimate(patcher, patcher.build_messages(draft), text.reply, context)
+        if text.mode == "rewrite":
+            rewrite_tokens, rewrite_cost = self._estimate(refiner, refiner.build_messages(draft), text, context)
+            tokens, cost = tokens + rewrite_tokens, _add(cost, rewrite_cost)
+        return tokens, cost
+
+    def _budget(self, agent, messages, context):
+        # Worst case for the next call: its prompt plus a full-length reply
+        return count_message_tokens(messages, agent._model(context=agent.context(context))) + agent.max_tokens
+
+    async def arefine(self, agent_manager, topic, draft, refined, validation, context, max_rounds=None):
+        """
+        Continues from the first round (``draft`` refined into ``refined``, scored
+        by ``validation``) and returns a RefinementResult with every round's
+        change, score and estimated cost.
+        """
+        refiner = agent_manager.get_agent("patch_refiner" if self.mode == "patch" else "refiner")
+        validator = agent_manager.get_agent("validator")
+        max_rounds = max_rounds or self.max_rounds
+        started = time.perf_counter()
+
+        first_tokens, first_cost = self._refine_estimate(agent_manager, draft, refined, context)
+        validation_tokens, validation_cost = self._estimate(
+            validator, validator.build_messages(topic=topic, article=refined), validation, context
+        )
+        rounds = [self._round(
+            1, draft, refined, validation, first_tokens + validation_tokens,
+            _add(first_cost, validation_cost), None, None,
+        )]
+        spent = rounds[0]["tokens"]
+        best, best_validation = refined, validation
+        best_score = getattr(validation, "score", None)
+        stopped = MAX_ROUNDS
+
+        for number in range(2, max_rounds + 1):
+            if rounds[-1]["similarity"] >= self.convergence:
+                stopped = CONVERGED
+                break
+            if best_score is not None and best_score >= MAX_SCORE:
+                stopped = MAX_SCORE_REACHED
+                break
+            if self.time_budget is not None and time.perf_counter() - started >= self.time_budget:
+                stopped = TIME_BUDGET
+                break
+            refine_messages = refiner.build_messages(best)
+            if self.token_budget is not None:
+                # The validator will read an article about the size of the current one
+                needed = self._budget(refiner, refine_messages, context) + self._budget(
+                    validator, validator.build_messages(topic=topic, article=best), context
+                )
+                if spent + needed > self.token_budget:
+                    stopped = TOKEN_BUDGET
+                    break
+
+            round_started = time.perf_counter()
+            text = await self.arefine_once(agent_manager, best, context)
+            text_validation = await validator.aexecute(topic=topic, article=text, context=context)
+            refine_tokens, refine_cost = self._refine_estimate(agent_manager, best, text, context)
+            check_tokens, check_cost = self._estimate(
+                validator, validator.build_messages(topic=topic, article=text), text_validation, context
+            )
+            rounds.append(self._round(
+                number, best, text, text_validation, refine_tokens + check_tokens,
+                _add(refine_cost, check_cost), round_started, best_score,
+            ))
+            spent += rounds[-1]["tokens"]
+
+            score = getattr(text_validation, "score", None)
+            gain = rounds[-1]["score_gain"]
+            if score is not None and (best_score is None or score >= best_score):
+                best, best_validation, best_score = text, text_validation, score
+            if gain is not None and gain < self.min_score_gain:
+                stopped = NO_IMPROVEMENT
+                break
+
+        if refiner.verbose:
+            logger.info(
+                f"[IterativeRefinement] {len(rounds)} rounds, stopped: {stopped}, "
+                f"deltas {[r['delta'] for r in rounds]}, scores {[r['score'] for r in rounds]} (trace {context.trace_id})"
+            )
+        return RefinementResult(best, rounds, best_validation, stopped)
@@ -1,10 +1,16 @@
 from .agent_base import AgentBase
 
 class RefinerAgent (AgentBase):
-    def __init__(self, llm_provider="openai", max_retries=3, verbose=True):
-        super().__init__(name="RefinerAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose)
+    temperature = 0.3
+    max_tokens = 2048
+    # The refined article plus explanations of the changes
+    output_ratio = 2.0
+    min_tokens = 512
 
-    def execute(self, draft):
+    def __init__(self, llm_provider="openai", max_retries=3, verbose=True, **kwargs):
+        super().__init__(name="RefinerAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose, **kwargs)
+
+    def build_messages(self, draft):
         messages = [
             {"role": "system",
             
@@ -18,6 +24,7 @@ class RefinerAgent (AgentBase):
                 )
             }
         ]
-        
-        refined_article = self.call_llm(messages, temperature=0.3, max_tokens=2048)
-        return refined_article
\ No newline at end of file
+        return messages
+
+    def sized_input(self, draft):
+        return draft
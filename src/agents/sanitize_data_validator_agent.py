@@ -1,23 +1,37 @@
-from .agent_base import AgentBase
+from collections import Counter
 
-class SanitizeDataValidatorAgent(AgentBase):
-    def __init__(self, llm_provider="openai", max_retries=3, verbose=True):
-        super().__init__(name="SanitizeDataValidatorAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose)
+from .validation import VALIDATION_FORMAT, ValidatorAgentBase
 
-    def execute(self, original_data, sanitized_data):
+class SanitizeDataValidatorAgent(ValidatorAgentBase):
+    max_tokens = 512
+    cacheable = True
+
+    def __init__(self, llm_provider="openai", max_retries=3, verbose=True, **kwargs):
+        super().__init__(name="SanitizeDataValidatorAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose, **kwargs)
+
+    def build_messages(self, original_data, sanitized_data, redactions=None):
         system_message = "You are an expert AI assistant that validates the sanitzation of medical data by checking the removal of PHI."
         user_content = (
             "Given the original data and sanitized data, verify that all PHI has been removed\n"
-            "Provide a brief analysis and rate the sanitized process on a scale of 1 to 5, where 5 indicates excellent quality\n\n"
+            "List every piece of PHI still present as a finding.\n"
+            f"{VALIDATION_FORMAT}\n\n"
             f"Original Data: {original_data}\n\n"
             f"Sanitized Data: {sanitized_data}\n\n"
-            "Validation"
+            "Validation (JSON):"
         )
+        if redactions:
+            counts = Counter(span["category"] for span in redactions)
+            summary = ", ".join(f"{category}: {count}" for category, count in sorted(counts.items()))
+            user_content = (
+                f"Values already redacted by the deterministic pre-scrubber ({summary}) appear as bracketed tags.\n"
+                + user_content
+            )
 
         messages = [
             {"role": "system", "content": system_message},
             {"role": "user", "content": user_content}
         ]
-        
-        validation = self.call_llm(messages, max_tokens=512)
-        return validation
\ No newline at end of file
+        return messages
+
+    def sized_input(self, original_data, sanitized_data, redactions=None):
+        return original_data
@@ -1,23 +1,33 @@
-from .agent_base import AgentBase
+from .validation import VALIDATION_FORMAT, ValidatorAgentBase
 
-class SummaryValidatorAgent(AgentBase):
-    def __init__(self, llm_provider="openai", max_retries=3, verbose=True):
-        super().__init__(name="SummaryValidatorAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose)
+class SummaryValidatorAgent(ValidatorAgentBase):
+    max_tokens = 512
+    cacheable = True
 
-    def execute(self, original_text, summary):
+    def __init__(self, llm_provider="openai", max_retries=3, verbose=True, **kwargs):
+        super().__init__(name="SummaryValidatorAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose, **kwargs)
+
+    def build_messages(self, original_text, summary, reference=None):
         system_message = "You are an expert AI assistant that validates the summaries of medical text."
+        if reference:
+            # Long documents are checked against their chunk summaries instead of the full text
+            sections = "\n".join(f"- {section}" for section in reference)
+            source = f"Section summaries of the original text:\n{sections}"
+        else:
+            source = f"Original Text: {original_text}"
         user_content = (
             "Given the original summary assess whether the summary accurately captures the key points and is of high quality\n"
-            "Provide a brief analysis and rate the summarization process on a scale of 1 to 5, where 5 indicates excellent quality\n\n"
-            f"Original Text: {original_text}\n\n"
+            f"{VALIDATION_FORMAT}\n\n"
+            f"{source}\n\n"
             f"Summary: {summary}\n\n"
-            "Validation"
+            "Validation (JSON):"
         )
 
         messages = [
             {"role": "system", "content": system_message},
             {"role": "user", "content": user_content}
         ]
-        
-        validation = self.call_llm(messages, max_tokens=512)
-        return validation
\ No newline at end of file
+        return messages
+
+    def sized_input(self, original_text, summary, reference=None):
+        return None if reference else original_text
@@ -0,0 +1,111 @@
+import json
+import re
+
+from .agent_base import AgentBase
+
+MIN_SCORE = 1
+MAX_SCORE = 5
+
+# Appended to every validator prompt; JSON mode is also requested where the provider supports it
+VALIDATION_FORMAT = (
+    "Respond with a JSON object only, in this form:\n"
+    '{"score": <integer from 1 to 5, where 5 indicates excellent quality>, '
+    '"analysis": "<brief analysis, at most three sentences>", '
+    '"findings": ["<one concrete problem per item; empty if there are none>"]}'
+)
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+# "4/5", "4 out of 5", "4.5 / 5"
+_OUT_OF_FIVE = re.compile(r"\b([1-5](?:\.\d+)?)\s*(?:/|out of)\s*5\b", re.IGNORECASE)
+# "Rating: 4", "score of 4", "I would rate this article a 4"
+_RATED = re.compile(r"\b(?:rat(?:e|ed|ing)|scor(?:e|ed))\b[^0-9\n]{0,40}?\b([1-5](?:\.\d+)?)\b", re.IGNORECASE)
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.+)$", re.MULTILINE)
+
+
+class Validation(str):
+    """
+    A validator's verdict. The string value is the analysis text; ``score``
+    (1 to 5, None when the reply held no usable rating) and ``findings`` are
+    parsed from the reply. ``structured`` says whether the reply was valid JSON.
+    """
+
+    def __new__(cls, analysis, score=None, findings=(), structured=False):
+        validation = super().__new__(cls, analysis)
+        validation.score = score
+        validation.findings = list(findings)
+        validation.structured = structured
+        return validation
+
+    def passes(self, threshold):
+        return self.score is not None and self.score >= threshold
+
+    def to_dict(self):
+        return {"text": str(self), "score": self.score, "findings": self.findings}
+
+
+def _score(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        # "4", "4/5", "4 out of 5"
+        match = re.search(r"\d+(?:\.\d+)?", value)
+        value = match.group(0) if match else None
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not MIN_SCORE <= score <= MAX_SCORE:
+        return None
+    return int(score) if score.is_integer() else score
+
+
+def _json_object(text):
+    text = _FENCE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _from_json(data):
+    """Validation from a decoded reply, or None when it does not follow the schema."""
+    score = _score(data.get("score", data.get("rating")))
+    analysis = data.get("analysis", data.get("feedback", ""))
+    findings = data.get("findings", [])
+    if isinstance(findings, str):
+        findings = [findings]
+    if score is None or not isinstance(analysis, str) or not isinstance(findings, list):
+        return None
+    findings = [str(finding).strip() for finding in findings if str(finding).strip()]
+    return Validation(analysis.strip(), score, findings, structured=True)
+
+
+def _from_prose(text):
+    """Best-effort reading of a free-text validation: the last explicit rating and any bullet points."""
+    matches = _OUT_OF_FIVE.findall(text) or _RATED.findall(text)
+    score = _score(matches[-1]) if matches else None
+    findings = [item.strip() for item in _BULLET.findall(text)]
+    return Validation(text.strip(), score, findings)
+
+
+def parse_validation(reply):
+    """Validation parsed from a validator reply, JSON or prose."""
+    if isinstance(reply, Validation):
+        return reply
+    text = str(reply or "")
+    data = _json_object(text)
+    validation = _from_json(data) if data is not None else None
+    return validation if validation is not None else _from_prose(text)
+
+
+class ValidatorAgentBase(AgentBase):
+    """Validators reply in JSON mode and return a parsed Validation instead of raw text."""
+
+    json_mode = True
+
+    def parse_reply(self, reply):
+        return parse_validation(reply)
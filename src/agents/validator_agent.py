@@ -1,12 +1,16 @@
 # agents/validator_agent.py
 
-from .agent_base import AgentBase
+from .validation import VALIDATION_FORMAT, ValidatorAgentBase
 
-class ValidatorAgent(AgentBase):
-    def __init__(self, llm_provider="openai", max_retries=3, verbose=True):
-        super().__init__(name="ValidatorAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose)
+class ValidatorAgent(ValidatorAgentBase):
+    temperature = 0.3         # Lower temperature for more deterministic output
+    max_tokens = 500
+    cacheable = True
 
-    def execute(self, topic, article):
+    def __init__(self, llm_provider="openai", max_retries=3, verbose=True, **kwargs):
+        super().__init__(name="ValidatorAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose, **kwargs)
+
+    def build_messages(self, topic, article):
         messages = [
             {
                 "role": "system",
@@ -16,20 +20,14 @@ class ValidatorAgent(AgentBase):
                 "role": "user",
                 "content": (
                     "Given the topic and the research article below, assess whether the article comprehensively covers the topic, follows a logical structure, and maintains academic standards.\n"
-                    "Provide a brief analysis and rate the article on a scale of 1 to 5, where 5 indicates excellent quality.\n\n"
+                    f"{VALIDATION_FORMAT}\n\n"
                     f"Topic: {topic}\n\n"
                     f"Article:\n{article}\n\n"
-                    "Validation:"
+                    "Validation (JSON):"
                 )
             }
         ]
-        validation = self.call_llm(
-            messages=messages,
-            temperature=0.3,         # Lower temperature for more deterministic output
-            max_tokens=500,
-            # top_p=1,
-            # frequency_penalty=0,
-            # presence_penalty=0,
-            # response_format={"type": "text"}
-        )
-        return validation
\ No newline at end of file
+        return messages
+
+    def sized_input(self, topic, article):
+        return article
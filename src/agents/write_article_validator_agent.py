@@ -1,22 +1,29 @@
-from .agent_base import AgentBase
+from .validation import VALIDATION_FORMAT, ValidatorAgentBase
 
-class WriteArticlealidatorAgent(AgentBase):
-    def __init__(self, llm_provider="openai", max_retries=3, verbose=True):
-        super().__init__(name="WriteArticleValidatorAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose)
+class WriteArticlealidatorAgent(ValidatorAgentBase):
+    max_tokens = 512
+    cacheable = True
 
-    def execute(self, topic, article, outline=None):
+    def __init__(self, llm_provider="openai", max_retries=3, verbose=True, **kwargs):
+        super().__init__(name="WriteArticleValidatorAgent", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose, **kwargs)
+
+    def build_messages(self, topic, article, outline=None):
         system_message = "You are an expert AI assistant that validates research articles on various topics."
         user_content = (
-            "Given the topic and article, assess whether the article is well-written, coherent, and comprehensively covers the topic. Check if it maintains academic standards. Provide feedback analysis on the following article. Rate the article on a scale of 1 to 5, where 5 indicates excellent\n\n"
-            f"Topic: {topic}\n\n"
-            f"Article: {article}\n\n"
-            "Validation:"
+            "Given the topic and article, assess whether the article is well-written, coherent, and comprehensively covers the topic. Check if it maintains academic standards. List what an editor should fix as findings.\n"
         )
+        if outline:
+            user_content += "The article was written from the outline below; list any outline section it leaves out or covers only in passing as a finding.\n"
+        user_content += f"{VALIDATION_FORMAT}\n\nTopic: {topic}\n\n"
+        if outline:
+            user_content += f"Outline: {outline}\n\n"
+        user_content += f"Article: {article}\n\nValidation (JSON):"
 
         messages = [
             {"role": "system", "content": system_message},
             {"role": "user", "content": user_content}
         ]
-        
-        validation = self.call_llm(messages, max_tokens=512)
-        return validation
\ No newline at end of file
+        return messages
+
+    def sized_input(self, topic, article, outline=None):
+        return article
@@ -0,0 +1,2 @@
+from .store import FAILED, FINISHED, QUEUED, RUNNING, SUCCEEDED, JobStore
+from .runner import JobRunner
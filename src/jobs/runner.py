@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import os
+import socket
+import time
+
+from loguru import logger
+
+from src.agents.pipeline import StageError
+from src.jobs.store import FAILED, FINISHED, SUCCEEDED, JobStore
+
+
+def serialize_output(output):
+    """JSON-friendly form of a stage output."""
+    return output.to_dict() if hasattr(output, "to_dict") else output
+
+
+class JobRunner:
+    """
+    Pool of ``concurrency`` asyncio workers that claim jobs from a JobStore and
+    run their pipelines on a shared AgentManager. Each stage's output is saved
+    as soon as it finishes, so a job's partial results can be read while it runs.
+
+    Runs inside the API process (started on app startup) or on its own via
+    ``python -m src.jobs.runner``; several runners may share one store.
+    """
+
+    def __init__(self, agent_manager, store, concurrency=4, poll_interval=0.5, purge_interval=3600):
+        self.agent_manager = agent_manager
+        self.store = store
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._workers = []
+        self._events = {}  # job id -> asyncio.Event set when the job finishes here
+        self._wakeup = None
+        self._last_purge = 0.0
+
+    @classmethod
+    def from_env(cls, agent_manager, store=None):
+        return cls(
+            agent_manager,
+            store or JobStore.from_env(),
+            concurrency=int(os.getenv("JOBS_WORKERS", 4)),
+            poll_interval=float(os.getenv("JOBS_POLL_INTERVAL", 0.5)),
+        )
+
+    def start(self):
+        if self._workers or self.concurrency <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._workers = [asyncio.ensure_future(self._work(f"{prefix}:{i}")) for i in range(self.concurrency)]
+        logger.info(f"[JobRunner] Started {self.concurrency} workers")
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, pipeline_name, inputs, options=None):
+        """Queues a job and returns its id without waiting for it to run."""
+        job_id = await asyncio.to_thread(self.store.create, pipeline_name, inputs, options)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def wait(self, job_id, timeout):
+        """
+        Returns the job once it has finished or ``timeout`` seconds have passed.
+        Jobs run by this process wake the caller at once; jobs run elsewhere are
+        picked up by polling the store.
+        """
+        deadline = time.monotonic() + timeout
+        event = self._events.setdefault(job_id, asyncio.Event())
+        try:
+            while True:
+                job = await asyncio.to_thread(self.store.get, job_id)
+                remaining = deadline - time.monotonic()
+                if job is None or job["status"] in FINISHED or remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval * 4))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if not event.is_set():
+                self._events.pop(job_id, None)
+
+    # ---- Workers ----
+
+    async def _work(self, worker):
+        while True:
+            job = await asyncio.to_thread(self.store.claim, worker)
+            if job is None:
+                await self._maybe_purge()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job, worker)
+
+    async def _run(self, job, worker):
+        job_id = job["id"]
+        options = job["options"]
+        renewing = asyncio.ensure_future(self._renew(job_id, worker))
+        logger.info(f"[JobRunner] {worker} running job {job_id} ({job['pipeline']}, attempt {job['attempts']})")
+
+        saves = []
+
+        async def save_stage(previous, stage, output, timing):
+            # One write at a time, so stages are saved in completion order
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            await asyncio.to_thread(self.store.save_stage, job_id, worker, stage, output, timing)
+
+        def on_stage_complete(stage, output, timing):
+            # Called on the event loop; the SQLite write runs in a thread
+            previous = saves[-1] if saves else None
+            saves.append(asyncio.ensure_future(save_stage(previous, stage, serialize_output(output), timing)))
+
+        async def saved():
+            """Waits for the stage writes, so a finished job never lacks one of its stages."""
+            for result in await asyncio.gather(*saves, return_exceptions=True):
+                if isinstance(result, Exception):
+                    logger.warning(f"[JobRunner] Could not save a stage of job {job_id}: {result}")
+
+        try:
+            pipeline = self.agent_manager.get_pipeline(job["pipeline"])
+            result = await pipeline.arun(
+                self.agent_manager,
+                job["inputs"],
+                context=self.agent_manager.context(options.get("llm_provider"), options.get("model")),
+                on_stage_complete=on_stage_complete,
+            )
+            outputs = {name: serialize_output(output) for name, output in result.outputs.items()}
+            payload = {"outputs": outputs, "timings": result.timings, "total_ms": result.total_ms}
+            await saved()
+            await asyncio.to_thread(self.store.finish, job_id, worker, SUCCEEDED, payload)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back instead of waiting for its lease to run out
+            await asyncio.shield(asyncio.to_thread(self.store.release, job_id, worker))
+            raise
+        except StageError as e:
+            await saved()
+            await asyncio.to_thread(self.store.finish, job_id, worker, FAILED, None, f"{e.label}: {str(e.error)}")
+        except Exception as e:
+            logger.exception(f"[JobRunner] Job {job_id} failed")
+            await saved()
+            await asyncio.to_thread(self.store.finish, job_id, worker, FAILED, None, str(e))
+        finally:
+            renewing.cancel()
+            event = self._events.get(job_id)
+            if event is not None:
+                event.set()
+                self._events.pop(job_id, None)
+
+    async def _renew(self, job_id, worker):
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            await asyncio.to_thread(self.store.renew, job_id, worker)
+
+    async def _maybe_purge(self):
+        if time.monotonic() - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = time.monotonic()
+        await asyncio.to_thread(self.store.purge)
+
+
+# ---- Standalone worker process ----
+
+def main():
+    parser = argparse.ArgumentParser(description="Run pipeline jobs from the job store without the API.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("JOBS_WORKERS", 4)))
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from src.agents import AgentManager
+
+    load_dotenv()
+    agent_manager = AgentManager(max_retries=3, verbose=True)
+    runner = JobRunner.from_env(agent_manager)
+    runner.concurrency = max(1, args.workers)
+
+    async def serve():
+        runner.start()
+        try:
+            await asyncio.gather(*runner._workers)
+        finally:
+            await runner.stop()
+            await agent_manager.clients.aclose()
+            if agent_manager.usage_ledger is not None:
+                agent_manager.usage_ledger.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
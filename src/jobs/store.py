@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+# Set on finish: the raw inputs (e.g. medical records) and the stage outputs are
+# only needed while the job runs, so only the result and stage timings are kept
+_CLEAR_ON_FINISH = (
+    "inputs = '{}', "
+    "stages = (SELECT coalesce(json_group_object(key, json_remove(value, '$.output')), '{}') FROM json_each(jobs.stages))"
+)
+
+
+class JobStore:
+    """
+    Durable job queue and result store in SQLite (WAL mode), shared by every
+    worker process on the host.
+
+    A worker claims a job by taking a lease on it and renews the lease while the
+    job runs. Jobs whose lease ran out, because their worker died or was
+    restarted, are claimed again, so queued and in-flight work survives restarts.
+    A finished job keeps its result and stage timings; its inputs and stage
+    outputs are cleared.
+    """
+
+    def __init__(self, path, lease_seconds=60, retention=86400, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        # Jobs whose worker died this many times are failed instead of retried
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, pipeline TEXT NOT NULL, inputs TEXT NOT NULL, options TEXT NOT NULL, "
+            "status TEXT NOT NULL, stages TEXT NOT NULL DEFAULT '{}', result TEXT, error TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("JOBS_DB_PATH", "cache/jobs.sqlite3"),
+            lease_seconds=float(os.getenv("JOBS_LEASE_SECONDS", 60)),
+            retention=float(os.getenv("JOBS_RETENTION", 86400)),
+            max_attempts=int(os.getenv("JOBS_MAX_ATTEMPTS", 3)),
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("inputs", "options", "stages", "result"):
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def create(self, pipeline, inputs, options=None):
+        job_id = uuid.uuid4().hex
+        self._connection().execute(
+            "INSERT INTO jobs (id, pipeline, inputs, options, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, pipeline, json.dumps(inputs), json.dumps(options or {}), QUEUED, time.time()),
+        )
+        return job_id
+
+    def get(self, job_id):
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def claim(self, worker):
+        """Leases the oldest queued job (or one whose lease expired) to ``worker``."""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT id, attempts FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row["attempts"] < self.max_attempts:
+                    break
+                conn.execute(
+                    f"UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_until = NULL, {_CLEAR_ON_FINISH} WHERE id = ?",
+                    (FAILED, f"Job abandoned after {row['attempts']} lost workers", now, row["id"]),
+                )
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "started_at = ?, stages = '{}' WHERE id = ?",
+                (RUNNING, worker, now + self.lease_seconds, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def renew(self, job_id, worker):
+        self._connection().execute(
+            "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time() + self.lease_seconds, job_id, worker, RUNNING),
+        )
+
+    def release(self, job_id, worker):
+        """Puts a job back in the queue when its worker shuts down cleanly."""
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL, attempts = attempts - 1, stages = '{}' "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (QUEUED, job_id, worker, RUNNING),
+        )
+
+    def save_stage(self, job_id, worker, stage, output, timing):
+        """Stores one finished stage so clients can read partial results."""
+        self._connection().execute(
+            "UPDATE jobs SET stages = json_set(stages, '$.' || ?, json(?)) WHERE id = ? AND worker = ?",
+            (stage, json.dumps({"output": output, "timing": timing}), job_id, worker),
+        )
+
+    def finish(self, job_id, worker, status, result=None, error=None):
+        self._connection().execute(
+            f"UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL, {_CLEAR_ON_FINISH} "
+            "WHERE id = ? AND worker = ?",
+            (status, None if result is None else json.dumps(result), error, time.time(), job_id, worker),
+        )
+
+    def purge(self):
+        """Deletes finished jobs older than the retention period."""
+        self._connection().execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND finished_at < ?",
+            (*FINISHED, time.time() - self.retention),
+        )
+
+    def counts(self):
+        rows = self._connection().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
@@ -0,0 +1,11 @@
+from .clients import ProviderClients, get_default_clients
+from .hedging import Hedging
+from .rate_limit import RateLimiter, TokenBucket
+from .registry import (
+    LiteLLMAdapter,
+    OpenAIAdapter,
+    OpenAICompatibleAdapter,
+    ProviderAdapter,
+    ProviderRegistry,
+    load_agent_routes,
+)
@@ -0,0 +1,237 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+from loguru import logger
+
+from src.providers.hedging import Hedging
+from src.providers.rate_limit import RateLimiter
+from src.providers.registry import ProviderRegistry
+from src.utils.retry import CircuitBreaker
+
+# Load environment variables
+load_dotenv()
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# Every ProviderClients in the process, so a forked child can drop the parent's connections
+_instances = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    for clients in list(_instances):
+        clients._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class ProviderClients:
+    """
+    Long-lived provider clients shared by every agent in a worker process.
+
+    Providers and their adapters come from a ProviderRegistry. Each provider
+    gets its own httpx connection pool (keep-alive, optional HTTP/2,
+    explicit limits and timeouts), so requests reuse warm TLS connections instead
+    of paying connection setup on every call. Async clients are bound to the event
+    loop that first uses them.
+
+    SDKs are imported and clients created on first use. A process forked after
+    that (gunicorn ``--preload``) starts over with pools of its own instead of
+    sharing the parent's sockets.
+    """
+
+    def __init__(
+        self,
+        registry=None,
+        max_connections=100,
+        max_keepalive_connections=20,
+        keepalive_expiry=30.0,
+        connect_timeout=5.0,
+        read_timeout=60.0,
+        pool_timeout=10.0,
+        http2=True,
+    ):
+        self.registry = registry or ProviderRegistry.from_env()
+        providers = self.registry.names()
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout)
+        self.http2 = http2
+
+        # Per-provider circuit breakers shared by every agent of this worker
+        self.breakers = {provider: CircuitBreaker.from_env(provider) for provider in providers}
+        # Shared latency tracking for hedged requests and failover
+        self.hedging = Hedging.from_env(providers)
+        # Client-side RPM/TPM scheduling, fed back by the pools' response headers
+        self.rate_limiter = RateLimiter.from_env(providers)
+
+        self._reset()
+        _instances.add(self)
+
+    def _reset(self):
+        # Inherited clients are dropped rather than closed: their sockets belong to the parent
+        self._lock = threading.Lock()
+        self._http_clients = {}
+        self._sdk_clients = {}
+        # event loop -> {provider: client}; entries vanish with their loop
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_connections=_env_int("LLM_POOL_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("LLM_POOL_MAX_KEEPALIVE", 20),
+            keepalive_expiry=_env_float("LLM_POOL_KEEPALIVE_EXPIRY", 30.0),
+            connect_timeout=_env_float("LLM_CONNECT_TIMEOUT", 5.0),
+            read_timeout=_env_float("LLM_READ_TIMEOUT", 60.0),
+            pool_timeout=_env_float("LLM_POOL_TIMEOUT", 10.0),
+            http2=_env_bool("LLM_HTTP2", True),
+        )
+
+    # ------------------- httpx pools -------------------
+
+    def _client_options(self, provider, asynchronous=False):
+        return {
+            "limits": self.limits,
+            "timeout": self.timeout,
+            "http2": self.http2,
+            "event_hooks": self.rate_limiter.response_hooks(provider, asynchronous),
+        }
+
+    def _http_client(self, provider):
+        client = self._http_clients.get(provider)
+        if client is None:
+            with self._lock:
+                client = self._http_clients.get(provider)
+                if client is None:
+                    client = httpx.Client(**self._client_options(provider))
+                    self._http_clients[provider] = client
+                    logger.info(f"[ProviderClients] Created {provider} connection pool (http2={self.http2})")
+        return client
+
+    def _async_clients_for_loop(self):
+        loop = asyncio.get_running_loop()
+        clients = self._async_clients.get(loop)
+        if clients is None:
+            clients = {}
+            self._async_clients[loop] = clients
+        return clients
+
+    def request_timeout(self, remaining):
+        """Per-request timeout that never outlives the caller's deadline."""
+        if remaining is None:
+            return self.timeout
+        return httpx.Timeout(
+            min(self.timeout.read, remaining),
+            connect=min(self.timeout.connect, remaining),
+            pool=min(self.timeout.pool, remaining),
+        )
+
+    def breaker(self, provider):
+        breaker = self.breakers.get(provider)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(provider, CircuitBreaker.from_env(provider))
+        return breaker
+
+    def breaker_stats(self):
+        return {provider: breaker.stats() for provider, breaker in self.breakers.items()}
+
+    # ------------------- SDK clients -------------------
+
+    def openai(self, provider="openai"):
+        """OpenAI SDK client for ``provider`` (OpenAI itself or an OpenAI-compatible server)."""
+        client = self._sdk_clients.get(provider)
+        if client is None:
+            import openai
+
+            # Retries happen in AgentBase, so the SDK's own retry loop is switched off
+            client = openai.OpenAI(
+                http_client=self._http_client(provider), max_retries=0, **self.registry.get(provider).sdk_options()
+            )
+            self._sdk_clients[provider] = client
+        return client
+
+    def async_openai(self, provider="openai"):
+        clients = self._async_clients_for_loop()
+        if provider not in clients:
+            import openai
+
+            clients[provider] = openai.AsyncOpenAI(
+                http_client=httpx.AsyncClient(**self._client_options(provider, asynchronous=True)),
+                max_retries=0,
+                **self.registry.get(provider).sdk_options(),
+            )
+        return clients[provider]
+
+    def http_handler(self, provider="groq"):
+        """litellm handler wrapping ``provider``'s shared connection pool."""
+        client = self._sdk_clients.get(provider)
+        if client is None:
+            from litellm.llms.custom_httpx.http_handler import HTTPHandler
+
+            client = HTTPHandler(timeout=self.timeout, client=self._http_client(provider))
+            self._sdk_clients[provider] = client
+        return client
+
+    def async_http_handler(self, provider="groq"):
+        clients = self._async_clients_for_loop()
+        if provider not in clients:
+            from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+
+            # AsyncHTTPHandler() always builds a client of its own, which would leak once
+            # replaced by our pool; set the handler up around the pool without it.
+            handler = AsyncHTTPHandler.__new__(AsyncHTTPHandler)
+            handler.timeout, handler.event_hooks, handler.client_alias = self.timeout, None, None
+            handler.client = httpx.AsyncClient(**self._client_options(provider, asynchronous=True))
+            clients[provider] = handler
+        return clients[provider]
+
+    # ------------------- Lifecycle -------------------
+
+    def close(self):
+        for client in self._http_clients.values():
+            client.close()
+        self._http_clients.clear()
+        self._sdk_clients.clear()
+
+    async def aclose_loop(self):
+        """Closes the async clients bound to the running event loop."""
+        clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            # AsyncOpenAI and litellm's AsyncHTTPHandler both close their pool
+            await client.close()
+
+    async def aclose(self):
+        await self.aclose_loop()
+        self.close()
+
+
+_default_clients = None
+
+
+def get_default_clients():
+    """Process-wide ProviderClients used by agents built outside an AgentManager."""
+    global _default_clients
+    if _default_clients is None:
+        _default_clients = ProviderClients.from_env()
+    return _default_clients
@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import deque
+
+from src.utils.stats import percentile
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+class Hedging:
+    """
+    Hedged requests and failover between the two providers.
+
+    Successful request latencies are tracked per (provider, agent). When hedging
+    is on, a request still unanswered after the ``percentile`` latency of its
+    provider and agent is repeated on the other provider and the first reply
+    wins. Failover sends requests straight to the other provider while the
+    primary's circuit breaker is open.
+    """
+
+    def __init__(self, providers, enabled=False, failover=False, percentile=95, min_samples=20,
+                 default_delay=2.0, min_delay=0.05, window=500):
+        self.providers = tuple(providers)
+        self.enabled = enabled
+        self.failover = failover
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.window = window
+        self._latencies = {}  # (provider, agent) -> deque of seconds
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "hedged": 0, "primary_wins": 0, "secondary_wins": 0, "failovers": 0}
+
+    @classmethod
+    def from_env(cls, providers):
+        enabled = _env_bool("LLM_HEDGING_ENABLED", False)
+        return cls(
+            providers,
+            enabled=enabled,
+            failover=_env_bool("LLM_FAILOVER_ENABLED", enabled),
+            percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", 95)),
+            min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20)),
+            default_delay=float(os.getenv("LLM_HEDGE_DELAY", 2.0)),
+        )
+
+    def secondary(self, provider):
+        """The provider to hedge or fail over to, or None if there is none."""
+        others = [p for p in self.providers if p != provider]
+        return others[0] if others else None
+
+    def record_latency(self, provider, agent, seconds):
+        with self._lock:
+            samples = self._latencies.get((provider, agent))
+            if samples is None:
+                samples = self._latencies[(provider, agent)] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def delay(self, provider, agent):
+        """Seconds to wait on ``provider`` before sending the hedge."""
+        with self._lock:
+            samples = list(self._latencies.get((provider, agent), ()))
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, percentile(samples, self.percentile))
+
+    def count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            keys = list(self._latencies)
+        stats["enabled"] = self.enabled
+        stats["failover"] = self.failover
+        stats["hedge_rate"] = round(stats["hedged"] / stats["calls"], 4) if stats["calls"] else 0.0
+        stats["secondary_win_rate"] = round(stats["secondary_wins"] / stats["hedged"], 4) if stats["hedged"] else 0.0
+        stats["delays_ms"] = {
+            f"{provider}/{agent}": round(self.delay(provider, agent) * 1000, 2) for provider, agent in keys
+        }
+        return stats
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from loguru import logger
+
+from src.utils.stats import latency_summary
+
+_DURATION = re.compile(r"([\d.]+)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def parse_reset(value):
+    """Seconds in a rate-limit reset header such as ``1s``, ``6m0s`` or ``250ms``."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    return sum(float(amount) * _UNITS[unit] for amount, unit in parts) if parts else None
+
+
+def _model_name(provider, model):
+    # litellm strips the "groq/" prefix before the request goes out
+    prefix = f"{provider}/"
+    return model[len(prefix):] if model and model.startswith(prefix) else model
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations instead of refusals: a caller
+    takes its tokens at once, possibly driving the bucket negative, and waits
+    until the refill has paid the debt back. Callers are released in the order
+    they reserved, at the bucket's rate.
+    """
+
+    def __init__(self, rate, capacity):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        """Takes ``amount`` tokens and returns the seconds to wait before using them."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def clamp(self, tokens):
+        """Never lets the bucket hold more than ``tokens``."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, tokens)
+
+    def scale_rate(self, factor):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.max_rate * 0.05, min(self.max_rate, self.rate * factor))
+
+
+class _ModelLimits:
+    def __init__(self, provider, model, rpm, tpm, burst_seconds, window):
+        self.provider = provider
+        self.model = model
+        self.requests = TokenBucket(rpm / 60, max(1.0, rpm / 60 * burst_seconds)) if rpm else None
+        self.tokens = TokenBucket(tpm / 60, max(1.0, tpm / 60 * burst_seconds)) if tpm else None
+        self.waiting = 0
+        self.waits_ms = deque(maxlen=window)
+        self.stats = {"calls": 0, "delayed": 0, "rate_limited": 0, "deadline_exceeded": 0}
+
+
+class RateLimiter:
+    """
+    Client-side scheduler for outbound LLM traffic.
+
+    Each (provider, model) gets a token bucket for requests and one for tokens,
+    sized from its RPM/TPM limits. Calls reserve one request and their estimated
+    tokens (prompt plus ``max_tokens``) before they are sent and wait their turn
+    instead of running into 429s. Estimates are settled against the reported
+    usage afterwards.
+
+    The buckets follow the provider's own accounting: ``x-ratelimit-remaining-*``
+    headers cap what the bucket may hold, and a 429 slows the bucket down
+    (multiplicative decrease) until successful calls bring it back to the
+    configured rate.
+    """
+
+    RECOVERY = 1.02
+    BACKOFF = 0.7
+
+    def __init__(self, limits, enabled=True, headroom=0.9, burst_seconds=10.0, window=500):
+        self.limits = limits
+        self.enabled = enabled
+        # Share of the provider's reported remaining budget we let ourselves use
+        self.headroom = headroom
+        self.burst_seconds = burst_seconds
+        self.window = window
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, providers):
+        # Limits depend on the account's tier, so a provider is only throttled
+        # once its RATE_LIMIT_<PROVIDER>_RPM / _TPM are set
+        limits = {}
+        for provider in providers:
+            limits[provider] = {
+                "rpm": float(os.getenv(f"RATE_LIMIT_{provider.upper()}_RPM", 0)),
+                "tpm": float(os.getenv(f"RATE_LIMIT_{provider.upper()}_TPM", 0)),
+            }
+        # With no limit set there is nothing to enforce, so nothing is counted either
+        configured = any(value for provider_limits in limits.values() for value in provider_limits.values())
+        return cls(
+            limits,
+            enabled=_env_bool("RATE_LIMIT_ENABLED", True) and configured,
+            headroom=float(os.getenv("RATE_LIMIT_HEADROOM", 0.9)),
+            burst_seconds=float(os.getenv("RATE_LIMIT_BURST_SECONDS", 10)),
+        )
+
+    def limited(self, provider, tokens=False):
+        """Whether calls to ``provider`` are throttled; with ``tokens``, whether by a token budget."""
+        configured = self.limits.get(provider, {})
+        if tokens:
+            return self.enabled and bool(configured.get("tpm"))
+        return self.enabled and bool(configured.get("rpm") or configured.get("tpm"))
+
+    def _limits(self, provider, model):
+        model = _model_name(provider, model)
+        limits = self._models.get((provider, model))
+        if limits is None:
+            with self._lock:
+                limits = self._models.get((provider, model))
+                if limits is None:
+                    configured = self.limits.get(provider, {})
+                    limits = _ModelLimits(
+                        provider, model, configured.get("rpm"), configured.get("tpm"), self.burst_seconds, self.window
+                    )
+                    self._models[(provider, model)] = limits
+        return limits
+
+    def _count(self, limits, stat, amount=1):
+        with self._lock:
+            limits.stats[stat] += amount
+
+    def _waiting(self, limits, amount):
+        with self._lock:
+            limits.waiting += amount
+
+    def _reserve(self, limits, tokens):
+        waits = [0.0]
+        if limits.requests is not None:
+            waits.append(limits.requests.reserve(1))
+        if limits.tokens is not None:
+            waits.append(limits.tokens.reserve(tokens))
+        return max(waits)
+
+    def _release(self, limits, tokens):
+        if limits.requests is not None:
+            limits.requests.refund(1)
+        if limits.tokens is not None:
+            limits.tokens.refund(tokens)
+
+    def _admit(self, limits, tokens, deadline):
+        """Reserves capacity and returns the wait, or raises when it would outlast ``deadline``."""
+        wait = self._reserve(limits, tokens)
+        self._count(limits, "calls")
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None and wait > remaining:
+            self._release(limits, tokens)
+            self._count(limits, "deadline_exceeded")
+            raise TimeoutError(
+                f"Rate limit for {limits.provider}/{limits.model} needs a {wait:.1f}s wait; only {remaining:.1f}s left."
+            )
+        with self._lock:
+            limits.waits_ms.append(wait * 1000)
+            if wait > 0:
+                limits.stats["delayed"] += 1
+        return wait
+
+    def acquire(self, provider, model, tokens, deadline=None):
+        """Blocks until a call of ``tokens`` estimated tokens may be sent; returns the reservation."""
+        if not self.limited(provider):
+            return 0
+        limits = self._limits(provider, model)
+        wait = self._admit(limits, tokens, deadline)
+        if wait > 0:
+            self._waiting(limits, 1)
+            try:
+                time.sleep(wait)
+            finally:
+                self._waiting(limits, -1)
+        return tokens
+
+    async def aacquire(self, provider, model, tokens, deadline=None):
+        if not self.limited(provider):
+            return 0
+        limits = self._limits(provider, model)
+        wait = self._admit(limits, tokens, deadline)
+        if wait > 0:
+            self._waiting(limits, 1)
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # A hedged or abandoned call gives its place back
+                self._release(limits, tokens)
+                raise
+            finally:
+                self._waiting(limits, -1)
+        return tokens
+
+    def settle(self, provider, model, reserved, used):
+        """Returns the part of a reservation the call did not use."""
+        if not self.enabled or not reserved or used is None:
+            return
+        limits = self._limits(provider, model)
+        if limits.tokens is not None and used < reserved:
+            limits.tokens.refund(reserved - used)
+
+    # ---- Feedback from the provider ----
+
+    def observe(self, provider, model, status_code, headers):
+        """Adjusts the buckets of ``provider``/``model`` from a response's rate-limit headers."""
+        if not self.enabled or model is None:
+            return
+        limits = self._limits(provider, model)
+        for name, bucket in (("requests", limits.requests), ("tokens", limits.tokens)):
+            if bucket is None:
+                continue
+            try:
+                remaining = float(headers.get(f"x-ratelimit-remaining-{name}"))
+            except (TypeError, ValueError):
+                remaining = None
+            if remaining is not None:
+                bucket.clamp(remaining * self.headroom)
+            if status_code == 429:
+                reset = parse_reset(headers.get(f"x-ratelimit-reset-{name}"))
+                if reset is not None and remaining is not None and remaining <= 0:
+                    # Nothing left until the provider's window resets
+                    bucket.clamp(-bucket.rate * reset)
+                bucket.scale_rate(self.BACKOFF)
+            else:
+                bucket.scale_rate(self.RECOVERY)
+        if status_code == 429:
+            self._count(limits, "rate_limited")
+            logger.warning(f"[RateLimiter] {provider}/{limits.model} returned 429; slowing down")
+
+    def _observe_response(self, provider, response):
+        try:
+            model = json.loads(response.request.content or b"{}").get("model")
+        except Exception:
+            # Streamed or non-JSON request bodies carry no model we can read
+            model = None
+        self.observe(provider, model, response.status_code, response.headers)
+
+    def response_hooks(self, provider, asynchronous=False):
+        """httpx ``event_hooks`` feeding every response of ``provider``'s pool into observe()."""
+        if not self.limited(provider):
+            return {}
+        if asynchronous:
+            async def hook(response):
+                self._observe_response(provider, response)
+        else:
+            def hook(response):
+                self._observe_response(provider, response)
+        return {"response": [hook]}
+
+    def stats(self):
+        stats = {"enabled": self.enabled}
+        with self._lock:
+            models = [(key, limits.waiting, dict(limits.stats), list(limits.waits_ms)) for key, limits in self._models.items()]
+        for (provider, model), waiting, counters, waits_ms in models:
+            limits = self._models[(provider, model)]
+            entry = {"waiting": waiting, **counters, "wait_ms": latency_summary(waits_ms)}
+            for name in ("requests", "tokens"):
+                bucket = getattr(limits, name)
+                if bucket is not None:
+                    entry[name] = {
+                        "available": round(bucket.tokens, 2),
+                        "per_minute": round(bucket.rate * 60, 2),
+                        "configured_per_minute": round(bucket.max_rate * 60, 2),
+                    }
+            stats[f"{provider}/{model}"] = entry
+        return stats
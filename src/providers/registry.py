@@ -0,0 +1,286 @@
+import json
+import os
+from abc import ABC, abstractmethod
+
+
+def _env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _read_stream(stream, usage):
+    """Text deltas of a chat completion stream; its usage block is stored in ``usage``."""
+    for chunk in stream:
+        if usage is not None and getattr(chunk, "usage", None):
+            usage["usage"] = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def _aread_stream(stream, usage):
+    async for chunk in stream:
+        if usage is not None and getattr(chunk, "usage", None):
+            usage["usage"] = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+class ProviderAdapter(ABC):
+    """
+    Sends chat completions to one LLM backend. Adapters are registered by name
+    in a ProviderRegistry and use the pooled clients of a ProviderClients.
+    Every method returns or yields OpenAI-shaped results: ``(text, usage)``
+    for completions and text deltas for streams.
+
+    ``response_format`` asks for JSON mode; adapters whose backend does not
+    support it (``json_mode`` False) leave it out and rely on the prompt.
+    """
+
+    json_mode = True
+
+    def __init__(self, name, default_model):
+        self.name = name
+        self.default_model = default_model
+
+    def load(self):
+        """Imports the adapter's SDK now rather than on its first call."""
+
+    @abstractmethod
+    def complete(self, clients, model, messages, temperature, max_tokens, timeout=None, response_format=None):
+        pass
+
+    @abstractmethod
+    async def acomplete(self, clients, model, messages, temperature, max_tokens, timeout=None, response_format=None):
+        pass
+
+    @abstractmethod
+    def stream(self, clients, model, messages, temperature, max_tokens, usage=None, timeout=None, response_format=None):
+        """Yields text deltas."""
+
+    @abstractmethod
+    def astream(self, clients, model, messages, temperature, max_tokens, usage=None, timeout=None, response_format=None):
+        """Async generator of text deltas."""
+
+    def __repr__(self):
+        return f"{type(self).__name__}(name={self.name!r}, default_model={self.default_model!r})"
+
+
+class OpenAIAdapter(ProviderAdapter):
+    """OpenAI through the official SDK; ``base_url`` points it at any other endpoint."""
+
+    def __init__(self, name="openai", default_model="gpt-4o-mini", api_key=None, base_url=None):
+        super().__init__(name, default_model)
+        self.api_key = api_key
+        self.base_url = base_url
+
+    def sdk_options(self):
+        options = {"api_key": self.api_key}
+        if self.base_url:
+            options["base_url"] = self.base_url
+        return options
+
+    def load(self):
+        import openai
+
+    def _params(self, model, messages, temperature, max_tokens, timeout, stream=False, response_format=None):
+        params = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "timeout": timeout,
+        }
+        if response_format and self.json_mode:
+            params["response_format"] = response_format
+        if stream:
+            params.update(stream=True, stream_options={"include_usage": True})
+        return params
+
+    def complete(self, clients, model, messages, temperature, max_tokens, timeout=None, response_format=None):
+        response = clients.openai(self.name).chat.completions.create(
+            **self._params(model, messages, temperature, max_tokens, timeout, response_format=response_format)
+        )
+        return response.choices[0].message.content, getattr(response, "usage", None)
+
+    async def acomplete(self, clients, model, messages, temperature, max_tokens, timeout=None, response_format=None):
+        response = await clients.async_openai(self.name).chat.completions.create(
+            **self._params(model, messages, temperature, max_tokens, timeout, response_format=response_format)
+        )
+        return response.choices[0].message.content, getattr(response, "usage", None)
+
+    def stream(self, clients, model, messages, temperature, max_tokens, usage=None, timeout=None, response_format=None):
+        stream = clients.openai(self.name).chat.completions.create(
+            **self._params(model, messages, temperature, max_tokens, timeout, stream=True, response_format=response_format)
+        )
+        yield from _read_stream(stream, usage)
+
+    async def astream(self, clients, model, messages, temperature, max_tokens, usage=None, timeout=None, response_format=None):
+        stream = await clients.async_openai(self.name).chat.completions.create(
+            **self._params(model, messages, temperature, max_tokens, timeout, stream=True, response_format=response_format)
+        )
+        async for delta in _aread_stream(stream, usage):
+            yield delta
+
+
+class OpenAICompatibleAdapter(OpenAIAdapter):
+    """
+    Any server speaking the OpenAI chat completions API over HTTP (vLLM, Ollama,
+    llama.cpp, TGI, LM Studio...). Local servers often need no key, so a
+    placeholder is sent when none is configured. Not every server accepts
+    ``response_format``, so JSON mode is off unless enabled.
+    """
+
+    def __init__(self, name, default_model, base_url, api_key=None, json_mode=False):
+        super().__init__(name, default_model, api_key=api_key or "not-needed", base_url=base_url)
+        self.json_mode = json_mode
+
+
+def _litellm():
+    # litellm takes seconds and tens of MB to import, so workers only pay for it once a litellm provider is called
+    import litellm
+
+    return litellm
+
+
+class LiteLLMAdapter(ProviderAdapter):
+    """Providers reached through litellm (Groq by default), over the shared connection pool."""
+
+    def __init__(self, name="groq", default_model="groq/llama3-70b-8192", api_key=None, api_base=None):
+        super().__init__(name, default_model)
+        self.api_key = api_key
+        self.api_base = api_base
+
+    def load(self):
+        _litellm()
+        import litellm.llms.custom_httpx.http_handler
+
+    def _params(self, model, messages, temperature, max_tokens, timeout, stream=False, response_format=None):
+        params = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "timeout": timeout,
+            "api_key": self.api_key,
+        }
+        if self.api_base:
+            params["api_base"] = self.api_base
+        # Groq rejects JSON mode on streamed requests
+        if response_format and self.json_mode and not stream:
+            params["response_format"] = response_format
+        if stream:
+            params.update(stream=True, stream_options={"include_usage": True})
+        return params
+
+    def complete(self, clients, model, messages, temperature, max_tokens, timeout=None, response_format=None):
+        response = _litellm().completion(
+            client=clients.http_handler(self.name), **self._params(model, messages, temperature, max_tokens, timeout, response_format=response_format)
+        )
+        return response.choices[0].message.content, getattr(response, "usage", None)
+
+    async def acomplete(self, clients, model, messages, temperature, max_tokens, timeout=None, response_format=None):
+        response = await _litellm().acompletion(
+            client=clients.async_http_handler(self.name), **self._params(model, messages, temperature, max_tokens, timeout, response_format=response_format)
+        )
+        return response.choices[0].message.content, getattr(response, "usage", None)
+
+    def stream(self, clients, model, messages, temperature, max_tokens, usage=None, timeout=None, response_format=None):
+        stream = _litellm().completion(
+            client=clients.http_handler(self.name),
+            **self._params(model, messages, temperature, max_tokens, timeout, stream=True, response_format=response_format),
+        )
+        yield from _read_stream(stream, usage)
+
+    async def astream(self, clients, model, messages, temperature, max_tokens, usage=None, timeout=None, response_format=None):
+        stream = await _litellm().acompletion(
+            client=clients.async_http_handler(self.name),
+            **self._params(model, messages, temperature, max_tokens, timeout, stream=True, response_format=response_format),
+        )
+        async for delta in _aread_stream(stream, usage):
+            yield delta
+
+
+class ProviderRegistry:
+    """Provider adapters by name. The built-in ones are ``openai`` and ``groq``."""
+
+    def __init__(self, adapters=()):
+        self._adapters = {}
+        for adapter in adapters:
+            self.register(adapter)
+
+    @classmethod
+    def from_env(cls):
+        """
+        The built-in providers plus every OpenAI-compatible server listed in
+        LLM_EXTRA_PROVIDERS, each configured with LLM_PROVIDER_<NAME>_BASE_URL,
+        _MODEL, an optional _API_KEY and _JSON_MODE.
+        """
+        registry = cls([
+            OpenAIAdapter("openai", os.getenv("OPENAI_MODEL", "gpt-4o-mini"), api_key=os.getenv("OPENAI_API_KEY")),
+            LiteLLMAdapter(
+                "groq",
+                os.getenv("GROQ_MODEL", "groq/llama3-70b-8192"),
+                api_key=os.getenv("GROQ_API_KEY"),
+                api_base=os.getenv("GROQ_API_BASE"),
+            ),
+        ])
+        for name in os.getenv("LLM_EXTRA_PROVIDERS", "").split(","):
+            name = name.strip().lower()
+            if not name:
+                continue
+            prefix = f"LLM_PROVIDER_{name.upper().replace('-', '_')}_"
+            base_url, model = os.getenv(prefix + "BASE_URL"), os.getenv(prefix + "MODEL")
+            if not base_url or not model:
+                raise ValueError(f"Provider {name} needs {prefix}BASE_URL and {prefix}MODEL.")
+            registry.register(OpenAICompatibleAdapter(
+                name, model, base_url, api_key=os.getenv(prefix + "API_KEY"), json_mode=_env_bool(prefix + "JSON_MODE", False)
+            ))
+        return registry
+
+    def register(self, adapter):
+        self._adapters[adapter.name] = adapter
+        return adapter
+
+    def get(self, name):
+        adapter = self._adapters.get(name)
+        if adapter is None:
+            raise ValueError(f"Invalid LLM provider: {name}")
+        return adapter
+
+    def default_model(self, name):
+        return self.get(name).default_model
+
+    def names(self):
+        return tuple(self._adapters)
+
+    def load(self):
+        """Imports every registered provider's SDK."""
+        for adapter in self._adapters.values():
+            adapter.load()
+
+    def __contains__(self, name):
+        return name in self._adapters
+
+
+def load_agent_routes():
+    """
+    Per-agent provider and model choices from AGENT_ROUTES (JSON) or the JSON
+    file named by AGENT_ROUTES_PATH, e.g.::
+
+        {"summarize_validator": {"models": {"openai": "gpt-4o-mini", "groq": "groq/llama-3.1-8b-instant"}},
+         "refiner": {"provider": "local", "model": "llama3.1:8b"}}
+
+    ``models`` picks the agent's model on each provider; ``provider`` pins the
+    agent to one provider whatever the request asks for, with ``model`` as its
+    model there.
+    """
+    path = os.getenv("AGENT_ROUTES_PATH")
+    if path:
+        with open(path) as f:
+            routes = json.load(f)
+    else:
+        routes = json.loads(os.getenv("AGENT_ROUTES") or "{}")
+    for agent, route in routes.items():
+        route.setdefault("models", {})
+        if route.get("provider") and route.get("model"):
+            route["models"].setdefault(route["provider"], route["model"])
+    return routes
@@ -0,0 +1,285 @@
+import os
+import re
+from collections import Counter, deque
+
+from loguru import logger
+
+# ------------------- Pattern Matchers -------------------
+
+_MONTHS = r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|jun(?:e)?|jul(?:y)?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+
+# (category, compiled pattern, group holding the PHI value)
+PATTERNS = [
+    ("EMAIL", re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b"), 0),
+    ("URL", re.compile(r"\bhttps?://[^\s<>\"']+", re.IGNORECASE), 0),
+    ("IP", re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b"), 0),
+    ("SSN", re.compile(r"\b\d{3}-\d{2}-\d{4}\b"), 0),
+    ("MRN", re.compile(r"\b(?:MRN|MR#|Medical Record(?: Number| No\.?)?)\s*[:#]?\s*([A-Z0-9][A-Z0-9-]{3,})\b", re.IGNORECASE), 1),
+    ("PHONE", re.compile(r"(?<![\w-])(?:\+?1[\s.-]?)?(?:\(\d{3}\)\s?|\d{3}[\s.-])\d{3}[\s.-]\d{4}\b"), 0),
+    ("DATE", re.compile(r"\b\d{4}-\d{1,2}-\d{1,2}\b|\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b"), 0),
+    ("DATE", re.compile(rf"\b{_MONTHS}\.?\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}\b|\b\d{{1,2}}\s+{_MONTHS}\.?,?\s+\d{{4}}\b", re.IGNORECASE), 0),
+    ("ADDRESS", re.compile(
+        r"\b\d{1,6}\s+(?:[A-Z][A-Za-z]*\.?\s+){1,4}"
+        r"(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr|Court|Ct|Way|Place|Pl|Terrace|Circle|Cir)\b\.?"
+        r"(?:,?\s+(?:Apt|Suite|Unit|#)\.?\s*\w+)?"
+    ), 0),
+    ("ZIP", re.compile(r"\b[A-Z]{2}\s+(\d{5}(?:-\d{4})?)\b"), 1),
+    ("NAME", re.compile(r"\b(?:Mr|Mrs|Ms|Miss|Dr|Prof)\.?\s+([A-Z][a-z'-]+(?:\s+[A-Z][a-z'-]+)?)"), 1),
+    ("FACILITY", re.compile(
+        r"\b(?:[A-Z][A-Za-z'-]+\s+){1,4}(?:Hospital|Clinic|Medical Center|Health Center|Infirmary|Hospice)\b"
+    ), 0),
+]
+
+# Field names whose whole value is PHI in "key: value" records
+PHI_FIELDS = {
+    "name": "NAME", "patient": "NAME", "patient name": "NAME", "full name": "NAME", "first name": "NAME",
+    "last name": "NAME", "contact": "NAME", "emergency contact": "NAME", "next of kin": "NAME",
+    "guardian": "NAME", "physician": "NAME", "provider": "NAME", "attending": "NAME",
+    "dob": "DATE", "date of birth": "DATE", "birth date": "DATE", "birthdate": "DATE",
+    "admission date": "DATE", "discharge date": "DATE", "date of service": "DATE",
+    "address": "ADDRESS", "home address": "ADDRESS", "street": "ADDRESS", "city": "ADDRESS", "zip": "ZIP",
+    "zip code": "ZIP", "phone": "PHONE", "telephone": "PHONE", "mobile": "PHONE", "fax": "PHONE",
+    "email": "EMAIL", "e-mail": "EMAIL", "mrn": "MRN", "medical record number": "MRN", "ssn": "SSN",
+    "social security number": "SSN", "insurance id": "ID", "member id": "ID", "policy number": "ID",
+    "account number": "ID", "license number": "ID", "facility": "FACILITY", "hospital": "FACILITY",
+}
+
+# Clinical field names whose short values are not PHI. A record skips the LLM
+# only when every key is either here or in PHI_FIELDS; any other key (spouse,
+# employer, age, notes...) may hold identifiers the patterns cannot see.
+SAFE_FIELDS = {
+    "sex", "gender", "blood type", "height", "weight", "bmi", "temperature", "temp", "pulse", "heart rate",
+    "blood pressure", "bp", "respiratory rate", "oxygen saturation", "spo2", "allergies", "allergy",
+    "diagnosis", "diagnoses", "condition", "chief complaint", "symptoms", "medication", "medications",
+    "dosage", "dose", "frequency", "procedure", "test", "result", "results", "status", "severity",
+}
+
+# Values of SAFE_FIELDS the record may hold without the LLM, compared lowercased
+SAFE_VALUES = {
+    "m", "f", "male", "female", "other", "unknown", "none", "n/a", "nka", "nkda", "yes", "no", "positive",
+    "negative", "normal", "abnormal", "stable", "critical", "mild", "moderate", "severe",
+    "a+", "a-", "b+", "b-", "ab+", "ab-", "o+", "o-",
+}
+# Words that tie a value to a person; such values always go to the LLM
+RELATION_WORDS = {
+    "by", "with", "from", "per", "to", "husband", "wife", "spouse", "partner", "son", "daughter", "mother",
+    "father", "brother", "sister", "child", "friend", "dr", "mr", "mrs", "ms", "miss", "lives", "reported",
+}
+
+_FIELD_RE = re.compile(r"^(\s*)([A-Za-z][\w /#().'-]{0,40}?)\s*[:=]\s*(.*?)\s*$")
+# Unit words allowed next to numbers in measurements, compared lowercased
+UNITS = {
+    "mmhg", "kg", "g", "mg", "mcg", "ml", "l", "lb", "lbs", "oz", "cm", "mm", "m", "in", "ft", "bpm", "c", "f",
+    "°c", "°f", "%", "units", "iu", "kg/m2", "mg/dl", "mmol/l", "/min", "breaths/min", "daily", "bid", "tid", "qid", "prn",
+}
+# Lowercase clinical terms longer than this are treated as free text that still needs the LLM
+STRUCTURED_VALUE_WORDS = 3
+
+
+def _non_identifying(value):
+    """
+    Whether a SAFE_FIELDS value cannot name anyone: a measurement (numbers and
+    UNITS words only), a SAFE_VALUES entry, or a short all-lowercase
+    clinical term without relation words. Capitalized words may be names.
+    """
+    value = value.strip()
+    if not value or value.lower() in SAFE_VALUES:
+        return True
+    tokens = value.replace(",", " ").split()
+    if any(char.isdigit() for char in value) and all(
+        any(char.isdigit() for char in token) or token.lower().strip(".") in UNITS for token in tokens
+    ):
+        return True
+    words = re.findall(r"[A-Za-z']+", value)
+    return (
+        value == value.lower()
+        and len(value.split()) <= STRUCTURED_VALUE_WORDS
+        and not any(word in RELATION_WORDS for word in words)
+    )
+
+
+# ------------------- Dictionary Matcher -------------------
+
+class AhoCorasick:
+    """Case-insensitive multi-pattern matcher for dictionary terms (names, facilities)."""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._terms = [[]]  # terms ending at each node
+        self._output = [[]]  # terms ending at each node or its failure chain
+        self._built = False
+
+    def add(self, term, category):
+        term = term.strip().lower()
+        if not term:
+            return
+        node = 0
+        for char in term:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._terms.append([])
+                self._output.append([])
+            node = nxt
+        self._terms[node].append((len(term), category))
+        self._built = False
+
+    def build(self):
+        """Computes failure links breadth-first; called lazily before the first search."""
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            self._output[nxt] = list(self._terms[nxt])
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._output[nxt] = self._terms[nxt] + self._output[self._fail[nxt]]
+        self._built = True
+
+    def __len__(self):
+        return len(self._goto) - 1
+
+    def search(self, text):
+        """Yields (start, end, category) for every whole-word dictionary match."""
+        if not self._built:
+            self.build()
+        lowered = text.lower()
+        node = 0
+        for index, char in enumerate(lowered):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, category in self._output[node]:
+                start, end = index - length + 1, index + 1
+                if (start == 0 or not lowered[start - 1].isalnum()) and (end == len(lowered) or not lowered[end].isalnum()):
+                    yield start, end, category
+
+
+# ------------------- Scrubber -------------------
+
+class ScrubResult:
+    def __init__(self, text, spans, structured):
+        self.text = text
+        # [{"start", "end", "category"}] offsets into the original text
+        self.spans = spans
+        # True when the record needed no LLM pass at all
+        self.structured = structured
+
+    def counts(self):
+        return dict(Counter(span["category"] for span in self.spans))
+
+    def to_dict(self):
+        return {"text": self.text, "redactions": self.spans, "structured": self.structured}
+
+
+class PHIScrubber:
+    """
+    Deterministic PHI redaction with precompiled patterns and a dictionary
+    matcher. Runs ahead of the LLM sanitizer to shrink the prompt and keep
+    pattern-shaped identifiers from ever leaving the process.
+    """
+
+    def __init__(self, dictionary=None):
+        self.dictionary = dictionary or AhoCorasick()
+
+    @classmethod
+    def from_env(cls):
+        dictionary = AhoCorasick()
+        for category, env in (("NAME", "PHI_NAMES_PATH"), ("FACILITY", "PHI_FACILITIES_PATH")):
+            path = os.getenv(env)
+            if not path:
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    dictionary.add(line, category)
+            logger.info(f"[PHIScrubber] Loaded {category.lower()} dictionary from {path}")
+        dictionary.build()
+        return cls(dictionary)
+
+    def _matches(self, text, offset=0):
+        for category, pattern, group in PATTERNS:
+            for match in pattern.finditer(text):
+                start, end = match.span(group)
+                yield offset + start, offset + end, category
+        for start, end, category in self.dictionary.search(text):
+            yield offset + start, offset + end, category
+
+    def _field_matches(self, text):
+        """
+        Whole-value spans for PHI fields; also tells whether the record is fully
+        structured: only "key: value" lines, every key a PHI field or a SAFE_FIELDS
+        entry whose value cannot identify anyone.
+        """
+        spans, structured, position = [], True, 0
+        for line in text.splitlines(keepends=True):
+            content = line.rstrip("\r\n")
+            if content.strip():
+                match = _FIELD_RE.match(content)
+                if not match:
+                    structured = False
+                else:
+                    key, value = match.group(2).strip().lower(), match.group(3)
+                    category = PHI_FIELDS.get(key)
+                    if category and value:
+                        start = position + match.start(3)
+                        spans.append((start, start + len(value), category))
+                    elif key not in SAFE_FIELDS or not _non_identifying(value):
+                        structured = False
+            position += len(line)
+        return spans, structured
+
+    def scrub(self, text):
+        field_spans, structured = self._field_matches(text)
+        candidates = sorted(
+            set(field_spans) | set(self._matches(text)),
+            key=lambda span: (span[0], -(span[1] - span[0])),
+        )
+
+        spans, pieces, cursor = [], [], 0
+        for start, end, category in candidates:
+            if start < cursor or start == end:
+                continue
+            pieces.append(text[cursor:start])
+            pieces.append(f"[{category}]")
+            spans.append({"start": start, "end": end, "category": category})
+            cursor = end
+        pieces.append(text[cursor:])
+        return ScrubResult("".join(pieces), spans, structured and bool(text.strip()))
+
+
+_default_scrubber = None
+
+
+def get_default_scrubber():
+    global _default_scrubber
+    if _default_scrubber is None:
+        _default_scrubber = PHIScrubber.from_env()
+    return _default_scrubber
+
+
+def scrub_phi(medical_data):
+    return get_default_scrubber().scrub(medical_data)
+
+
+_PLACEHOLDER = re.compile(r"\[[A-Z_ ]+\]")
+
+
+def residual_phi(sanitized_data):
+    """
+    PHI the scrubber still finds in sanitized text, as spans into that text.
+    Placeholders such as "[NAME]" left by the sanitizer are not counted.
+    """
+    text = str(sanitized_data or "")
+    result = scrub_phi(text)
+    spans = [span for span in result.spans if not _PLACEHOLDER.fullmatch(text[span["start"]:span["end"]].strip())]
+    return ScrubResult(result.text, spans, result.structured)
@@ -1,19 +1,39 @@
 from src.agents.agent_base import AgentBase
+from src.tools.phi_scrubber import scrub_phi
 
 class SanitizeDataTool(AgentBase):
-    def __init__(self, llm_provider="openai", max_retries=3, verbose=True):
-        super().__init__(name="SanitizeDataTool", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose)
+    # The reply is the whole record again, so it is sized from the input
+    max_tokens = 4096
+    output_ratio = 1.2
+    min_tokens = 150
+    # Without the context window manager nothing sizes the reply; keep the old limit
+    fixed_max_tokens = 300
+    cacheable = True
+    # No similarity_key: a near-duplicate record belongs to another patient, and
+    # reusing its reply would leak or swap identifiers; only exact repeats are cached
 
-    def execute(self, medical_data):
+    def __init__(self, llm_provider="openai", max_retries=3, verbose=True, **kwargs):
+        super().__init__(name="SanitizeDataTool", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose, **kwargs)
+
+    def build_messages(self, medical_data, scrub=None):
+        # Pattern-shaped PHI is redacted locally before the data leaves the process
+        scrub = scrub or scrub_phi(medical_data)
         messages = [
             {"role": "system", "content": "You are an AI assistant that sanitizes medical data by removing Prtected Health Information (PHI):"},
             {
                 "role": "user",
                 "content": (
-                    "Remove all PHI from the following data:\n\n"
-                    f"{medical_data}\n\Sanitized Data:"
+                    "Remove all PHI from the following data. Bracketed tags such as [NAME] mark values that were already redacted; keep them as they are:\n\n"
+                    f"{scrub.text}\n\Sanitized Data:"
                 )
             }
         ]
-        sanitized_data = self.call_llm(messages, max_tokens=300)
-        return sanitized_data
\ No newline at end of file
+        return messages
+
+    def local_reply(self, medical_data, scrub=None):
+        # Fully structured records are handled by the scrubber alone
+        scrub = scrub or scrub_phi(medical_data)
+        return scrub.text if scrub.structured else None
+
+    def sized_input(self, medical_data, scrub=None):
+        return (scrub or scrub_phi(medical_data)).text
@@ -1,10 +1,38 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
 from src.agents.agent_base import AgentBase
+from src.utils.context_window import ContextWindowManager
+from src.utils.tokens import chunk_text, count_message_tokens, count_tokens
+
+# Long-document (map-reduce) mode; the token settings are upper bounds, lowered
+# to what fits the context window of the request's model
+LONG_DOCUMENT_TOKENS = int(os.getenv("SUMMARY_LONG_DOCUMENT_TOKENS", 6000))
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 3000))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("SUMMARY_CHUNK_OVERLAP_TOKENS", 200))
+REDUCE_INPUT_TOKENS = int(os.getenv("SUMMARY_REDUCE_INPUT_TOKENS", 12000))
+MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", 8))
+
+class DocumentSummary(str):
+    """Summary of a long document; carries the chunk summaries it was reduced from."""
+
+    def __new__(cls, value, chunk_summaries):
+        summary = super().__new__(cls, value)
+        summary.chunk_summaries = chunk_summaries
+        return summary
 
 class SummarizeTool(AgentBase):
-    def __init__(self, llm_provider="openai", max_retries=3, verbose=True):
-        super().__init__(name="SummarizeTool", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose)
+    max_tokens = 300
+    output_ratio = 0.5
+    min_tokens = 100
+    cacheable = True
+
+    def __init__(self, llm_provider="openai", max_retries=3, verbose=True, **kwargs):
+        super().__init__(name="SummarizeTool", llm_provider=llm_provider, max_retries=max_retries, verbose=verbose, **kwargs)
 
-    def execute(self, text):
+    def build_messages(self, text):
         messages = [
             {"role": "system", "content": "You are an AI assistant that summarizes medical text:"},
             {
@@ -15,5 +43,164 @@ class SummarizeTool(AgentBase):
                 )
             }
         ]
-        summary = self.call_llm(messages, max_tokens=300)
-        return summary
\ No newline at end of file
+        return messages
+
+    def build_chunk_messages(self, chunk, index, total):
+        messages = [
+            {"role": "system", "content": "You are an AI assistant that summarizes medical text:"},
+            {
+                "role": "user",
+                "content": (
+                    f"The following is part {index} of {total} of a longer medical document. "
+                    "Please provide a concise summary of this part, keeping every clinically relevant fact:\n\n"
+                    f"{chunk}\n\nSummary:"
+                )
+            }
+        ]
+        return messages
+
+    def reduce_input(self, summaries):
+        return "\n\n".join(f"Part {i}:\n{summary}" for i, summary in enumerate(summaries, 1))
+
+    def build_reduce_messages(self, summaries):
+        sections = self.reduce_input(summaries)
+        messages = [
+            {"role": "system", "content": "You are an AI assistant that summarizes medical text:"},
+            {
+                "role": "user",
+                "content": (
+                    "The following are summaries of consecutive parts of one medical document. "
+                    "Combine them into a single concise summary of the whole document:\n\n"
+                    f"{sections}\n\nSummary:"
+                )
+            }
+        ]
+        return messages
+
+    def similarity_key(self, text):
+        return text
+
+    def sized_input(self, text):
+        return text
+
+    # ------------------- Long-document mode -------------------
+
+    def input_budget(self, context):
+        """
+        Most tokens of document text one call can take on the request's model:
+        its context window less the prompt around the text and the reply.
+        """
+        manager = self.context_window or ContextWindowManager()
+        model = self._model(context=context)
+        window, max_output = manager.model_limits(model)
+        prompt = max(
+            count_message_tokens(self.build_chunk_messages("", 999, 999), model),
+            count_message_tokens(self.build_reduce_messages([""]), model),
+        )
+        return max(window - manager.reserve - prompt - min(self.max_tokens, max_output), 2 * CHUNK_OVERLAP_TOKENS)
+
+    def is_long(self, text, context=None):
+        context = self.context(context)
+        threshold = min(LONG_DOCUMENT_TOKENS, self.input_budget(context))
+        # A token spans at least one character, so short inputs skip the tokenizer.
+        if len(text) <= threshold:
+            return False
+        return count_tokens(text, self._model(context=context)) > threshold
+
+    def _chunks(self, text, context):
+        size = min(CHUNK_TOKENS, self.input_budget(context))
+        chunks = chunk_text(text, size, CHUNK_OVERLAP_TOKENS, self._model(context=context))
+        if self.verbose:
+            logger.info(f"[{self.name}] Long document: summarizing {len(chunks)} chunks")
+        return chunks
+
+    def _reduce_groups(self, summaries, context):
+        """
+        Groups summaries so that each reduce prompt fits the model; the groups'
+        summaries are reduced again until one is left. A last summary without
+        room in the group before it is carried over to the next round alone.
+        """
+        budget = min(REDUCE_INPUT_TOKENS, self.input_budget(context))
+        model = self._model(context=context)
+        groups, group, size = [], [], 0
+        for summary in summaries:
+            # Counted as the "Part N:" section it becomes in the reduce prompt
+            tokens = count_tokens(f"Part {len(group) + 1}:\n{summary}\n\n", model)
+            # Every group takes at least two summaries so each round shrinks the list.
+            if len(group) >= 2 and size + tokens > budget:
+                groups.append(group)
+                group, size = [], 0
+            group.append(summary)
+            size += tokens
+        if group:
+            groups.append(group)
+        return groups
+
+    def summarize_document(self, text, context=None):
+        """Map-reduce summary: chunk summaries in parallel, then hierarchical reduction."""
+        context = self.context(context)
+        chunks = self._chunks(text, context)
+
+        def call(messages, input_text):
+            # Same sizing and overflow handling as a single-call summary
+            messages, max_tokens = self._fit(messages, input_text, context)
+            return self.call_llm(messages, temperature=self.temperature, max_tokens=max_tokens, context=context)
+
+        def reduce(group):
+            return call(self.build_reduce_messages(group), self.reduce_input(group)) if len(group) > 1 else group[0]
+
+        with ThreadPoolExecutor(max_workers=MAP_CONCURRENCY) as pool:
+            chunk_summaries = list(pool.map(
+                lambda item: call(self.build_chunk_messages(item[1], item[0] + 1, len(chunks)), item[1]),
+                enumerate(chunks),
+            ))
+            summaries = chunk_summaries
+            while len(summaries) > 1:
+                summaries = list(pool.map(reduce, self._reduce_groups(summaries, context)))
+        return DocumentSummary(summaries[0], chunk_summaries)
+
+    async def asummarize_document(self, text, context=None):
+        context = self.context(context)
+        chunks = self._chunks(text, context)
+        semaphore = asyncio.Semaphore(MAP_CONCURRENCY)
+
+        async def call(messages, input_text):
+            messages, max_tokens = self._fit(messages, input_text, context)
+            async with semaphore:
+                return await self.acall_llm(messages, temperature=self.temperature, max_tokens=max_tokens, context=context)
+
+        async def reduce(group):
+            return await call(self.build_reduce_messages(group), self.reduce_input(group)) if len(group) > 1 else group[0]
+
+        chunk_summaries = await asyncio.gather(*[
+            call(self.build_chunk_messages(chunk, index, len(chunks)), chunk) for index, chunk in enumerate(chunks, 1)
+        ])
+        summaries = list(chunk_summaries)
+        while len(summaries) > 1:
+            summaries = await asyncio.gather(*[
+                reduce(group) for group in self._reduce_groups(summaries, context)
+            ])
+        return DocumentSummary(summaries[0], list(chunk_summaries))
+
+    def execute(self, text, context=None):
+        if self.is_long(text, context):
+            return self.summarize_document(text, context)
+        return super().execute(text, context=context)
+
+    async def aexecute(self, text, context=None):
+        if self.is_long(text, context):
+            return await self.asummarize_document(text, context)
+        return await super().aexecute(text, context=context)
+
+    def stream(self, text, context=None):
+        if self.is_long(text, context):
+            yield self.summarize_document(text, context)
+            return
+        yield from super().stream(text, context=context)
+
+    async def astream(self, text, context=None):
+        if self.is_long(text, context):
+            yield await self.asummarize_document(text, context)
+            return
+        async for delta in super().astream(text, context=context):
+            yield delta
@@ -0,0 +1,192 @@
+import json
+import math
+import os
+import re
+import threading
+
+from loguru import logger
+
+from src.utils.tokens import MESSAGE_OVERHEAD, count_message_tokens, count_tokens, get_encoding
+
+# (context window, most output tokens per reply) by model; names may carry a provider
+# prefix ("groq/...") and dated snapshots match their base name
+MODEL_LIMITS = {
+    "gpt-4o-mini": (128_000, 16_384),
+    "gpt-4o": (128_000, 16_384),
+    "gpt-4.1": (1_047_576, 32_768),
+    "gpt-4-turbo": (128_000, 4_096),
+    "gpt-4": (8_192, 8_192),
+    "gpt-3.5-turbo": (16_385, 4_096),
+    "llama3-70b-8192": (8_192, 8_192),
+    "llama3-8b-8192": (8_192, 8_192),
+    "llama-3.1-8b-instant": (131_072, 8_192),
+    "llama-3.3-70b-versatile": (131_072, 32_768),
+    "mixtral-8x7b-32768": (32_768, 32_768),
+    "gemma2-9b-it": (8_192, 8_192),
+}
+
+_SPACES = re.compile(r"[ \t\f\v]+")
+_BLANK_LINES = re.compile(r"\n\s*\n(?:\s*\n)+")
+
+
+class ContextWindowError(ValueError):
+    """A prompt that cannot be fitted into the model's context window."""
+
+
+def compress(text):
+    """``text`` with runs of spaces collapsed and at most one blank line in a row; nothing else changes."""
+    text = _SPACES.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def trim(text, max_tokens, model=None):
+    """
+    ``text`` cut to about ``max_tokens`` tokens: the start and the end are
+    kept (two thirds and one third of the budget) and a marker stands in for
+    the middle.
+    """
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    marker = "\n[... {} tokens omitted ...]\n"
+    budget = max(max_tokens - count_tokens(marker.format(len(tokens)), model), 2)
+    head = budget * 2 // 3
+    tail = budget - head
+    omitted = len(tokens) - head - tail
+    return encoding.decode(tokens[:head]) + marker.format(omitted) + encoding.decode(tokens[len(tokens) - tail:])
+
+
+class ContextWindowManager:
+    """
+    Fits every agent call to its model. ``max_tokens`` is set from the agent's
+    task: agents whose reply grows with their input get ``output_ratio`` tokens
+    per input token, between their ``min_tokens`` and ``max_tokens``, and never
+    more than the model can produce. A prompt that would overflow the context
+    window has its main input compressed, then trimmed, before the call.
+    """
+
+    def __init__(self, limits=None, default_window=8_192, default_max_output=4_096, reserve=64):
+        self.limits = dict(MODEL_LIMITS if limits is None else limits)
+        self.default_window = default_window
+        self.default_max_output = default_max_output
+        # Tokens kept free for the provider's own framing and counting differences
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "compressed": 0, "trimmed": 0, "output_capped": 0}
+
+    @classmethod
+    def from_env(cls):
+        if os.getenv("CONTEXT_WINDOW_ENABLED", "true").lower() not in ("1", "true", "yes", "on"):
+            return None
+        default_max_output = int(os.getenv("CONTEXT_MAX_OUTPUT_DEFAULT", 4_096))
+        limits = dict(MODEL_LIMITS)
+        # e.g. {"llama3.1:8b": 131072} for models served by a local provider
+        for model, window in json.loads(os.getenv("MODEL_CONTEXT_WINDOWS") or "{}").items():
+            max_output = limits[model][1] if model in limits else default_max_output
+            limits[model] = (int(window), min(int(window), max_output))
+        return cls(
+            limits=limits,
+            default_window=int(os.getenv("CONTEXT_WINDOW_DEFAULT", 8_192)),
+            default_max_output=default_max_output,
+            reserve=int(os.getenv("CONTEXT_WINDOW_RESERVE", 64)),
+        )
+
+    def model_limits(self, model):
+        """(context window, most output tokens) of ``model``."""
+        name = (model or "").split("/")[-1]
+        if name in self.limits:
+            return self.limits[name]
+        # Longest known prefix, so "gpt-4o-mini-2024-07-18" is not read as "gpt-4"
+        matches = [known for known in self.limits if name.startswith(known)]
+        if matches:
+            return self.limits[max(matches, key=len)]
+        return self.default_window, min(self.default_max_output, self.default_window)
+
+    def output_tokens(self, agent, input_tokens, model):
+        """max_tokens for ``agent`` given the size of its main input (None when it has none)."""
+        ceiling = min(agent.max_tokens, self.model_limits(model)[1])
+        if agent.output_ratio is None or input_tokens is None:
+            return ceiling
+        return min(max(math.ceil(input_tokens * agent.output_ratio), agent.min_tokens), ceiling)
+
+    def _input_budget(self, agent, limit, fixed, model):
+        """Most tokens the main input may keep when the rest of the prompt takes ``fixed``."""
+        if agent.output_ratio is None:
+            return limit - fixed - self.output_tokens(agent, None, model)
+        share = math.floor((limit - fixed) / (1 + agent.output_ratio))
+        return limit - fixed - self.output_tokens(agent, share, model)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def fit(self, agent, messages, input_text, model, trace_id=None):
+        """
+        (messages, max_tokens) for one call of ``agent`` on ``model``.
+        ``input_text`` is the agent's main input as it appears in ``messages``;
+        it is the part compressed or trimmed when the prompt does not fit.
+        Raises ContextWindowError when even that is not enough.
+        """
+        self._count("calls")
+        window, _ = self.model_limits(model)
+        limit = window - self.reserve
+        if input_text is not None and not any(input_text in message["content"] for message in messages):
+            input_text = None
+
+        # A token is at least one byte, so short prompts of fixed-size tasks skip the tokenizer
+        if input_text is None or agent.output_ratio is None:
+            size = sum(len(message["content"].encode("utf-8")) + MESSAGE_OVERHEAD for message in messages) + 2
+            max_tokens = self.output_tokens(agent, None, model)
+            if size + max_tokens <= limit:
+                return messages, max_tokens
+
+        prompt = count_message_tokens(messages, model)
+        input_tokens = count_tokens(input_text, model) if input_text is not None else None
+        max_tokens = self.output_tokens(agent, input_tokens, model)
+        if prompt + max_tokens <= limit:
+            return messages, max_tokens
+
+        if input_text is not None:
+            budget = self._input_budget(agent, limit, prompt - input_tokens, model)
+            if budget > 0:
+                fitted = compress(input_text)
+                self._count("compressed")
+                if count_tokens(fitted, model) > budget:
+                    fitted = trim(fitted, budget, model)
+                    self._count("trimmed")
+                fitted_tokens = count_tokens(fitted, model)
+                messages = _replace_input(messages, input_text, fitted)
+                if agent.verbose:
+                    logger.warning(
+                        "[{}] Input of {} tokens shortened to {} to fit the {}-token window of {} (trace {})",
+                        agent.name, input_tokens, fitted_tokens, window, model, trace_id,
+                    )
+                prompt = count_message_tokens(messages, model)
+                max_tokens = self.output_tokens(agent, fitted_tokens, model)
+
+        if prompt + max_tokens > limit:
+            # What is left of the window is all the reply can have
+            max_tokens = limit - prompt
+            if max_tokens < min(agent.min_tokens, agent.max_tokens):
+                raise ContextWindowError(
+                    f"{agent.name}: a prompt of {prompt} tokens leaves no room for a reply in the {window}-token window of {model}."
+                )
+            self._count("output_capped")
+        return messages, max_tokens
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+def _replace_input(messages, input_text, fitted):
+    """Copies of ``messages`` with the first occurrence of ``input_text`` replaced by ``fitted``."""
+    replaced, done = [], False
+    for message in messages:
+        if not done and input_text in message["content"]:
+            message = {**message, "content": message["content"].replace(input_text, fitted, 1)}
+            done = True
+        replaced.append(message)
+    return replaced
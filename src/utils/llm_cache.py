@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from loguru import logger
+
+
+class LRUCache:
+    """Bounded, thread-safe in-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk cache shared by every worker process on the host.
+
+    SQLite in WAL mode lets the gunicorn workers read concurrently while one of
+    them writes; each thread keeps its own connection.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        # A connection opened before a fork (gunicorn --preload) must not be used by the child
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM llm_cache")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class LLMCache:
+    """
+    Two-tier response cache for LLM calls: a per-process LRU in front of a
+    shared SQLite store. Values found only on disk are promoted into memory.
+    """
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes", "on"):
+            return None
+        memory = LRUCache(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024)),
+            ttl=float(os.getenv("LLM_CACHE_TTL", 3600)),
+        )
+        disk = None
+        # Off unless a path is set: cached replies of medical text are stored unencrypted
+        path = os.getenv("LLM_CACHE_PATH", "")
+        if path:
+            disk = SQLiteCache(path, ttl=float(os.getenv("LLM_CACHE_DISK_TTL", 86400)))
+        return cls(memory=memory, disk=disk)
+
+    @staticmethod
+    def make_key(provider, model, messages, temperature, max_tokens):
+        """Canonical hash of everything that determines a completion."""
+        payload = json.dumps(
+            {
+                "provider": provider,
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _memory_get(self, key):
+        return self.memory.get(key) if self.memory is not None else None
+
+    def _disk_get(self, key):
+        if self.disk is None:
+            return None
+        try:
+            return self.disk.get(key)
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.warning(f"[LLMCache] Disk lookup failed: {e}")
+            return None
+
+    def _disk_set(self, key, value):
+        if self.disk is None:
+            return
+        try:
+            self.disk.set(key, value)
+        except sqlite3.Error as e:
+            self._count("errors")
+            logger.warning(f"[LLMCache] Disk write failed: {e}")
+
+    def _disk_result(self, key, value):
+        if value is None:
+            self._count("misses")
+            return None, None
+        if self.memory is not None:
+            self.memory.set(key, value)
+        self._count("disk_hits")
+        return value, "disk"
+
+    def get(self, key):
+        """Returns (value, tier) where tier is "memory", "disk" or None on a miss."""
+        value = self._memory_get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value, "memory"
+        return self._disk_result(key, self._disk_get(key))
+
+    def set(self, key, value):
+        if self.memory is not None:
+            self.memory.set(key, value)
+        self._disk_set(key, value)
+        self._count("writes")
+
+    async def aget(self, key):
+        # Memory hits stay on the event loop; only the disk tier goes to a thread.
+        value = self._memory_get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value, "memory"
+        if self.disk is None:
+            return self._disk_result(key, None)
+        return self._disk_result(key, await asyncio.to_thread(self._disk_get, key))
+
+    async def aset(self, key, value):
+        if self.memory is not None:
+            self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self._disk_set, key, value)
+        self._count("writes")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["memory_entries"] = len(self.memory) if self.memory is not None else 0
+        return stats
+
+    def clear(self):
+        if self.memory is not None:
+            self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
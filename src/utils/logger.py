@@ -1,11 +1,71 @@
-from loguru import logger
-import sys
+import hashlib
 import os
+import sys
+
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+# How message and reply contents are logged: "hash" (digest and length only),
+# "truncate" (a short prefix plus the digest) or "full"
+PAYLOAD_MODES = ("hash", "truncate", "full")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "logs/multi_agent_system.log")
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "DEBUG").upper()
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "hash").strip().lower()
+LOG_PAYLOAD_CHARS = int(os.getenv("LOG_PAYLOAD_CHARS", 80))
+# Share of traces whose full message contents are logged whatever LOG_PAYLOADS says
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0))
+
+if LOG_PAYLOADS not in PAYLOAD_MODES:
+    raise ValueError(f"LOG_PAYLOADS must be one of {', '.join(PAYLOAD_MODES)}, not {LOG_PAYLOADS!r}.")
+
+
+def payload_digest(text):
+    """Stable fingerprint of ``text`` that says which content it was without revealing it."""
+    text = "" if text is None else str(text)
+    return f"sha256:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]} ({len(text)} chars)"
+
+
+def sampled(trace_id):
+    """
+    Whether ``trace_id`` is one of the traces logged with full payloads. The
+    choice is derived from the trace id, so every call of a sampled request is
+    logged in full, in every worker.
+    """
+    if LOG_PAYLOAD_SAMPLE_RATE <= 0 or trace_id is None:
+        return False
+    if LOG_PAYLOAD_SAMPLE_RATE >= 1:
+        return True
+    bucket = int(hashlib.sha256(str(trace_id).encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return bucket < LOG_PAYLOAD_SAMPLE_RATE
+
+
+def payload(text, trace_id=None):
+    """``text`` as it may appear in the logs under LOG_PAYLOADS and trace sampling."""
+    if LOG_PAYLOADS == "full" or sampled(trace_id):
+        return text
+    if LOG_PAYLOADS == "truncate":
+        text = "" if text is None else str(text)
+        prefix = text[:LOG_PAYLOAD_CHARS].replace("\n", " ")
+        return f"{prefix}{'...' if len(text) > LOG_PAYLOAD_CHARS else ''} [{payload_digest(text)}]"
+    return payload_digest(text)
+
 
-if not os.path.exists("logs"):
-    os.makedirs("logs")
+def configure():
+    """
+    Console and file sinks. Both are queued (``enqueue=True``): the caller only
+    puts the record on a queue and a background thread does the formatting,
+    JSON serialisation, writing and rotation.
+    """
+    logger.remove()
+    logger.add(sys.stdout, level=LOG_LEVEL, enqueue=True, format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> <level>{level: <8}</level> <level>{message}</level>")
+    if LOG_FILE:
+        os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
+        logger.add(LOG_FILE, level=LOG_FILE_LEVEL, enqueue=True, rotation="1 MB", retention="10 days", compression="zip", serialize=True, format="{time} {level} {message}")
+    return logger
 
-logger.remove()
-logger.add(sys.stdout, level="INFO", format="<green>{timestamp}</green> <level>{message}</level>")
-logger.add("logs/multi_agent_system.log", level="DEBUG", rotation="1 MB", retention="10 days", compression="zip", serialize=True, format= "{time} {level} {message}")
 
+configure()
@@ -0,0 +1,277 @@
+import asyncio
+import email.utils
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+import httpx
+from loguru import logger
+
+# ------------------- Error Classification -------------------
+
+RATE_LIMIT = "rate_limit"
+TIMEOUT = "timeout"
+SERVER_ERROR = "server_error"
+CONNECTION = "connection"
+CLIENT_ERROR = "client_error"
+CIRCUIT_OPEN = "circuit_open"
+UNKNOWN = "unknown"
+
+RETRYABLE = {RATE_LIMIT, TIMEOUT, SERVER_ERROR, CONNECTION, UNKNOWN}
+# Categories that say something about the provider's health
+PROVIDER_FAILURES = {RATE_LIMIT, TIMEOUT, SERVER_ERROR, CONNECTION}
+
+
+class CircuitOpenError(Exception):
+    """Raised without contacting the provider while its circuit breaker is open."""
+
+    def __init__(self, provider, retry_in):
+        super().__init__(f"Circuit breaker for {provider} is open; retry in {retry_in:.1f}s.")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class LLMCallError(Exception):
+    """Final error of an LLM call once retrying has stopped; ``category`` tells why."""
+
+    def __init__(self, message, category):
+        super().__init__(message)
+        self.category = category
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _openai_errors(name):
+    # The provider adapters import openai on first use; until then none of its errors can occur
+    openai = sys.modules.get("openai")
+    return (getattr(openai, name),) if openai is not None else ()
+
+
+def classify(error):
+    if isinstance(error, CircuitOpenError):
+        return CIRCUIT_OPEN
+    if isinstance(error, (*_openai_errors("APITimeoutError"), httpx.TimeoutException, asyncio.TimeoutError, TimeoutError)):
+        return TIMEOUT
+    status = _status_code(error)
+    if status == 429:
+        return RATE_LIMIT
+    if status == 408:
+        return TIMEOUT
+    if status is not None and status >= 500:
+        return SERVER_ERROR
+    if status is not None and status >= 400:
+        return CLIENT_ERROR
+    if isinstance(error, (*_openai_errors("APIConnectionError"), httpx.TransportError, ConnectionError)):
+        return CONNECTION
+    if isinstance(error, (ValueError, TypeError)):
+        return CLIENT_ERROR
+    return UNKNOWN
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait (Retry-After / retry-after-ms), if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "litellm_response_headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+# ------------------- Retry Policy -------------------
+
+class Deadline:
+    def __init__(self, seconds):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        return None if self.expires_at is None else max(0.0, self.expires_at - time.monotonic())
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, bounded by a total per-request
+    deadline. Only transient errors are retried; Retry-After hints from the
+    provider override the computed delay.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, deadline=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    @classmethod
+    def from_env(cls, max_attempts=3):
+        deadline = float(os.getenv("LLM_REQUEST_DEADLINE", 120))
+        return cls(
+            max_attempts=max_attempts,
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", 8.0)),
+            deadline=deadline if deadline > 0 else None,
+        )
+
+    def start(self, deadline=None):
+        """Deadline of one call; a caller's ``deadline`` wins when it is sooner."""
+        own = Deadline(self.deadline)
+        if deadline is None or deadline.expires_at is None:
+            return own
+        if own.expires_at is None or deadline.expires_at < own.expires_at:
+            return deadline
+        return own
+
+    def next_delay(self, attempt, error, category, deadline):
+        """Seconds to wait before the next attempt, or None to give up."""
+        if category not in RETRYABLE or attempt >= self.max_attempts:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        hinted = retry_after(error)
+        if hinted is not None:
+            delay = max(delay, hinted)
+        remaining = deadline.remaining()
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+
+# ------------------- Circuit Breaker -------------------
+
+class CircuitBreaker:
+    """
+    Per-provider breaker over a sliding window of call outcomes.
+
+    Opens when at least ``min_calls`` calls in the last ``window`` seconds saw a
+    failure rate of ``failure_rate`` or more. While open, calls fail at once;
+    after ``open_seconds`` a single probe is let through (half-open) and its
+    outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, provider, failure_rate=0.5, min_calls=10, window=30.0, open_seconds=15.0):
+        self.provider = provider
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque()  # (monotonic time, failed)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls, provider):
+        return cls(
+            provider,
+            failure_rate=float(os.getenv("CIRCUIT_FAILURE_RATE", 0.5)),
+            min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", 10)),
+            window=float(os.getenv("CIRCUIT_WINDOW", 30)),
+            open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", 15)),
+        )
+
+    def _trim(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def is_open(self):
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def before_call(self):
+        """
+        Raises CircuitOpenError unless a call to the provider may go ahead.
+        Returns True when the call is the half-open probe; the caller must then
+        pass that to release() once the call is over, however it ended.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.open_seconds:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._stats["rejected"] += 1
+            retry_in = max(0.0, self.open_seconds - (now - self._opened_at))
+        raise CircuitOpenError(self.provider, retry_in)
+
+    def release(self, probe):
+        """
+        Ends a probe that neither closed nor re-opened the circuit (a client
+        error, a local failure, a cancelled call), so the next call probes again.
+        """
+        if not probe:
+            return
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN:
+                logger.info(f"[CircuitBreaker:{self.provider}] Probe succeeded; closing circuit")
+                self.state = self.CLOSED
+                self._outcomes.clear()
+                self._probing = False
+            self._outcomes.append((now, False))
+            self._trim(now)
+
+    def record_failure(self, category):
+        if category not in PROVIDER_FAILURES:
+            # Our own bad requests say nothing about the provider's health
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN:
+                self._open(now, "probe failed")
+                return
+            self._outcomes.append((now, True))
+            self._trim(now)
+            failures = sum(1 for _, failed in self._outcomes if failed)
+            calls = len(self._outcomes)
+            if self.state == self.CLOSED and calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._open(now, f"{failures}/{calls} calls failed in {self.window:.0f}s")
+
+    def _open(self, now, reason):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._probing = False
+        self._stats["opened"] += 1
+        logger.warning(f"[CircuitBreaker:{self.provider}] Opening circuit for {self.open_seconds:.0f}s: {reason}")
+
+    def stats(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            calls = len(self._outcomes)
+            failures = sum(1 for _, failed in self._outcomes if failed)
+            return {
+                "state": self.state,
+                "window_calls": calls,
+                "window_failure_rate": round(failures / calls, 4) if calls else 0.0,
+                **self._stats,
+            }
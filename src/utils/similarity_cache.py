@@ -0,0 +1,185 @@
+import hashlib
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Dates and clock times are masked so re-exported notes still match.
+_TIMESTAMP_PATTERNS = [
+    re.compile(r"\b\d{4}-\d{1,2}-\d{1,2}(?:[ t]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:z|[+-]\d{2}:?\d{2})?)?\b"),
+    re.compile(r"\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b"),
+    re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?\s*(?:am|pm)?\b"),
+]
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class ApproximateResult(str):
+    """A reply served for a near-duplicate input. Behaves like the reply text."""
+
+    approximate = True
+
+    def __new__(cls, value, similarity):
+        result = super().__new__(cls, value)
+        result.similarity = similarity
+        return result
+
+
+def normalize(text):
+    """Lower-cases, masks timestamps and splits into word tokens."""
+    text = text.lower()
+    for pattern in _TIMESTAMP_PATTERNS:
+        text = pattern.sub(" <ts> ", text)
+    return _TOKEN_RE.findall(text)
+
+
+def shingles(tokens, size=3):
+    if len(tokens) < size:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """Vectorised MinHash over 32-bit shingle hashes using universal hashing."""
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingle_set), dtype=np.uint64, count=len(shingle_set)
+        )
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+class SimilarityCache:
+    """
+    Near-duplicate reply cache: MinHash signatures indexed with banded LSH.
+
+    Candidates sharing at least one band are verified against the estimated
+    Jaccard similarity of their signatures. The index holds at most
+    ``max_entries`` signatures and evicts the least recently used one first,
+    so lookups cost a handful of dict probes regardless of its size.
+    """
+
+    def __init__(self, threshold=0.9, num_perm=128, bands=16, max_entries=100_000, shingle_size=3):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm=num_perm)
+
+        self._entries = OrderedDict()  # entry id -> (digest, signature, value, band keys)
+        self._buckets = {}  # (namespace, band, band bytes) -> set of entry ids
+        self._by_digest = {}  # (namespace, text digest) -> entry id
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "approximate_hits": 0, "misses": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls):
+        if os.getenv("SIMILARITY_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(
+            threshold=float(os.getenv("SIMILARITY_CACHE_THRESHOLD", 0.9)),
+            max_entries=int(os.getenv("SIMILARITY_CACHE_MAX_ENTRIES", 100_000)),
+        )
+
+    def _signature(self, text):
+        return self.hasher.signature(shingles(normalize(text), self.shingle_size))
+
+    def _band_keys(self, namespace, signature):
+        rows = self.rows
+        return [(namespace, band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    @staticmethod
+    def _digest(text):
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def get(self, namespace, text):
+        """
+        Returns the cached reply for ``text`` or a near duplicate of it within
+        ``namespace``. Near-duplicate replies come back as ApproximateResult.
+        """
+        signature = self._signature(text)
+        digest = self._digest(text)
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(namespace, signature):
+                candidates.update(self._buckets.get(key, ()))
+
+            best_id, best_similarity = None, 0.0
+            for entry_id in candidates:
+                entry_digest, entry_signature, _, _ = self._entries[entry_id]
+                if entry_digest == digest:
+                    best_id, best_similarity = entry_id, 1.0
+                    break
+                similarity = float(np.count_nonzero(entry_signature == signature)) / len(signature)
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if best_id is None or best_similarity < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            entry_digest, _, value, _ = self._entries[best_id]
+            if entry_digest == digest:
+                self._stats["exact_hits"] += 1
+                return value
+            self._stats["approximate_hits"] += 1
+            return ApproximateResult(value, round(best_similarity, 4))
+
+    def set(self, namespace, text, value):
+        signature = self._signature(text)
+        band_keys = self._band_keys(namespace, signature)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            digest = self._digest(text)
+            previous = self._by_digest.get((namespace, digest))
+            if previous is not None:
+                self._remove(previous)
+            self._entries[entry_id] = (digest, signature, str(value), band_keys)
+            self._by_digest[(namespace, digest)] = entry_id
+            for key in band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _remove(self, entry_id):
+        digest, _, _, band_keys = self._entries.pop(entry_id)
+        self._by_digest.pop((band_keys[0][0], digest), None)
+        for key in band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["approximate_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._by_digest.clear()
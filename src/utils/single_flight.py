@@ -0,0 +1,110 @@
+import asyncio
+import os
+import threading
+import weakref
+
+
+class _Flight:
+    def __init__(self, task=None):
+        self.task = task
+        self.waiters = 0
+        # Used by the blocking path only
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls that are in flight at the same time: the first
+    caller for a key runs the work, and callers arriving before it finishes
+    wait for that result instead of repeating it. Nothing is kept once the
+    call returns; remembering results is the response cache's job.
+
+    Counters are kept per namespace (e.g. ``call`` for LLM calls and
+    ``pipeline`` for whole pipeline runs).
+    """
+
+    def __init__(self):
+        # Async flights are tied to the event loop that started them
+        self._async_flights = weakref.WeakKeyDictionary()  # loop -> {key: _Flight}
+        self._sync_flights = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @classmethod
+    def from_env(cls):
+        if os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls()
+
+    def _count(self, namespace, stat):
+        with self._lock:
+            counters = self._stats.setdefault(namespace, {"leaders": 0, "coalesced": 0})
+            counters[stat] += 1
+
+    async def ado(self, namespace, key, work):
+        """
+        Awaits ``work()`` (a coroutine function) once per key across concurrent
+        callers. Returns ``(result, shared)`` where ``shared`` is True for callers
+        that reused another caller's flight.
+
+        The work runs as its own task, so one impatient caller being cancelled
+        does not fail the others; it is only cancelled when every caller is gone.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flights = self._async_flights.setdefault(loop, {})
+        key = (namespace, key)
+        flight = flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = flights[key] = _Flight(asyncio.ensure_future(work()))
+            flight.task.add_done_callback(lambda _: flights.pop(key, None) if flights.get(key) is flight else None)
+        self._count(namespace, "coalesced" if shared else "leaders")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def do(self, namespace, key, work):
+        """Blocking counterpart of ado() for callers on plain threads."""
+        key = (namespace, key)
+        with self._lock:
+            flight = self._sync_flights.get(key)
+            shared = flight is not None
+            if flight is None:
+                flight = self._sync_flights[key] = _Flight()
+        self._count(namespace, "coalesced" if shared else "leaders")
+
+        if shared:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = work()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._sync_flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = {namespace: dict(counters) for namespace, counters in self._stats.items()}
+            in_flight = len(self._sync_flights) + sum(len(flights) for flights in self._async_flights.values())
+        for counters in stats.values():
+            calls = counters["leaders"] + counters["coalesced"]
+            counters["coalesced_rate"] = round(counters["coalesced"] / calls, 4) if calls else 0.0
+        return {"enabled": True, "in_flight": in_flight, **stats}
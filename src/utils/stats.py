@@ -0,0 +1,24 @@
+import math
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of ``values`` for ``q`` in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(latencies_ms):
+    """p50/p95/p99/mean/max of a list of latencies in milliseconds."""
+    if not latencies_ms:
+        return {"count": 0}
+    return {
+        "count": len(latencies_ms),
+        "p50": round(percentile(latencies_ms, 50), 2),
+        "p95": round(percentile(latencies_ms, 95), 2),
+        "p99": round(percentile(latencies_ms, 99), 2),
+        "mean": round(sum(latencies_ms) / len(latencies_ms), 2),
+        "max": round(max(latencies_ms), 2),
+    }
@@ -0,0 +1,65 @@
+import functools
+
+import tiktoken
+from loguru import logger
+
+DEFAULT_ENCODING = "cl100k_base"
+# Tokens added per chat message by the chat format, on top of its content
+MESSAGE_OVERHEAD = 4
+
+
+class ApproximateEncoding:
+    """
+    Stand-in used when tiktoken's BPE files cannot be loaded (e.g. no network
+    access on first use). Treats every 4 characters as one token.
+    """
+
+    name = "approximate"
+    CHARS_PER_TOKEN = 4
+
+    def encode(self, text, **kwargs):
+        step = self.CHARS_PER_TOKEN
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model=None):
+    """tiktoken encoder for ``model``, falling back to cl100k_base for non-OpenAI models."""
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model.split("/")[-1])
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logger.warning(f"[tokens] Could not load tiktoken encoding for {model}: {e}. Using approximate counts.")
+        return ApproximateEncoding()
+
+
+def count_tokens(text, model=None):
+    return len(get_encoding(model).encode(text or "", disallowed_special=()))
+
+
+def count_message_tokens(messages, model=None):
+    return sum(count_tokens(msg["content"], model) + MESSAGE_OVERHEAD for msg in messages) + 2
+
+
+def chunk_text(text, max_tokens, overlap=0, model=None):
+    """Splits ``text`` into windows of at most ``max_tokens`` tokens sharing ``overlap`` tokens."""
+    if overlap >= max_tokens:
+        raise ValueError("overlap must be smaller than max_tokens")
+    encoding = get_encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return [text]
+    step = max_tokens - overlap
+    chunks = []
+    for start in range(0, len(tokens), step):
+        chunks.append(encoding.decode(tokens[start:start + max_tokens]))
+        if start + max_tokens >= len(tokens):
+            break
+    return chunks
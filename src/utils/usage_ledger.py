@@ -0,0 +1,234 @@
+import argparse
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+from loguru import logger
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "groq/llama3-70b-8192": (0.59, 0.79),
+}
+
+# Endpoint (or other entry point) the current LLM calls are made on behalf of
+usage_endpoint = ContextVar("usage_endpoint", default=None)
+
+COLUMNS = (
+    "ts", "endpoint", "agent", "provider", "model", "prompt_tokens", "completion_tokens",
+    "total_tokens", "cost_usd", "latency_ms", "cache", "estimated",
+)
+
+# Allowed GROUP BY keys of report(); time windows bucket the call timestamp
+GROUP_KEYS = {
+    "endpoint": "endpoint",
+    "agent": "agent",
+    "provider": "provider",
+    "model": "model",
+    "cache": "cache",
+    "minute": "strftime('%Y-%m-%d %H:%M', ts, 'unixepoch')",
+    "hour": "strftime('%Y-%m-%d %H:00', ts, 'unixepoch')",
+    "day": "strftime('%Y-%m-%d', ts, 'unixepoch')",
+}
+
+
+def cost_usd(model, prompt_tokens, completion_tokens):
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return round((prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000, 8)
+
+
+def parse_window(value):
+    """Seconds in a window such as "90s", "15m", "24h" or "7d"; plain numbers are seconds."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", str(value))
+    if not match:
+        raise ValueError(f"Invalid time window: {value}")
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+
+
+class UsageLedger:
+    """
+    Append-only record of every LLM call: tokens, cost, latency and cache status.
+
+    record() only puts the row on a queue; a background thread writes rows to
+    SQLite in batches, so the request path never waits on the disk.
+    """
+
+    def __init__(self, path, batch_size=200, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._pid = None
+        self._dropped = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_usage ("
+                "ts REAL NOT NULL, endpoint TEXT, agent TEXT NOT NULL, provider TEXT NOT NULL, "
+                "model TEXT NOT NULL, prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL, "
+                "total_tokens INTEGER NOT NULL, cost_usd REAL, latency_ms REAL NOT NULL, cache TEXT, "
+                "estimated INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_usage_ts ON llm_usage (ts)")
+
+    @classmethod
+    def from_env(cls):
+        if os.getenv("USAGE_LEDGER_ENABLED", "true").lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(
+            os.getenv("USAGE_LEDGER_PATH", "cache/usage.sqlite3"),
+            batch_size=int(os.getenv("USAGE_LEDGER_BATCH_SIZE", 200)),
+            flush_interval=float(os.getenv("USAGE_LEDGER_FLUSH_INTERVAL", 1.0)),
+        )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_writer(self):
+        # The writer thread does not survive a fork; each worker starts its own.
+        if self._writer is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._writer = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+                self._writer.start()
+
+    def record(self, agent, provider, model, prompt_tokens, completion_tokens, latency_ms, cache=None, estimated=False):
+        total_tokens = prompt_tokens + completion_tokens
+        row = (
+            time.time(), usage_endpoint.get(), agent, provider, model, prompt_tokens, completion_tokens,
+            total_tokens, cost_usd(model, prompt_tokens, completion_tokens), round(latency_ms, 2), cache, int(estimated),
+        )
+        self._ensure_writer()
+        self._queue.put(row)
+
+    def _drain(self, first=None):
+        rows = [] if first is None else [first]
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, conn, rows):
+        if not rows:
+            return
+        try:
+            with conn:
+                conn.executemany(f"INSERT INTO llm_usage ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+        except sqlite3.Error as e:
+            self._dropped += len(rows)
+            logger.warning(f"[UsageLedger] Dropped {len(rows)} rows: {e}")
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if first is None:
+                self._write(conn, self._drain())
+                break
+            self._write(conn, self._drain(first))
+        conn.close()
+
+    def flush(self):
+        """Writes every queued row from the calling thread."""
+        conn = self._connect()
+        try:
+            while rows := self._drain():
+                if None in rows:
+                    # Leave the writer's stop signal for the writer
+                    rows.remove(None)
+                    self._queue.put(None)
+                    self._write(conn, rows)
+                    break
+                self._write(conn, rows)
+        finally:
+            conn.close()
+
+    def close(self):
+        if self._writer is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+            self._writer = None
+        self.flush()
+
+    def report(self, group_by=("endpoint",), since=None, until=None):
+        """
+        Aggregates the ledger by ``group_by`` keys (see GROUP_KEYS). ``since`` and
+        ``until`` are unix timestamps; rows still queued are flushed first.
+        """
+        unknown = [key for key in group_by if key not in GROUP_KEYS]
+        if unknown:
+            raise ValueError(f"Unknown group_by keys {unknown}; expected some of {sorted(GROUP_KEYS)}.")
+        self.flush()
+
+        select = [f"{GROUP_KEYS[key]} AS {key}" for key in group_by]
+        where, params = [], []
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            params.append(until)
+        sql = (
+            f"SELECT {', '.join(select + ['COUNT(*) AS calls'])}, "
+            "SUM(cache IS NOT NULL) AS cache_hits, SUM(prompt_tokens) AS prompt_tokens, "
+            "SUM(completion_tokens) AS completion_tokens, SUM(total_tokens) AS total_tokens, "
+            "ROUND(SUM(cost_usd), 6) AS cost_usd, ROUND(AVG(latency_ms), 2) AS avg_latency_ms, "
+            "SUM(estimated) AS estimated_calls FROM llm_usage"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if group_by:
+            sql += f" GROUP BY {', '.join(group_by)} ORDER BY total_tokens DESC"
+
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+
+# ------------------- CLI Report -------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate LLM token usage and cost from the usage ledger.")
+    parser.add_argument("--path", default=os.getenv("USAGE_LEDGER_PATH", "cache/usage.sqlite3"))
+    parser.add_argument("--by", default="endpoint,agent", help=f"comma-separated keys: {', '.join(GROUP_KEYS)}")
+    parser.add_argument("--since", help="only calls within this window, e.g. 15m, 24h, 7d")
+    args = parser.parse_args(argv)
+
+    group_by = [key.strip() for key in args.by.split(",") if key.strip()]
+    since = time.time() - parse_window(args.since) if args.since else None
+    rows = UsageLedger(args.path).report(group_by=group_by, since=since)
+
+    columns = group_by + ["calls", "cache_hits", "prompt_tokens", "completion_tokens", "total_tokens", "cost_usd", "avg_latency_ms"]
+    table = [[("" if row[c] is None else str(row[c])) for c in columns] for row in rows]
+    widths = [max([len(c)] + [len(line[i]) for line in table]) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for line in table:
+        print("  ".join(value.ljust(w) for value, w in zip(line, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+# Keep test runs off the shared log file, caches and job database
+os.environ.setdefault("LOG_FILE", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LLM_CACHE_PATH", "")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+# main.py refuses to start without keys; no test reaches a provider
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GROQ_API_KEY", "test")
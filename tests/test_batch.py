@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from src.agents.context import AgentContext
+from src.agents.pipeline import Pipeline, Stage
+
+
+@pytest.mark.parametrize("concurrency", ["abc", 0, -2, 1.5, True, None])
+def test_invalid_concurrency_is_rejected(concurrency):
+    client = TestClient(main.app)
+    response = client.post("/summarize/batch", json={"items": ["text"], "concurrency": concurrency})
+    assert response.status_code == 400
+
+
+def test_invalid_concurrency_in_query_is_rejected():
+    client = TestClient(main.app)
+    response = client.post(
+        "/summarize/batch?concurrency=many", content="text\n", headers={"content-type": "application/x-ndjson"}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("options", [{"llm_provider": 3}, {"llm_provider": "nope"}, {"model": ["gpt"]}])
+def test_invalid_provider_or_model_is_rejected(options):
+    client = TestClient(main.app)
+    response = client.post("/summarize/batch", json={"items": ["text"], **options})
+    assert response.status_code == 400
+
+
+def test_batch_item_errors_do_not_stop_the_batch():
+    # A failing ``when`` is not a stage error; it must still only fail its own item
+    pipeline = Pipeline(
+        "divide",
+        inputs=["value"],
+        stages=[Stage("result", func=lambda value: 10 // value, inputs={"value": "value"}, when=lambda results: 10 // results["value"])],
+    )
+
+    class Manager:
+        single_flight = None
+
+        def context(self, provider=None, model=None):
+            return AgentContext(provider or "openai")
+
+    async def run():
+        return [item async for item in pipeline.abatch(Manager(), [{"value": 2}, {"value": 0}, {"value": 5}], concurrency=2)]
+
+    items = sorted(asyncio.run(run()), key=lambda item: item[0])
+    assert [item[1]["result"] if item[1] else None for item in items] == [5, None, 2]
+    assert items[1][2] is not None
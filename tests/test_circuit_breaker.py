@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from src.agents import AGENT_CLASSES
+from src.utils.retry import CircuitBreaker, CircuitOpenError, Deadline
+
+
+def _half_open_breaker():
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0)
+    breaker.record_failure("server_error")
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_client_error_probe_releases_the_breaker():
+    breaker = _half_open_breaker()
+    probe = breaker.before_call()
+    assert probe and breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure("client_error")
+    breaker.release(probe)
+    # The next call is let through as a new probe instead of being rejected forever
+    assert breaker.before_call()
+
+
+def test_second_call_is_rejected_while_probing():
+    breaker = _half_open_breaker()
+    assert breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_cancelled_probe_is_released():
+    agent = AGENT_CLASSES["validator"]()
+    breaker = _half_open_breaker()
+    agent.clients.breakers["openai"] = breaker
+
+    async def slow_request(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    agent._arequest = slow_request
+
+    async def run():
+        task = asyncio.ensure_future(
+            agent._aattempt("openai", [{"role": "user", "content": "hi"}], 0.0, 10, Deadline(5), agent.context())
+        )
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.before_call()
+
+
+def test_rate_limit_timeout_in_stream_is_not_a_provider_failure(monkeypatch):
+    agent = AGENT_CLASSES["validator"]()
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=60)
+    agent.clients.breakers["openai"] = breaker
+
+    def acquire(*args, **kwargs):
+        raise TimeoutError("Rate limit needs a 30s wait; only 1s left.")
+
+    monkeypatch.setattr(agent.clients.rate_limiter, "acquire", acquire)
+    monkeypatch.setattr(agent, "_retry_delay", lambda *args: None)
+    with pytest.raises(Exception):
+        list(agent.stream_llm([{"role": "user", "content": "hi"}], max_tokens=10, context=agent.context()))
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,8 @@
+from src.agents import AGENT_CLASSES
+
+
+def test_sanitizer_keeps_its_old_limit_without_the_window_manager():
+    agent = AGENT_CLASSES["sanitize_data"]()
+    agent.context_window = None
+    _, max_tokens = agent._prepare(("Patient notes " * 50,), {}, agent.context())
+    assert max_tokens == 300
@@ -0,0 +1,46 @@
+import asyncio
+
+from src.agents import AGENT_CLASSES
+from src.providers.clients import ProviderClients
+from src.providers.hedging import Hedging
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def _agent(pinned_provider=None):
+    clients = ProviderClients.from_env()
+    clients.hedging = Hedging(["openai", "groq"], enabled=True, failover=True, default_delay=0.01)
+    agent = AGENT_CLASSES["validator"](clients=clients, pinned_provider=pinned_provider, max_retries=1)
+    calls, refunds = [], []
+
+    async def request(messages, temperature, max_tokens, provider, context, timeout=None):
+        calls.append(provider)
+        await asyncio.sleep(0.2 if provider == "openai" else 0.05)
+        return f"reply from {provider}", None
+
+    agent._arequest = request
+    agent._refund = lambda provider, reserved, max_tokens, context: refunds.append(provider)
+    return agent, calls, refunds
+
+
+def test_slow_primary_is_hedged_and_loser_cleaned_up():
+    agent, calls, refunds = _agent()
+    reply = asyncio.run(agent.acall_llm(MESSAGES, max_tokens=10, context=agent.context()))
+    assert reply == "reply from groq"
+    assert calls == ["openai", "groq"]
+    # The cancelled primary settled its reservation before the call returned
+    assert refunds == ["openai"]
+
+
+def test_pinned_agent_is_never_hedged_or_failed_over():
+    agent, calls, _ = _agent(pinned_provider="openai")
+    context = agent.context(agent.context().replace(provider="groq"))
+    reply = asyncio.run(agent.acall_llm(MESSAGES, max_tokens=10, context=context))
+    assert reply == "reply from openai"
+    assert calls == ["openai"]
+
+    breaker = agent.clients.breaker("openai")
+    breaker.min_calls = 1
+    breaker.record_failure("server_error")
+    assert breaker.is_open()
+    assert agent._pick_provider(context) == "openai"
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from src.agents.context import AgentContext
+from src.agents.pipeline import Pipeline, Stage
+from src.jobs.runner import JobRunner
+from src.jobs.store import JobStore
+
+
+def test_job_keeps_optional_inputs():
+    # Without the lifespan the runner is not started, so the job stays queued
+    client = TestClient(main.app)
+    response = client.post("/jobs/write_and_refine", json={"topic": "AI in radiology", "refine_rounds": 2})
+    assert response.status_code == 202
+    job = main.job_runner.store.get(response.json()["id"])
+    assert job["inputs"] == {"topic": "AI in radiology", "outline": None, "refine_rounds": 2}
+
+
+@pytest.mark.parametrize("refine_rounds", [0, -1, 6])
+def test_out_of_range_refine_rounds_is_rejected(refine_rounds):
+    client = TestClient(main.app)
+    payload = {"topic": "AI in radiology", "refine_rounds": refine_rounds}
+    assert client.post("/jobs/write_and_refine", json=payload).status_code == 422
+    assert client.post("/write_and_refine/", json=payload).status_code == 422
+
+
+def test_stages_are_saved_off_the_event_loop(tmp_path):
+    pipeline = Pipeline(
+        "steps",
+        inputs=["text"],
+        stages=[
+            Stage("upper", func=lambda text: text.upper(), inputs={"text": "text"}),
+            Stage("length", func=lambda upper: len(upper), inputs={"upper": "upper"}),
+        ],
+    )
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    runner = JobRunner(SimpleNamespace(get_pipeline=lambda name: pipeline, context=lambda *args: AgentContext("openai")), store)
+    loop_thread, saved = threading.get_ident(), []
+    save_stage = store.save_stage
+
+    def recording_save_stage(job_id, worker, stage, output, timing):
+        saved.append((stage, threading.get_ident() != loop_thread))
+        save_stage(job_id, worker, stage, output, timing)
+
+    store.save_stage = recording_save_stage
+    job_id = store.create("steps", {"text": "abc"})
+
+    async def run():
+        await runner._run(store.claim("worker"), "worker")
+
+    asyncio.run(run())
+    job = store.get(job_id)
+    assert job["status"] == "succeeded", job["error"]
+    assert saved == [("upper", True), ("length", True)]
+    assert job["result"]["outputs"]["length"] == 3
+
+
+def test_finished_jobs_drop_inputs_and_stage_outputs(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create("sanitize", {"medical_data": "Patient John Smith, MRN 12345"})
+    store.claim("worker")
+    store.save_stage(job_id, "worker", "sanitized", "Patient [NAME], MRN [MRN]", {"duration_ms": 5.0})
+    store.finish(job_id, "worker", "succeeded", {"outputs": {"sanitized": "Patient [NAME], MRN [MRN]"}})
+    job = store.get(job_id)
+    assert job["inputs"] == {}
+    assert job["stages"] == {"sanitized": {"timing": {"duration_ms": 5.0}}}
+    assert job["result"]["outputs"]["sanitized"] == "Patient [NAME], MRN [MRN]"
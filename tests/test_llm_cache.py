@@ -0,0 +1,9 @@
+from src.utils.llm_cache import LLMCache
+
+
+def test_disk_tier_is_opt_in(monkeypatch, tmp_path):
+    monkeypatch.delenv("LLM_CACHE_PATH", raising=False)
+    assert LLMCache.from_env().disk is None
+
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+    assert LLMCache.from_env().disk is not None
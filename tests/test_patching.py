@@ -0,0 +1,21 @@
+import pytest
+
+from src.agents.patching import PatchError, apply_edits, parse_edits
+
+ARTICLE = "Alpha beta gamma.\nDelta epsilon."
+
+
+@pytest.mark.parametrize("reply", [
+    '{"edits": [{"op": "replace", "anchor": "beta", "text": "BETA"}]}',
+    '```json\n{"edits": [{"op": "replace", "anchor": "beta", "text": "BETA"}]}\n```',
+    'Here are the edits:\n```json\n{"edits": [{"op": "replace", "anchor": "beta", "text": "BETA"}]}\n```\nLet me know!',
+    'Edits: [{"op": "replace", "anchor": "beta", "text": "BETA"}] as requested.',
+])
+def test_edits_are_found_around_fences_and_prose(reply):
+    assert apply_edits(ARTICLE, parse_edits(reply)) == "Alpha BETA gamma.\nDelta epsilon."
+
+
+@pytest.mark.parametrize("reply", ["not json", '{"edits": [', "", '{"edits": "none"}'])
+def test_replies_without_edits_raise(reply):
+    with pytest.raises(PatchError):
+        parse_edits(reply)
@@ -0,0 +1,62 @@
+from src.agents import AGENT_CLASSES
+from src.tools.phi_scrubber import scrub_phi
+from src.utils.similarity_cache import SimilarityCache
+
+
+def test_known_fields_are_structured():
+    result = scrub_phi("Patient: John Smith\nDOB: 01/02/1950\nDiagnosis: hypertension\nBlood pressure: 140/90")
+    assert result.structured
+    assert "John Smith" not in result.text
+    assert "Diagnosis: hypertension" in result.text
+
+
+def test_unknown_keys_need_the_llm():
+    result = scrub_phi("Patient: John Smith\nSpouse: Jane Doe\nPatient ID: 88321\nAge: 93\nEmployer: Acme Corp")
+    assert not result.structured
+    assert "John Smith" not in result.text
+    assert AGENT_CLASSES["sanitize_data"]().local_reply("unused", scrub=result) is None
+
+
+def test_free_text_under_a_key_needs_the_llm():
+    assert not scrub_phi("Note: seen by John Smith today").structured
+    assert not scrub_phi("Diagnosis: discussed at length with John Smith and his daughter at the clinic today").structured
+
+
+def test_names_in_safe_fields_need_the_llm():
+    for record in (
+        "Name: John Smith\nDiagnosis: diabetes, reported by daughter Mary Jones\nAllergies: none",
+        "Patient: Jane Roe\nStatus: lives with husband Bob Roe in Springfield",
+    ):
+        result = scrub_phi(record)
+        assert not result.structured
+        assert AGENT_CLASSES["sanitize_data"]().local_reply("unused", scrub=result) is None
+
+
+def test_measurements_and_short_terms_stay_structured():
+    result = scrub_phi(
+        "Name: John Smith\nSex: M\nBlood type: O+\nWeight: 82 kg\nBP: 120/80 mmHg\n"
+        "Diagnosis: type 2 diabetes\nAllergies: NKDA\nStatus: stable"
+    )
+    assert result.structured
+
+
+def test_records_differing_by_a_name_never_share_a_reply():
+    agent = AGENT_CLASSES["sanitize_data"]()
+    agent.cache = None
+    agent.similarity_cache = SimilarityCache(threshold=0.8)
+    calls = []
+
+    def call_llm(messages, temperature=0.7, max_tokens=150, context=None):
+        calls.append(messages)
+        return f"reply {len(calls)}"
+
+    agent.call_llm = call_llm
+    note = (
+        "Patient {} was seen today for chest pain. Vitals were stable, ECG showed sinus rhythm, troponin was negative "
+        "twice, aspirin was given and the patient was discharged home in good condition with follow-up in two weeks "
+        "at the cardiology clinic for a stress test."
+    )
+    first = agent.execute(note.format("John Smith"))
+    second = agent.execute(note.format("Jane Brown"))
+    assert len(calls) == 2
+    assert first != second
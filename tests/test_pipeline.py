@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.agents.context import AgentContext
+from src.agents.pipeline import ITERATIVE_REFINEMENT, REFINE_ROUNDS_LIMIT, SANITIZE_PIPELINE, Pipeline, Stage, _refine_rounds
+
+
+def _running_loop(text):
+    return asyncio.get_running_loop()
+
+
+def test_sync_runs_share_one_event_loop():
+    pipeline = Pipeline("loop", inputs=["text"], stages=[Stage("loop", func=_running_loop, inputs={"text": "text"})])
+    agent_manager = SimpleNamespace(context=AgentContext, single_flight=None)
+    first = pipeline.run(agent_manager, {"text": "a"})["loop"]
+    second = pipeline.run(agent_manager, {"text": "b"})["loop"]
+    # Async clients are cached per loop, so their connection pools carry over
+    assert first is second and first.is_running()
+
+
+class _Agent:
+    def __init__(self, reply, delay=0.0):
+        self.reply = reply
+        self.delay = delay
+
+    async def aexecute(self, context=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        return self.reply
+
+
+def test_residual_phi_check_overlaps_the_validator():
+    agents = {
+        "sanitize_data": _Agent("Patient [NAME] called 555-123-4567."),
+        "sanitize_data_validator": _Agent("Score: 5", delay=0.2),
+    }
+    agent_manager = SimpleNamespace(context=AgentContext, single_flight=None, get_agent=agents.get)
+    result = asyncio.run(SANITIZE_PIPELINE.arun(agent_manager, {"medical_data": "Patient Mr. Smith called 555-123-4567."}))
+
+    validation, residual = result.timings["validation"], result.timings["residual_phi"]
+    assert residual["start_ms"] < validation["start_ms"] + validation["duration_ms"]
+    assert validation["start_ms"] < residual["start_ms"] + residual["duration_ms"]
+    assert result["residual_phi"].counts() == {"PHONE": 1}
+
+
+def test_refine_rounds_are_clamped_not_defaulted():
+    assert _refine_rounds({"refine_rounds": None}) == min(ITERATIVE_REFINEMENT.max_rounds, REFINE_ROUNDS_LIMIT)
+    assert _refine_rounds({"refine_rounds": 0}) == 1
+    assert _refine_rounds({"refine_rounds": -3}) == 1
+    assert _refine_rounds({"refine_rounds": 50}) == REFINE_ROUNDS_LIMIT
@@ -0,0 +1,29 @@
+from src.agents import AGENT_CLASSES
+from src.providers.rate_limit import RateLimiter
+
+
+def test_limiter_without_limits_does_no_work(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "true")
+    for provider in ("OPENAI", "GROQ"):
+        monkeypatch.delenv(f"RATE_LIMIT_{provider}_RPM", raising=False)
+        monkeypatch.delenv(f"RATE_LIMIT_{provider}_TPM", raising=False)
+    limiter = RateLimiter.from_env(["openai", "groq"])
+    assert not limiter.enabled
+    assert limiter.response_hooks("openai") == {}
+
+    agent = AGENT_CLASSES["validator"]()
+    agent.clients.rate_limiter = limiter
+    monkeypatch.setattr("src.agents.agent_base.count_message_tokens", lambda *args: 1 / 0)
+    assert agent._admission([{"role": "user", "content": "hi"}], 10, "openai", agent.context())[2] == 0
+
+
+def test_only_providers_with_limits_are_throttled(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "true")
+    monkeypatch.setenv("RATE_LIMIT_GROQ_RPM", "30")
+    monkeypatch.delenv("RATE_LIMIT_GROQ_TPM", raising=False)
+    monkeypatch.delenv("RATE_LIMIT_OPENAI_RPM", raising=False)
+    monkeypatch.delenv("RATE_LIMIT_OPENAI_TPM", raising=False)
+    limiter = RateLimiter.from_env(["openai", "groq"])
+    assert limiter.limited("groq") and not limiter.limited("groq", tokens=True)
+    assert not limiter.limited("openai")
+    assert limiter.response_hooks("openai") == {} and limiter.response_hooks("groq")
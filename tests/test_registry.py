@@ -0,0 +1,45 @@
+import pytest
+
+from src.providers.registry import ProviderAdapter
+
+
+class _CompleteOnly(ProviderAdapter):
+    def complete(self, clients, model, messages, temperature, max_tokens, timeout=None, response_format=None):
+        return "", None
+
+    async def acomplete(self, clients, model, messages, temperature, max_tokens, timeout=None, response_format=None):
+        return "", None
+
+
+def test_adapter_missing_a_method_fails_at_construction():
+    with pytest.raises(TypeError):
+        _CompleteOnly("partial", "model")
+
+
+def test_async_http_handler_only_holds_the_pooled_client(monkeypatch):
+    import asyncio
+
+    import httpx
+
+    # litellm creates module-level clients on import
+    from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler  # noqa: F401
+
+    from src.providers.clients import ProviderClients
+
+    created = []
+    original = httpx.AsyncClient.__init__
+
+    def recording_init(client, *args, **kwargs):
+        created.append(client)
+        original(client, *args, **kwargs)
+
+    monkeypatch.setattr(httpx.AsyncClient, "__init__", recording_init)
+
+    async def run():
+        clients = ProviderClients.from_env()
+        handler = clients.async_http_handler("groq")
+        assert created == [handler.client]
+        await clients.aclose()
+        return handler
+
+    assert asyncio.run(run()).client.is_closed
@@ -0,0 +1,16 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_unexpected_pipeline_error_ends_stream_with_error_event(monkeypatch):
+    async def arun(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main.agent_manager.get_pipeline("summarize"), "arun", arun)
+    client = TestClient(main.app)
+    response = client.post("/summarize/stream", json={"text": "Patient is stable."})
+    assert response.status_code == 200
+    assert "event: error" in response.text
+    assert "boom" in response.text
+    assert "event: done" not in response.text
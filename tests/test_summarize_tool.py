@@ -0,0 +1,60 @@
+import asyncio
+
+from src.agents import AGENT_CLASSES
+from src.agents.context import AgentContext
+from src.utils.context_window import ContextWindowManager
+from src.utils.tokens import count_message_tokens
+
+GROQ_8K = AgentContext("groq", model="llama3-70b-8192")
+
+
+def _summarizer():
+    agent = AGENT_CLASSES["summarize"]()
+    agent.context_window = None
+    return agent
+
+
+def test_budgets_fit_a_small_context_window():
+    agent = _summarizer()
+    budget = agent.input_budget(GROQ_8K)
+    assert budget < 8_192 - agent.max_tokens
+    summaries = ["finding " * 1_500] * 6
+    groups = agent._reduce_groups(summaries, GROQ_8K)
+    assert len(groups) > 1
+    for group in groups:
+        assert count_message_tokens(agent.build_reduce_messages(group), GROQ_8K.model) + agent.max_tokens <= 8_192
+
+
+def test_long_document_is_reduced_in_rounds_within_the_window():
+    agent = _summarizer()
+    prompts = []
+
+    def call_llm(messages, temperature=0.7, max_tokens=150, context=None):
+        prompts.append(count_message_tokens(messages, context.model) + max_tokens)
+        # Long partial summaries force more than one reduce round
+        return "summary " * 1_500
+
+    agent.call_llm = call_llm
+    text = "The patient was admitted with chest pain. " * 4_000
+    assert agent.is_long(text, GROQ_8K)
+    summary = agent.summarize_document(text, GROQ_8K)
+    assert len(prompts) > len(summary.chunk_summaries) + 1
+    assert max(prompts) <= 8_192
+
+
+def test_map_and_reduce_calls_are_fitted_to_the_window():
+    agent = _summarizer()
+    agent.context_window = ContextWindowManager(limits={"tiny": (2_000, 2_000)})
+    context = AgentContext("openai", model="tiny")
+    calls = []
+
+    async def acall_llm(messages, temperature=0.7, max_tokens=150, context=None):
+        calls.append(count_message_tokens(messages, context.model) + max_tokens)
+        return "summary " * 450
+
+    agent.acall_llm = acall_llm
+    text = "The patient was admitted with chest pain. " * 1_000
+    asyncio.run(agent.asummarize_document(text, context))
+    assert len(calls) > 3
+    assert max(calls) <= 2_000
+
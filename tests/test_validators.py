@@ -0,0 +1,8 @@
+from src.agents import AGENT_CLASSES
+
+
+def test_draft_review_prompt_includes_the_outline():
+    agent = AGENT_CLASSES["write_article_validator"]()
+    with_outline = agent.build_messages("AI in radiology", "Draft text.", outline="1. Imaging\n2. Triage")[1]["content"]
+    assert "Outline: 1. Imaging\n2. Triage" in with_outline
+    assert "Outline" not in agent.build_messages("AI in radiology", "Draft text.")[1]["content"]